@@ -0,0 +1 @@
+default_app_config = "mobileapi.apps.MobileapiConfig"
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MobileapiConfig(AppConfig):
     name = 'mobileapi'
+
+    def ready(self):
+        import mobileapi.signals  # noqa: F401
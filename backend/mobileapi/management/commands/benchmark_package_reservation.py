@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from rest_framework.serializers import ValidationError
+
+from mobileapi.models import PackageInventory
+from mobileapi.utils.package_inventory import (
+    INVENTORY_FIELDS,
+    hold_package_booking,
+    rebuild_package_inventory,
+)
+from mobileapi.utils.fixtures import clone
+from package.models import Package, PackageBooking
+
+
+def book_package(template, package):
+    """
+    create the draft booking and confirm it the way the package booking views do,
+    without the payment gateway. Returns False when the package was full
+    """
+    try:
+        with transaction.atomic():
+            booking = clone(template, package=package, payment_status="Draft")
+            booking.save()
+            if not hold_package_booking(booking):
+                raise ValidationError({"error": "This Package is already full"})
+        with transaction.atomic():
+            booking = PackageBooking.objects.select_for_update().get(id=booking.id)
+            if not hold_package_booking(booking):
+                raise ValidationError({"error": "This Package is already full"})
+            booking.payment_status = "Paid"
+            booking.save()
+        return True
+    except ValidationError:
+        return False
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Book a throwaway copy of a package from many threads at once through the "
+        "booking create and confirm path and check that no more than its stock is "
+        "booked. The package and its bookings are deleted at the end, run it "
+        "against a staging database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "booking",
+            type=int,
+            help="Package booking copied for every booking, along with its package",
+        )
+        parser.add_argument(
+            "--stock", type=int, default=100, help="Quantity of the package"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=1000, help="Number of bookings"
+        )
+        parser.add_argument(
+            "--threads", type=int, default=32, help="Number of concurrent workers"
+        )
+        parser.add_argument(
+            "--quantity", type=int, default=1, help="Quantity of every booking"
+        )
+
+    def handle(self, *args, **options):
+        template = (
+            PackageBooking.objects.select_related("package")
+            .filter(id=options["booking"])
+            .first()
+        )
+        if template is None:
+            raise CommandError(f"Package booking {options['booking']} does not exist")
+        template.quantity = options["quantity"]
+        package = clone(
+            template.package,
+            title=f"Benchmark of {template.package.title}",
+            quantity=options["stock"],
+            is_active=False,
+        )
+        package.save()
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                results = list(
+                    executor.map(
+                        lambda _: book_package(template, package),
+                        range(options["requests"]),
+                    )
+                )
+            elapsed = time.perf_counter() - started
+            inventory = PackageInventory.objects.values(*INVENTORY_FIELDS).get(
+                package=package
+            )
+            out_of_sync = rebuild_package_inventory(
+                Package.objects.filter(id=package.id)
+            )
+        finally:
+            PackageBooking.objects.filter(package=package).delete()
+            package.delete()
+
+        booked = results.count(True) * options["quantity"]
+        self.stdout.write(
+            f"{options['requests']} bookings in {elapsed:.2f}s "
+            f"({options['requests'] / elapsed:.0f}/s), "
+            f"{results.count(True)} accepted, {results.count(False)} rejected"
+        )
+        expected = options["stock"] // options["quantity"] * options["quantity"]
+        if (
+            booked > options["stock"]
+            or inventory["available_quantity"] < 0
+            or inventory["booked_quantity"] != booked
+            or inventory["reserved_quantity"]
+            or booked != min(expected, options["requests"] * options["quantity"])
+            or out_of_sync
+        ):
+            raise CommandError(
+                f"Package oversold: stock {options['stock']}, booked {booked}, "
+                f"inventory {inventory}"
+            )
+        self.stdout.write(self.style.SUCCESS("No oversell"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mobileapi.utils.package_inventory import expire_package_reservations
+
+
+class Command(BaseCommand):
+    help = "Release the package quantity held by the expired draft bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Release the expired reservations and exit instead of polling",
+        )
+        parser.add_argument(
+            "--interval", type=int, default=60, help="Seconds between polls"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = expire_package_reservations()
+            if released:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Released {released} package reservations")
+                )
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from mobileapi.utils.popularity import rebuild_booking_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the bookings of every organisation and package"
+
+    def handle(self, *args, **options):
+        organisations, packages = rebuild_booking_counters()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Booking counters corrected for {organisations} organisations "
+                f"and {packages} packages"
+            )
+        )
@@ -0,0 +1,45 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from booking.models import Booking
+from mobileapi.utils.dashboard import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily booking rollups read by the hotelier dashboard"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--organisation", type=int, help="Rebuild only the given organisation"
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Number of days before today to rebuild, all bookings by default",
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        if options.get("organisation"):
+            bookings = bookings.filter(property__id=options["organisation"])
+        if options.get("days"):
+            bookings = bookings.filter(
+                created_on__date__gte=datetime.date.today()
+                - datetime.timedelta(days=options["days"])
+            )
+        organisations = bookings.values("property_id").annotate(
+            from_date=Min("created_on__date"), to_date=Max("created_on__date")
+        )
+        for organisation in organisations:
+            rebuild_daily_rollups(
+                organisation.get("property_id"),
+                organisation.get("from_date"),
+                organisation.get("to_date"),
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dashboard rollups rebuilt for {len(organisations)} organisations"
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from common.models import UserSearchHistory
+from mobileapi.models import PopularSearch
+
+
+class Command(BaseCommand):
+    help = "Recalculate the popular search counters from the search history"
+
+    def handle(self, *args, **options):
+        rows = (
+            UserSearchHistory.objects.filter(is_deleted=False)
+            .values(
+                "content__parent_search_key",
+                "content__child_search_key",
+            )
+            .annotate(count=Count("id"), last_searched_on=Max("created_on"))
+        )
+        searches = [
+            PopularSearch(
+                parent_search_key=row.get("content__parent_search_key") or "",
+                child_search_key=row.get("content__child_search_key") or "",
+                count=row.get("count"),
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            PopularSearch.objects.all().delete()
+            PopularSearch.objects.bulk_create(searches, ignore_conflicts=True)
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(searches)} popular searches rebuilt")
+        )
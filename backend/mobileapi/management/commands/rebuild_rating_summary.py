@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from organisation.models import Organisation
+from mobileapi.utils.ratings import rebuild_rating_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the rating summary of the organisations from their ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--organisation", type=int, help="Rebuild only the given organisation"
+        )
+
+    def handle(self, *args, **options):
+        organisations = Organisation.objects.all()
+        if options.get("organisation"):
+            organisations = organisations.filter(id=options["organisation"])
+        organisation_ids = list(organisations.values_list("id", flat=True))
+        for organisation_id in organisation_ids:
+            rebuild_rating_summary(organisation_id)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rating summary rebuilt for {len(organisation_ids)} organisations"
+            )
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mobileapi.utils.recommendations import (
+    RECOMMENDATION_REBUILD_INTERVAL,
+    build_recommendation_artifact,
+)
+
+
+class Command(BaseCommand):
+    help = "Build a new version of the hotel recommendation artifact"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running and rebuild whenever the organisations changed",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=RECOMMENDATION_REBUILD_INTERVAL,
+            help="Seconds between the checks for changes",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            artifact = build_recommendation_artifact(only_changed=options["watch"])
+            if artifact:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Recommendation artifact {artifact.id} built from "
+                        f"{artifact.organisation_count} organisations"
+                    )
+                )
+            if not options["watch"]:
+                break
+            close_old_connections()
+            time.sleep(options["interval"])
@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from organisation.models import Room
+from mobileapi.utils.inventory import INVENTORY_HORIZON_DAYS, sync_room_inventory
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per night room inventory ledger from bookings and unavailability"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--organisation", type=int, help="Rebuild only the given organisation"
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=INVENTORY_HORIZON_DAYS,
+            help="Number of nights from today to rebuild",
+        )
+
+    def handle(self, *args, **options):
+        from_date = datetime.date.today()
+        to_date = from_date + datetime.timedelta(days=options["days"])
+        rooms = Room.objects.filter(is_deleted=False)
+        if options.get("organisation"):
+            rooms = rooms.filter(organisation__id=options["organisation"])
+        organisation_ids = rooms.values_list("organisation_id", flat=True).distinct()
+        for organisation_id in organisation_ids:
+            sync_room_inventory(
+                rooms.filter(organisation_id=organisation_id), from_date, to_date
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Room inventory rebuilt for {len(organisation_ids)} organisations"
+            )
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from mobileapi.utils.search import (
+    create_missing_search_documents,
+    rebuild_search_documents,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search documents of every organisation and package"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Only create the search documents which do not exist yet",
+        )
+
+    def handle(self, *args, **options):
+        if options["missing"]:
+            count = create_missing_search_documents()
+            self.stdout.write(
+                self.style.SUCCESS(f"Created {count} missing search documents")
+            )
+            return
+        count = rebuild_search_documents()
+        self.stdout.write(
+            self.style.SUCCESS(f"Search documents rebuilt for {count} organisations")
+        )
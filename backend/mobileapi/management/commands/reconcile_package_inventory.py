@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from package.models import Package
+from mobileapi.utils.package_inventory import rebuild_package_inventory
+
+
+class Command(BaseCommand):
+    help = "Recalculate the booked and available quantity of the packages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--package", type=int, help="Reconcile only the package")
+
+    def handle(self, *args, **options):
+        packages = Package.objects.all()
+        if options.get("package"):
+            packages = packages.filter(id=options["package"])
+        changed = rebuild_package_inventory(packages)
+        for inventory in changed:
+            self.stdout.write(
+                f"Package {inventory.package_id}: booked {inventory.booked_quantity}, "
+                f"available {inventory.available_quantity}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(changed)} package inventories corrected")
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mobileapi.models import ExportJob
+from webapi.utils.export_jobs import expire_export_jobs, run_export_job
+
+
+class Command(BaseCommand):
+    help = "Build the pending export jobs outside of the web workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Build the pending jobs and exit instead of polling",
+        )
+        parser.add_argument(
+            "--interval", type=int, default=5, help="Seconds between polls"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expire_export_jobs()
+            job_ids = list(
+                ExportJob.objects.filter(status="Pending")
+                .order_by("created_on")
+                .values_list("id", flat=True)
+            )
+            for job_id in job_ids:
+                run_export_job(job_id)
+            if job_ids:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Built {len(job_ids)} export jobs")
+                )
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,198 @@
+import datetime
+import multiprocessing
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+from rest_framework.serializers import ValidationError
+
+from booking.models import Booking
+from organisation.models import Room
+from mobileapi.models import RoomInventory
+from mobileapi.utils.fixtures import clone
+from mobileapi.utils.inventory import build_room_inventory
+from webapi.utils.booking import reserve_booking_rooms
+
+
+def write_booking(booking, template, room_ids, checkin_date, checkout_date):
+    """
+    write the booking the way the booking update views do, the booking and its
+    room details are saved so that the inventory signals run
+    """
+    booking.checkin_date = checkin_date
+    booking.checkout_date = checkout_date
+    booking.save()
+    for detail in booking.room_detail.all():
+        detail.delete()
+    for room_id in room_ids:
+        clone(template, booking=booking, room_id=room_id, no_of_rooms=1).save()
+
+
+def update_booking(args):
+    """
+    worker of the stress test, moves its booking to a random set of the rooms and
+    a random part of the window through the booking write path
+    """
+    booking_id, template, room_ids, from_date, nights, attempts, seed = args
+    generator = random.Random(seed)
+    accepted = 0
+    rejected = 0
+    errors = 0
+    for _ in range(attempts):
+        rooms = generator.sample(room_ids, generator.randint(1, len(room_ids)))
+        first_night = generator.randrange(nights)
+        checkin_date = from_date + datetime.timedelta(days=first_night)
+        checkout_date = checkin_date + datetime.timedelta(
+            days=generator.randint(1, nights - first_night)
+        )
+        try:
+            with transaction.atomic():
+                booking = Booking.objects.get(id=booking_id)
+                reserve_booking_rooms(
+                    [{"room": room_id, "no_of_rooms": 1} for room_id in rooms],
+                    checkin_date,
+                    checkout_date,
+                    booking=booking,
+                )
+                write_booking(booking, template, rooms, checkin_date, checkout_date)
+            accepted += 1
+        except ValidationError:
+            rejected += 1
+        except DatabaseError:
+            errors += 1
+    connections.close_all()
+    return accepted, rejected, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Create fixture bookings copied from a confirmed booking and update them "
+        "from one process each at once through the booking write path, then check "
+        "that no room night is booked over its capacity and that the inventory "
+        "ledger matches the bookings. The fixtures are deleted at the end, run it "
+        "against a staging database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "booking",
+            type=int,
+            help="Confirmed booking with a room detail copied for every fixture",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of fixture bookings"
+        )
+        parser.add_argument(
+            "--from-date",
+            type=datetime.date.fromisoformat,
+            default=datetime.date.today() + datetime.timedelta(days=1),
+            help="First night of the window, YYYY-MM-DD",
+        )
+        parser.add_argument(
+            "--nights", type=int, default=7, help="Number of nights in the window"
+        )
+        parser.add_argument(
+            "--attempts", type=int, default=200, help="Updates tried per process"
+        )
+
+    def handle(self, *args, **options):
+        template = Booking.objects.filter(id=options["booking"]).first()
+        if template is None:
+            raise CommandError(f"Booking {options['booking']} does not exist")
+        if (
+            template.payment_status == "Draft"
+            or template.is_deleted
+            or template.cancelled
+        ):
+            raise CommandError(f"Booking {template.id} is not confirmed")
+        detail = template.room_detail.first()
+        if detail is None:
+            raise CommandError(f"Booking {template.id} has no room detail")
+        rooms = Room.objects.filter(
+            organisation__id=template.property_id, is_deleted=False
+        )
+        room_ids = sorted(rooms.values_list("id", flat=True))
+        from_date = options["from_date"]
+        to_date = from_date + datetime.timedelta(days=options["nights"])
+
+        # the fixtures start without room details, so they hold no room until a
+        # worker books one through the write path
+        bookings = []
+        results = []
+        try:
+            for _ in range(options["workers"]):
+                booking = clone(
+                    template,
+                    checkin_date=from_date,
+                    checkout_date=from_date + datetime.timedelta(days=1),
+                )
+                booking.save()
+                bookings.append(booking)
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            started = time.perf_counter()
+            with context.Pool(len(bookings)) as pool:
+                results = pool.map(
+                    update_booking,
+                    [
+                        (
+                            booking.id,
+                            detail,
+                            room_ids,
+                            from_date,
+                            options["nights"],
+                            options["attempts"],
+                            i,
+                        )
+                        for i, booking in enumerate(bookings)
+                    ],
+                )
+            elapsed = time.perf_counter() - started
+            expected = build_room_inventory(
+                rooms.values("id", "organisation_id", "no_of_rooms", "room_numbers"),
+                from_date,
+                to_date,
+            )
+            ledger = {
+                (row.room_id, row.date): row
+                for row in RoomInventory.objects.filter(
+                    room__id__in=room_ids, date__gte=from_date, date__lt=to_date
+                )
+            }
+        finally:
+            for booking in bookings:
+                with transaction.atomic():
+                    for booking_detail in booking.room_detail.all():
+                        booking_detail.delete()
+                    booking.delete()
+
+        accepted = sum(result[0] for result in results)
+        rejected = sum(result[1] for result in results)
+        errors = sum(result[2] for result in results)
+        attempts = len(bookings) * options["attempts"]
+        self.stdout.write(
+            f"{attempts} updates in {elapsed:.2f}s ({attempts / elapsed:.0f}/s), "
+            f"{accepted} accepted, {rejected} rejected as full, {errors} errors"
+        )
+        overbooked = [
+            row
+            for row in expected
+            if row.booked_rooms + row.blocked_rooms > row.total_rooms
+        ]
+        out_of_sync = [
+            row
+            for row in expected
+            if (row.room_id, row.date) not in ledger
+            or (
+                ledger[(row.room_id, row.date)].booked_rooms,
+                ledger[(row.room_id, row.date)].sellable_rooms,
+            )
+            != (row.booked_rooms, row.sellable_rooms)
+        ]
+        if overbooked or out_of_sync or errors:
+            raise CommandError(
+                f"{len(overbooked)} room nights overbooked, {len(out_of_sync)} out "
+                f"of sync with the bookings, {errors} database errors"
+            )
+        self.stdout.write(self.style.SUCCESS("No room night was double booked"))
@@ -0,0 +1,13 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    the trigram indexes of the search documents need the pg_trgm extension, it is
+    installed first so that the migration creating the indexes depends on it
+    """
+
+    dependencies = []
+
+    operations = [TrigramExtension()]
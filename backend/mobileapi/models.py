@@ -1,3 +1,434 @@
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from organisation.models import Organisation, Room
+from package.models import Package, PackageBooking
+from users.models import User
+
+
+class RoomInventory(models.Model):
+    """
+    per night inventory ledger of an organisation room type
+    """
+
+    organisation = models.ForeignKey(
+        Organisation,
+        on_delete=models.CASCADE,
+        related_name="room_inventory",
+        help_text="Organisation to which the inventory belong to",
+    )
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name="inventory",
+        help_text="Room type of the inventory",
+    )
+    date = models.DateField(help_text="Night for which the inventory is recorded")
+    total_rooms = models.PositiveIntegerField(
+        default=0, help_text="Total number of rooms of the room type"
+    )
+    booked_rooms = models.PositiveIntegerField(
+        default=0, help_text="Number of rooms booked for the night"
+    )
+    blocked_rooms = models.PositiveIntegerField(
+        default=0, help_text="Number of rooms set unavailable for the night"
+    )
+    sellable_rooms = models.PositiveIntegerField(
+        default=0, help_text="Number of rooms that can still be booked for the night"
+    )
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.room_id} {self.date} {self.sellable_rooms}"
+
+    class Meta:
+        db_table = "room_inventory"
+        unique_together = ("room", "date")
+        indexes = [models.Index(fields=["organisation", "date"])]
+
+
+RATING_DIMENSIONS = (
+    "location",
+    "comfort",
+    "personnel",
+    "cleanliness",
+    "good_offer",
+    "service",
+)
+
+
+class OrganisationRatingSummary(models.Model):
+    """
+    rating aggregates of an organisation maintained on every rating change
+    """
+
+    organisation = models.OneToOneField(
+        Organisation,
+        on_delete=models.CASCADE,
+        related_name="rating_summary",
+        help_text="Organisation to which the rating summary belong to",
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0, help_text="Number of ratings that are not deleted"
+    )
+    rating_star_sum = models.PositiveIntegerField(default=0)
+    rating_star_average = models.FloatField(
+        null=True, blank=True, db_index=True, help_text="Average of the rating stars"
+    )
+    location_sum = models.PositiveIntegerField(default=0)
+    comfort_sum = models.PositiveIntegerField(default=0)
+    personnel_sum = models.PositiveIntegerField(default=0)
+    cleanliness_sum = models.PositiveIntegerField(default=0)
+    good_offer_sum = models.PositiveIntegerField(default=0)
+    service_sum = models.PositiveIntegerField(default=0)
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def get_average(self, dimension):
+        if not self.rating_count:
+            return None
+        return getattr(self, f"{dimension}_sum") / self.rating_count
+
+    def __str__(self):
+        return f"{self.organisation_id} {self.rating_star_average}"
+
+    class Meta:
+        db_table = "organisation_rating_summary"
+
+
+class DailyBookingRollup(models.Model):
+    """
+    bookings made on a day for an organisation, one row per room category and a
+    row with blank room category holding the totals of the day
+    """
+
+    organisation = models.ForeignKey(
+        Organisation,
+        on_delete=models.CASCADE,
+        related_name="daily_booking_rollup",
+        help_text="Organisation to which the rollup belong to",
+    )
+    date = models.DateField(help_text="Day on which the bookings were made")
+    room_category = models.CharField(
+        max_length=100,
+        blank=True,
+        default="",
+        help_text="Room category of the rollup, blank for the totals of the day",
+    )
+    bookings = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    guests = models.PositiveIntegerField(default=0)
+    rooms = models.PositiveIntegerField(default=0)
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organisation_id} {self.date} {self.room_category}"
+
+    class Meta:
+        db_table = "daily_booking_rollup"
+        unique_together = ("organisation", "date", "room_category")
+
+
+EXPORT_JOB_STATUS = (
+    ("Pending", "Pending"),
+    ("Running", "Running"),
+    ("Completed", "Completed"),
+    ("Failed", "Failed"),
+)
+
+
+class ExportJob(models.Model):
+    """
+    booking export built in the background, identical exports of a day share a key
+    so that the file is built once
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        help_text="User who requested the export",
+    )
+    export_type = models.CharField(
+        max_length=50, help_text="Type of the export booking, package_booking etc"
+    )
+    filename = models.CharField(max_length=200, help_text="Name of the export file")
+    key = models.CharField(
+        max_length=64, db_index=True, help_text="Hash of the export type and filters"
+    )
+    view = models.CharField(
+        max_length=200, help_text="Dotted path of the view the export was requested on"
+    )
+    filters = models.TextField(
+        help_text="Json of the query parameters the export was requested with"
+    )
+    status = models.CharField(
+        max_length=20, choices=EXPORT_JOB_STATUS, default="Pending", db_index=True
+    )
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    download_url = models.CharField(max_length=500, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    completed_on = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        if self.status == "Completed":
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(int(self.processed_rows * 100 / self.total_rows), 99)
+
+    def __str__(self):
+        return f"{self.export_type} {self.filename} {self.status}"
+
+    class Meta:
+        db_table = "export_job"
+        ordering = ["-created_on"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=~models.Q(status="Failed"),
+                name="export_job_unique_key",
+            )
+        ]
+
+
+class RecommendationArtifact(models.Model):
+    """
+    precomputed output of the hotel recommender, a new version is created on every
+    rebuild and the request path only reads the latest one
+    """
+
+    organisation_count = models.PositiveIntegerField(
+        default=0, help_text="Number of organisations the artifact was built from"
+    )
+    features = models.TextField(
+        help_text="Json records of the organisation features given to the recommender"
+    )
+    rankings = models.TextField(
+        help_text="Json of the ranked organisation ids per country and continent"
+    )
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.id} {self.created_on}"
+
+    class Meta:
+        db_table = "recommendation_artifact"
+        ordering = ["-id"]
+
+
+class OrganisationSearchDocument(models.Model):
+    """
+    searchable text of an organisation, its name, location and category, kept
+    current on save so that searches hit the trigram and full text indexes
+    """
+
+    organisation = models.OneToOneField(
+        Organisation,
+        on_delete=models.CASCADE,
+        related_name="search_document",
+        help_text="Organisation to which the search document belong to",
+    )
+    content = models.TextField(
+        help_text="Lower cased searchable text, one field per line"
+    )
+    search_vector = SearchVectorField(null=True, blank=True)
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organisation_id}"
+
+    class Meta:
+        db_table = "organisation_search_document"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="organisation_search_vector"),
+            GinIndex(
+                fields=["content"],
+                name="organisation_search_trigram",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
+
+class PackageSearchDocument(models.Model):
+    """
+    searchable text of a package, its title, type and the search document of its
+    organisation
+    """
+
+    package = models.OneToOneField(
+        Package,
+        on_delete=models.CASCADE,
+        related_name="search_document",
+        help_text="Package to which the search document belong to",
+    )
+    content = models.TextField(
+        help_text="Lower cased searchable text, one field per line"
+    )
+    search_vector = SearchVectorField(null=True, blank=True)
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.package_id}"
+
+    class Meta:
+        db_table = "package_search_document"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="package_search_vector"),
+            GinIndex(
+                fields=["content"],
+                name="package_search_trigram",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
+
+class PopularSearch(models.Model):
+    """
+    number of times a parent and child search key pair was searched, aggregated
+    from the search history events
+    """
+
+    parent_search_key = models.CharField(max_length=200, blank=True, default="")
+    child_search_key = models.CharField(max_length=200, blank=True, default="")
+    count = models.PositiveIntegerField(default=0, db_index=True)
+    last_searched_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.parent_search_key} {self.child_search_key} {self.count}"
+
+    class Meta:
+        db_table = "popular_search"
+        unique_together = ("parent_search_key", "child_search_key")
+
+
+class OrganisationBookingCounter(models.Model):
+    """
+    number of active bookings of an organisation along with its lower cased
+    location, kept up to date from the booking signals
+    """
+
+    organisation = models.OneToOneField(
+        Organisation,
+        on_delete=models.CASCADE,
+        related_name="booking_counter",
+        help_text="Organisation to which the counter belong to",
+    )
+    bookings = models.PositiveIntegerField(
+        default=0, help_text="Bookings which are neither cancelled nor deleted"
+    )
+    city = models.CharField(max_length=200, blank=True, default="")
+    country = models.CharField(max_length=200, blank=True, default="")
+    continent = models.CharField(max_length=200, blank=True, default="")
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organisation_id} {self.bookings}"
+
+    class Meta:
+        db_table = "organisation_booking_counter"
+        indexes = [
+            models.Index(fields=["-bookings"], name="organisation_bookings"),
+        ]
+
+
+class PackageBookingCounter(models.Model):
+    """
+    number of active bookings of a package along with the lower cased location of
+    its organisation
+    """
+
+    package = models.OneToOneField(
+        Package,
+        on_delete=models.CASCADE,
+        related_name="booking_counter",
+        help_text="Package to which the counter belong to",
+    )
+    bookings = models.PositiveIntegerField(
+        default=0, help_text="Bookings which are neither cancelled nor deleted"
+    )
+    city = models.CharField(max_length=200, blank=True, default="")
+    country = models.CharField(max_length=200, blank=True, default="")
+    continent = models.CharField(max_length=200, blank=True, default="")
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.package_id} {self.bookings}"
+
+    class Meta:
+        db_table = "package_booking_counter"
+        indexes = [
+            models.Index(fields=["-bookings"], name="package_bookings"),
+        ]
+
+
+class PackageInventory(models.Model):
+    """
+    booked and available quantity of a package, kept up to date from the package
+    booking signals instead of summing the bookings on every read
+    """
+
+    package = models.OneToOneField(
+        Package,
+        on_delete=models.CASCADE,
+        related_name="inventory",
+        help_text="Package to which the inventory belong to",
+    )
+    quantity = models.PositiveIntegerField(
+        default=0, help_text="Total quantity of the package"
+    )
+    booked_quantity = models.PositiveIntegerField(
+        default=0,
+        help_text="Quantity of the bookings which are not draft, cancelled or deleted",
+    )
+    reserved_quantity = models.PositiveIntegerField(
+        default=0, help_text="Quantity held by the draft bookings until they expire"
+    )
+    available_quantity = models.IntegerField(
+        default=0,
+        db_index=True,
+        help_text="Quantity of the package that can still be booked",
+    )
+    modified_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.package_id} {self.available_quantity}"
+
+    class Meta:
+        db_table = "package_inventory"
+
+
+class PackageReservation(models.Model):
+    """
+    quantity of a package held for a draft booking while it is being paid, the
+    quantity is released on confirmation, cancellation or expiry
+    """
+
+    booking = models.OneToOneField(
+        PackageBooking,
+        on_delete=models.CASCADE,
+        related_name="reservation",
+        help_text="Draft booking for which the quantity is held",
+    )
+    package = models.ForeignKey(
+        Package,
+        on_delete=models.CASCADE,
+        related_name="reservations",
+        help_text="Package of which the quantity is held",
+    )
+    quantity = models.PositiveIntegerField(help_text="Quantity held")
+    expires_on = models.DateTimeField(
+        db_index=True, help_text="Time after which the quantity is released"
+    )
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.booking_id} {self.quantity}"
 
-# Create your models here.
+    class Meta:
+        db_table = "package_reservation"
@@ -1,8 +1,7 @@
-from booking.models import RatingByIndividual
-from django.db.models import Avg
 from rest_framework import serializers
 from mobileapi.serializers.rating import RatingByIndividualSerializer
-from mobileapi.utils.helpers import get_country_flag
+from mobileapi.utils.countries import country_registry
+from mobileapi.utils.ratings import get_rating_summary
 from organisation.models import *
 
 
@@ -92,15 +91,10 @@ class OrganisationSerializer(serializers.ModelSerializer):
     rating_service_average = serializers.IntegerField(read_only=True)
 
     def get_user_rating(self, obj):
-        user_rating = obj.rating.filter(is_deleted=False).aggregate(Avg("rating_star"))
-        return (
-            user_rating.get("rating_star__avg")
-            if user_rating.get("rating_star__avg")
-            else 0
-        )
+        return get_rating_summary(obj).rating_star_average or 0
 
     def get_user_review_count(self, obj):
-        return obj.rating.filter(is_deleted=False).count()
+        return get_rating_summary(obj).rating_count
 
     class Meta:
         model = Organisation
@@ -189,33 +183,18 @@ class OrganisationListInfoSerializer(serializers.ModelSerializer):
     number_of_booked = serializers.IntegerField(read_only=True)
 
     def get_flag_url(self, obj):
-        try:
-            return get_country_flag(obj.location.get("country"))
-        except Exception as e:
-            return get_country_flag(obj.get("location").get("country"))
+        location = obj.get("location") if isinstance(obj, dict) else obj.location
+        return country_registry.get_flag_url((location or {}).get("country"))
 
     def get_user_rating(self, obj):
-        try:
-            user_rating = obj.rating.filter(is_deleted=False).aggregate(
-                Avg("rating_star")
-            )
-        except Exception as e:
-            user_rating = RatingByIndividual.objects.filter(
-                rated_on__id=obj.get("id"), is_deleted=False
-            ).aggregate(Avg("rating_star"))
-        return (
-            user_rating.get("rating_star__avg")
-            if user_rating.get("rating_star__avg")
-            else 0
-        )
+        if isinstance(obj, dict):
+            return obj.get("user_rating") or 0
+        return get_rating_summary(obj).rating_star_average or 0
 
     def get_user_review_count(self, obj):
-        try:
-            return obj.rating.filter(is_deleted=False).count()
-        except Exception as e:
-            return RatingByIndividual.objects.filter(
-                rated_on__id=obj.get("id"), is_deleted=False
-            ).count()
+        if isinstance(obj, dict):
+            return obj.get("user_review_count") or 0
+        return get_rating_summary(obj).rating_count
 
     class Meta:
         model = Organisation
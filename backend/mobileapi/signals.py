@@ -0,0 +1,365 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from booking.models import Booking, BookingDetail, RatingByIndividual
+from common.models import BackgroundImage
+from organisation.models import (
+    Organisation,
+    OrganisationRoomUnavailability,
+    PropertyCategory,
+    Room,
+)
+from package.models import Package, PackageBooking, PackageType
+from mobileapi.models import RoomInventory
+from mobileapi.utils.autocomplete import invalidate_autocomplete
+from mobileapi.utils.dashboard import get_booking_day, schedule_daily_rollup
+from mobileapi.utils.geo_counts import invalidate_geo_counts
+from mobileapi.utils.inventory import sync_room_inventory
+from mobileapi.utils.package_inventory import (
+    apply_package_booking_change,
+    get_booked_quantity,
+    release_package_reservation,
+    sync_package_quantity,
+)
+from mobileapi.utils.popularity import (
+    apply_booking_change,
+    invalidate_popularity,
+    is_active_booking,
+    update_counter_location,
+    update_organisation_counter,
+    update_package_counter,
+    update_package_location,
+)
+from mobileapi.utils.ratings import RATING_FIELDS, apply_rating_change
+from mobileapi.utils.search import (
+    update_organisation_search_document,
+    update_package_search_document,
+)
+
+
+def get_booking_room_ids(booking):
+    return set(
+        BookingDetail.objects.filter(booking_id=booking.pk).values_list(
+            "room_id", flat=True
+        )
+    )
+
+
+def sync_booking_inventory(booking, from_date, to_date, room_ids=()):
+    """
+    sync the ledger of the rooms the booking holds or held, which are the rows
+    the booking views lock, instead of every room of the property
+    """
+    rooms = Room.objects.filter(id__in=get_booking_room_ids(booking) | set(room_ids))
+    sync_room_inventory(rooms, from_date, to_date)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_dates(sender, instance, **kwargs):
+    """
+    keep the dates the booking had before the update, so that the nights it
+    released are synced as well
+    """
+    instance._previous_stay = None
+    instance._previous_property_id = None
+    instance._previous_popularity = None
+    instance._previous_room_ids = set()
+    if instance.pk:
+        instance._previous_room_ids = get_booking_room_ids(instance)
+        previous = (
+            Booking.objects.filter(pk=instance.pk)
+            .values_list(
+                "checkin_date",
+                "checkout_date",
+                "property_id",
+                "is_deleted",
+                "cancelled",
+            )
+            .first()
+        )
+        if previous:
+            instance._previous_stay = previous[:2]
+            instance._previous_property_id = previous[2]
+            instance._previous_popularity = (
+                previous[2],
+                not previous[3] and not previous[4],
+            )
+
+
+@receiver(pre_delete, sender=Booking)
+def remember_booking_rooms(sender, instance, **kwargs):
+    """
+    the room details are deleted along with the booking, so its rooms are kept
+    to sync them once the booking is gone
+    """
+    instance._previous_room_ids = get_booking_room_ids(instance)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def update_booking_inventory(sender, instance, **kwargs):
+    checkin_date, checkout_date = instance.checkin_date, instance.checkout_date
+    previous_stay = getattr(instance, "_previous_stay", None)
+    if previous_stay:
+        checkin_date = min(checkin_date, previous_stay[0])
+        checkout_date = max(checkout_date, previous_stay[1])
+    sync_booking_inventory(
+        instance,
+        checkin_date,
+        checkout_date,
+        getattr(instance, "_previous_room_ids", ()),
+    )
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def update_booking_rollup(sender, instance, **kwargs):
+    if not instance.created_on:
+        return
+    day = get_booking_day(instance)
+    schedule_daily_rollup(instance.property_id, day)
+    previous_property_id = getattr(instance, "_previous_property_id", None)
+    if previous_property_id and previous_property_id != instance.property_id:
+        schedule_daily_rollup(previous_property_id, day)
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_popularity(sender, instance, **kwargs):
+    apply_booking_change(
+        update_organisation_counter,
+        getattr(instance, "_previous_popularity", None),
+        (instance.property_id, is_active_booking(instance)),
+    )
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_popularity(sender, instance, **kwargs):
+    apply_booking_change(
+        update_organisation_counter,
+        (instance.property_id, is_active_booking(instance)),
+        None,
+    )
+
+
+@receiver(pre_save, sender=PackageBooking)
+def remember_package_booking(sender, instance, **kwargs):
+    instance._previous_popularity = None
+    instance._previous_booked_quantity = None
+    if instance.pk:
+        previous = (
+            PackageBooking.objects.filter(pk=instance.pk)
+            .only("package", "is_deleted", "cancelled", "payment_status", "quantity")
+            .first()
+        )
+        if previous:
+            instance._previous_popularity = (
+                previous.package_id,
+                is_active_booking(previous),
+            )
+            instance._previous_booked_quantity = (
+                previous.package_id,
+                get_booked_quantity(previous),
+            )
+
+
+@receiver(post_save, sender=PackageBooking)
+def update_package_booking_popularity(sender, instance, **kwargs):
+    apply_booking_change(
+        update_package_counter,
+        getattr(instance, "_previous_popularity", None),
+        (instance.package_id, is_active_booking(instance)),
+    )
+
+
+@receiver(post_delete, sender=PackageBooking)
+def remove_package_booking_popularity(sender, instance, **kwargs):
+    apply_booking_change(
+        update_package_counter,
+        (instance.package_id, is_active_booking(instance)),
+        None,
+    )
+
+
+@receiver(post_save, sender=PackageBooking)
+def update_package_inventory(sender, instance, **kwargs):
+    if instance.payment_status != "Draft" or instance.is_deleted or instance.cancelled:
+        release_package_reservation(instance)
+    apply_package_booking_change(
+        getattr(instance, "_previous_booked_quantity", None),
+        (instance.package_id, get_booked_quantity(instance)),
+    )
+
+
+@receiver(pre_delete, sender=PackageBooking)
+def release_package_booking(sender, instance, **kwargs):
+    release_package_reservation(instance)
+
+
+@receiver(post_delete, sender=PackageBooking)
+def remove_package_inventory(sender, instance, **kwargs):
+    apply_package_booking_change(
+        (instance.package_id, get_booked_quantity(instance)), None
+    )
+
+
+@receiver(pre_save, sender=BookingDetail)
+def remember_booking_detail_room(sender, instance, **kwargs):
+    instance._previous_room_id = None
+    if instance.pk:
+        instance._previous_room_id = (
+            BookingDetail.objects.filter(pk=instance.pk)
+            .values_list("room_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=BookingDetail)
+@receiver(post_delete, sender=BookingDetail)
+def update_booking_detail_inventory(sender, instance, **kwargs):
+    booking = Booking.objects.filter(id=instance.booking_id).first()
+    if booking:
+        sync_booking_inventory(
+            booking,
+            booking.checkin_date,
+            booking.checkout_date,
+            {instance.room_id, getattr(instance, "_previous_room_id", None)} - {None},
+        )
+        schedule_daily_rollup(booking.property_id, get_booking_day(booking))
+
+
+@receiver(pre_save, sender=OrganisationRoomUnavailability)
+def remember_unavailability_dates(sender, instance, **kwargs):
+    instance._previous_stay = None
+    if instance.pk:
+        instance._previous_stay = (
+            OrganisationRoomUnavailability.objects.filter(pk=instance.pk)
+            .values_list("from_date", "to_date")
+            .first()
+        )
+
+
+@receiver(post_save, sender=OrganisationRoomUnavailability)
+@receiver(post_delete, sender=OrganisationRoomUnavailability)
+def update_unavailability_inventory(sender, instance, **kwargs):
+    from_date, to_date = instance.from_date, instance.to_date
+    previous_stay = getattr(instance, "_previous_stay", None)
+    if previous_stay:
+        from_date = min(from_date, previous_stay[0])
+        to_date = max(to_date, previous_stay[1])
+    rooms = Room.objects.filter(organisation__id=instance.organisation_id)
+    # unavailability to_date is inclusive
+    sync_room_inventory(rooms, from_date, to_date + timedelta(days=1))
+
+
+@receiver(post_save, sender=Room)
+def update_room_inventory(sender, instance, **kwargs):
+    """
+    room numbers or deletion of the room changes the inventory on every night
+    already present in the ledger
+    """
+    if instance.is_deleted:
+        RoomInventory.objects.filter(room=instance).delete()
+        return
+    dates = RoomInventory.objects.filter(room=instance).aggregate(
+        from_date=Min("date"), to_date=Max("date")
+    )
+    if dates.get("from_date"):
+        sync_room_inventory(
+            Room.objects.filter(id=instance.id),
+            dates.get("from_date"),
+            dates.get("to_date") + timedelta(days=1),
+        )
+
+
+@receiver(pre_save, sender=RatingByIndividual)
+def remember_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            RatingByIndividual.objects.filter(pk=instance.pk)
+            .values("rated_on_id", "is_deleted", *RATING_FIELDS)
+            .first()
+        )
+
+
+@receiver(post_save, sender=RatingByIndividual)
+def update_rating_summary(sender, instance, **kwargs):
+    current = {field: getattr(instance, field) for field in RATING_FIELDS}
+    current["is_deleted"] = instance.is_deleted
+    previous = getattr(instance, "_previous_rating", None)
+    if previous and previous.get("rated_on_id") != instance.rated_on_id:
+        apply_rating_change(previous.get("rated_on_id"), previous=previous)
+        previous = None
+    apply_rating_change(instance.rated_on_id, previous=previous, current=current)
+
+
+@receiver(post_delete, sender=RatingByIndividual)
+def remove_rating_summary(sender, instance, **kwargs):
+    previous = {field: getattr(instance, field) for field in RATING_FIELDS}
+    previous["is_deleted"] = instance.is_deleted
+    apply_rating_change(instance.rated_on_id, previous=previous)
+
+
+@receiver(post_save, sender=Organisation)
+@receiver(post_delete, sender=Organisation)
+@receiver(post_save, sender=BackgroundImage)
+@receiver(post_delete, sender=BackgroundImage)
+def update_geo_counts(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_geo_counts)
+
+
+@receiver(post_save, sender=Organisation)
+def update_organisation_search(sender, instance, **kwargs):
+    update_organisation_search_document(instance)
+
+
+@receiver(post_save, sender=Package)
+def update_package_search(sender, instance, **kwargs):
+    update_package_search_document(instance)
+
+
+@receiver(post_save, sender=PropertyCategory)
+def update_category_search(sender, instance, **kwargs):
+    for organisation in Organisation.objects.filter(category=instance):
+        update_organisation_search_document(organisation)
+
+
+@receiver(post_save, sender=PackageType)
+def update_package_type_search(sender, instance, **kwargs):
+    for package in Package.objects.filter(package_type=instance):
+        update_package_search_document(package)
+
+
+@receiver(post_save, sender=Organisation)
+@receiver(post_delete, sender=Organisation)
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+@receiver(post_save, sender=PackageType)
+@receiver(post_save, sender=PropertyCategory)
+def update_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_autocomplete)
+
+
+@receiver(post_save, sender=Organisation)
+def update_organisation_popularity(sender, instance, **kwargs):
+    update_counter_location(instance)
+
+
+@receiver(post_save, sender=Package)
+def update_package_popularity(sender, instance, **kwargs):
+    update_package_location(instance)
+
+
+@receiver(post_save, sender=Package)
+def update_package_quantity(sender, instance, **kwargs):
+    sync_package_quantity(instance)
+
+
+@receiver(post_delete, sender=Organisation)
+@receiver(post_delete, sender=Package)
+def remove_popularity(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_popularity)
@@ -4,7 +4,8 @@ from mobileapi.views.dashboard import (
     DashboardTodaysBookingView,
     DashboardTotalBooking,
     DashboardTotalAnalytics,
-    DashboardTodayToBeCheckInListView
+    DashboardTodayToBeCheckInListView,
+    DashboardAnalyticsView,
 )
 
 
@@ -13,5 +14,6 @@ urlpatterns = [
     path("dashboard_todays_booking/", DashboardTodaysBookingView.as_view()),
     path("dashboard_total_booking/", DashboardTotalBooking.as_view()),
     path("dashboard_total_analytics/", DashboardTotalAnalytics.as_view()),
-    path("dashboard_today_checkin/", DashboardTodayToBeCheckInListView.as_view())
+    path("dashboard_today_checkin/", DashboardTodayToBeCheckInListView.as_view()),
+    path("dashboard_analytics/", DashboardAnalyticsView.as_view()),
 ]
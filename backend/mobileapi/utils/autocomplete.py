@@ -0,0 +1,140 @@
+import bisect
+import datetime
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+
+from organisation.models import Organisation
+from package.models import Package
+
+AUTOCOMPLETE_VERSION_KEY = "autocomplete_version"
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MEMO_SIZE = 10000
+ORGANISATION_LOCATION_TERMS = ("city", "country", "street_name", "continent")
+
+
+class AutocompleteIndex:
+    """
+    sorted array of the normalized terms, a term is reachable from the start of
+    each of its words, suggestions of a prefix are found with a bisect and the
+    matches ranked by the popularity weight of the term
+    """
+
+    def __init__(self, weighted_terms):
+        weights = Counter()
+        displays = {}
+        for term, weight in weighted_terms:
+            if not term or not str(term).strip():
+                continue
+            display = " ".join(str(term).split()).title()
+            normalized = display.lower()
+            weights[normalized] += weight
+            displays.setdefault(normalized, display)
+        entries = []
+        for normalized in weights:
+            words = normalized.split(" ")
+            for index in range(len(words)):
+                entries.append((" ".join(words[index:]), normalized))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.terms = [term for _, term in entries]
+        self.weights = weights
+        self.displays = displays
+        self.memo = {}
+
+    def suggest(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        prefix = " ".join(str(prefix).lower().split())
+        if not prefix:
+            return []
+        if (prefix, limit) in self.memo:
+            return self.memo[(prefix, limit)]
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", lo=start)
+        matches = set(self.terms[start:end])
+        suggestions = [
+            self.displays[term]
+            for term in sorted(matches, key=lambda term: (-self.weights[term], term))[
+                :limit
+            ]
+        ]
+        if len(self.memo) >= AUTOCOMPLETE_MEMO_SIZE:
+            self.memo.clear()
+        self.memo[(prefix, limit)] = suggestions
+        return suggestions
+
+
+def get_package_terms():
+    """
+    terms of the packages open for booking today, weighted by the number of
+    packages they appear in
+    """
+    packages = Package.objects.filter(
+        is_deleted=False,
+        booking_start_date__lte=datetime.date.today(),
+        booking_end_date__gte=datetime.date.today(),
+    ).values_list(
+        "package_type__name",
+        "title",
+        "organisation__name",
+        "organisation__location",
+        "organisation__category__name",
+    )
+    for package_type, title, organisation, location, category in packages:
+        location = location or {}
+        for term in ORGANISATION_LOCATION_TERMS:
+            yield location.get(term), 1
+        yield organisation, 1
+        yield package_type, 1
+        yield title, 1
+        yield category, 1
+
+
+def get_organisation_terms():
+    organisations = Organisation.objects.filter(
+        is_deleted=False, property_status="Published", is_visible=True
+    ).values_list("name", "location")
+    for name, location in organisations:
+        location = location or {}
+        yield name, 1
+        for term in ORGANISATION_LOCATION_TERMS:
+            yield location.get(term), 1
+
+
+INDEX_BUILDERS = {
+    "package": get_package_terms,
+    "organisation": get_organisation_terms,
+}
+_indexes = {}
+_lock = threading.Lock()
+
+
+def invalidate_autocomplete():
+    """
+    the indexes of every process are rebuilt on their next query
+    """
+    try:
+        cache.incr(AUTOCOMPLETE_VERSION_KEY)
+    except ValueError:
+        cache.set(AUTOCOMPLETE_VERSION_KEY, 1, None)
+
+
+def get_autocomplete_index(name):
+    """
+    index built once per version and day, as packages open and close for booking
+    with the date
+    """
+    version = (
+        cache.get_or_set(AUTOCOMPLETE_VERSION_KEY, 1, None),
+        datetime.date.today(),
+    )
+    with _lock:
+        built = _indexes.get(name)
+        if built is None or built[0] != version:
+            built = (version, AutocompleteIndex(INDEX_BUILDERS[name]()))
+            _indexes[name] = built
+        return built[1]
+
+
+def get_suggestions(name, prefix, limit=AUTOCOMPLETE_LIMIT):
+    return get_autocomplete_index(name).suggest(prefix, limit)
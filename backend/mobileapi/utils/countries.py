@@ -0,0 +1,70 @@
+from backend.countries_list import countries
+
+# alternative names of the countries mapped to their alpha 2 code
+COUNTRY_ALIASES = {
+    "usa": "US",
+    "america": "US",
+    "united states": "US",
+    "uk": "GB",
+    "england": "GB",
+    "great britain": "GB",
+    "united kingdom": "GB",
+    "uae": "AE",
+    "russia": "RU",
+    "south korea": "KR",
+    "korea": "KR",
+    "north korea": "KP",
+    "vietnam": "VN",
+    "iran": "IR",
+    "syria": "SY",
+    "laos": "LA",
+    "bolivia": "BO",
+    "venezuela": "VE",
+    "tanzania": "TZ",
+    "czechia": "CZ",
+    "czech republic": "CZ",
+}
+
+
+class CountryRegistry:
+    """
+    metadata of the countries indexed once by lower cased name, alpha 2 code and
+    aliases so that every lookup is a dict access, the code and the aliases are
+    only indexed for the countries whose entry has an alpha2_code
+    """
+
+    def __init__(self, countries_list, aliases=None):
+        self.countries = []
+        self.index = {}
+        for country in countries_list:
+            metadata = {
+                "name": country.get("name"),
+                "code": country.get("alpha2_code"),
+                "flag_url": country.get("flag_url"),
+            }
+            self.countries.append(metadata)
+            for key in (metadata["name"], metadata["code"]):
+                if key:
+                    self.index.setdefault(key.strip().lower(), metadata)
+        for alias, code in (aliases or {}).items():
+            if code.lower() in self.index:
+                self.index.setdefault(alias, self.index[code.lower()])
+
+    def get(self, value):
+        if not value or not isinstance(value, str):
+            return None
+        return self.index.get(value.strip().lower())
+
+    def get_flag_url(self, value):
+        country = self.get(value)
+        return country.get("flag_url") if country else None
+
+
+country_registry = CountryRegistry(countries, COUNTRY_ALIASES)
+
+
+def get_flag_url(name):
+    """
+    flag url of the country from its name, iso code or alias
+    """
+    return country_registry.get_flag_url(name)
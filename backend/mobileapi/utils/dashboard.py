@@ -0,0 +1,227 @@
+import datetime
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from booking.models import Booking
+from organisation.models import Organisation
+from mobileapi.models import DailyBookingRollup
+from mobileapi.utils.inventory import ROOM_CATEGORIES
+
+GRANULARITY_FUNCTIONS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+# organisation days whose rollup is rebuilt when the current transaction commits
+_pending_rollups = threading.local()
+
+
+def get_period_start(date_, granularity):
+    if granularity == "week":
+        return date_ - datetime.timedelta(days=date_.weekday())
+    if granularity == "month":
+        return date_.replace(day=1)
+    return date_
+
+
+def get_periods(from_date, to_date, granularity):
+    """
+    list out the start date of every period between from_date and to_date
+    """
+    periods = []
+    period = get_period_start(from_date, granularity)
+    while period <= to_date:
+        periods.append(period)
+        if granularity == "month":
+            period = (period + datetime.timedelta(days=32)).replace(day=1)
+        elif granularity == "week":
+            period = period + datetime.timedelta(days=7)
+        else:
+            period = period + datetime.timedelta(days=1)
+    return periods
+
+
+def get_booking_day(booking):
+    """
+    day on which the booking was made in the current timezone
+    """
+    if timezone.is_aware(booking.created_on):
+        return timezone.localtime(booking.created_on).date()
+    return booking.created_on.date()
+
+
+def rebuild_daily_rollups(organisation_id, from_date, to_date):
+    """
+    helper function to recalculate the daily booking rollups of the organisation
+    between from_date and to_date from its bookings, the rebuilds of an
+    organisation are serialized on its row so that two bookings saved at once
+    don't both insert the rollups of the day. The row is locked FOR NO KEY UPDATE,
+    which doesn't wait for the inserts of the bookings referencing it
+    """
+    with transaction.atomic():
+        list(
+            Organisation.objects.select_for_update(no_key=True)
+            .filter(id=organisation_id)
+            .values_list("id", flat=True)
+        )
+        return write_daily_rollups(organisation_id, from_date, to_date)
+
+
+def schedule_daily_rollup(organisation_id, day):
+    """
+    rebuild the rollup of the organisation day once the transaction commits, the
+    booking and its room details saved in one transaction rebuild it only once.
+    Every call registers a rebuild and the first one to run clears the day, so a
+    day left pending by a rolled back transaction is rebuilt by the next one
+    """
+    pending = getattr(_pending_rollups, "days", None)
+    if pending is None:
+        pending = _pending_rollups.days = set()
+    key = (organisation_id, day)
+    pending.add(key)
+
+    def rebuild():
+        if key in pending:
+            pending.discard(key)
+            rebuild_daily_rollups(organisation_id, day, day)
+
+    transaction.on_commit(rebuild)
+
+
+def write_daily_rollups(organisation_id, from_date, to_date):
+    bookings = Booking.objects.filter(
+        created_on__date__gte=from_date,
+        created_on__date__lte=to_date,
+        is_deleted=False,
+        cancelled=False,
+        property__id=organisation_id,
+    ).annotate(day=TruncDate("created_on"))
+
+    rollups = {}
+
+    def get_rollup(day, room_category=""):
+        if (day, room_category) not in rollups:
+            rollups[(day, room_category)] = DailyBookingRollup(
+                organisation_id=organisation_id, date=day, room_category=room_category
+            )
+        return rollups[(day, room_category)]
+
+    for row in bookings.values("day").annotate(
+        number_of_bookings=Count("id"), total_revenue=Sum("paid_amount")
+    ):
+        rollup = get_rollup(row.get("day"))
+        rollup.bookings = row.get("number_of_bookings")
+        rollup.revenue = row.get("total_revenue") or 0
+
+    for row in bookings.values("day", "room_detail__room__category").annotate(
+        number_of_bookings=Count("id", distinct=True),
+        total_revenue=Sum("paid_amount"),
+        total_guests=Sum(
+            F("room_detail__no_of_children") + F("room_detail__no_of_adults")
+        ),
+        total_rooms=Sum("room_detail__no_of_rooms"),
+    ):
+        rollup = get_rollup(row.get("day"))
+        rollup.guests += row.get("total_guests") or 0
+        rollup.rooms += row.get("total_rooms") or 0
+        if not row.get("room_detail__room__category"):
+            continue
+        rollup = get_rollup(row.get("day"), row.get("room_detail__room__category"))
+        rollup.bookings = row.get("number_of_bookings")
+        rollup.revenue = row.get("total_revenue") or 0
+        rollup.guests = row.get("total_guests") or 0
+        rollup.rooms = row.get("total_rooms") or 0
+
+    DailyBookingRollup.objects.filter(
+        organisation__id=organisation_id, date__gte=from_date, date__lte=to_date
+    ).delete()
+    DailyBookingRollup.objects.bulk_create(rollups.values())
+    return len(rollups)
+
+
+def get_booking_analytics(organisation, from_date, to_date, granularity="month"):
+    """
+    helper function to get the booking count, revenue, guests and rooms of the
+    organisation for every period and room category between from_date and
+    to_date from the daily booking rollups
+    """
+    if granularity not in GRANULARITY_FUNCTIONS:
+        raise ValueError(f"invalid granularity {granularity}")
+    trunc = GRANULARITY_FUNCTIONS[granularity]
+    rollups = (
+        DailyBookingRollup.objects.filter(
+            organisation=organisation, date__gte=from_date, date__lte=to_date
+        )
+        .annotate(period=trunc("date"))
+        .values("period", "room_category")
+        .annotate(
+            total_bookings=Sum("bookings"),
+            total_revenue=Sum("revenue"),
+            total_guests=Sum("guests"),
+            total_rooms=Sum("rooms"),
+        )
+    )
+
+    periods = get_periods(from_date, to_date, granularity)
+    analytics = {
+        "periods": periods,
+        "categories": list(ROOM_CATEGORIES),
+        "bookings": {period: 0 for period in periods},
+        "revenue": {period: 0 for period in periods},
+        "guests": {period: 0 for period in periods},
+        "rooms": {period: 0 for period in periods},
+        "category_bookings": defaultdict(lambda: defaultdict(int)),
+        "category_revenue": defaultdict(lambda: defaultdict(int)),
+    }
+    for row in rollups:
+        period = row.get("period")
+        category = row.get("room_category")
+        if not category:
+            analytics["bookings"][period] = row.get("total_bookings")
+            analytics["revenue"][period] = row.get("total_revenue")
+            analytics["guests"][period] = row.get("total_guests")
+            analytics["rooms"][period] = row.get("total_rooms")
+            continue
+        if category not in analytics["categories"]:
+            analytics["categories"].append(category)
+        analytics["category_bookings"][period][category] = row.get("total_bookings")
+        analytics["category_revenue"][period][category] = row.get("total_revenue")
+    return analytics
+
+
+def get_dashboard_totals(organisation, today=None):
+    """
+    today and yesterday booking tiles along with the rooms occupied in the current
+    and last month, calculated from a single day wise analytics
+    """
+    today = today or datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+    first = today.replace(day=1)
+    last_month = (first - datetime.timedelta(days=1)).replace(day=1)
+    analytics = get_booking_analytics(organisation, last_month, today, "day")
+
+    def total(metric, from_date, to_date=today):
+        return sum(
+            value
+            for period, value in analytics[metric].items()
+            if from_date <= period <= to_date
+        )
+
+    return {
+        "today_booking_count": analytics["bookings"][today],
+        "yesterday_booking_count": analytics["bookings"][yesterday],
+        "today_guest_count": analytics["guests"][today],
+        "yesterday_guest_count": analytics["guests"][yesterday],
+        "today_revenue": analytics["revenue"][today],
+        "yesterday_revenue": analytics["revenue"][yesterday],
+        "bookings_occupy_current_month": total("rooms", first),
+        "bookings_occupy_last_month": total(
+            "rooms", last_month, first - datetime.timedelta(days=1)
+        ),
+    }
@@ -0,0 +1,76 @@
+from collections import Counter
+
+from django.db.models import Max, Q
+
+from organisation.models import PropertyCategory
+
+FACILITIES_PROPERTY_OPTIONS = (
+    ("Desk/workspace", "Desk/workspace"),
+    ("Private pool", "Private pool"),
+    ("Gym", "Gym"),
+)
+
+
+def get_organisation_facets(queryset):
+    """
+    helper function to count the search filters of the organisations, the filtered
+    queryset is evaluated once and every facet is counted in a single pass
+    """
+    organisations = queryset.annotate(
+        max_room_price=Max("rooms__price", filter=Q(rooms__is_deleted=False))
+    ).values(
+        "id",
+        "category",
+        "facilities",
+        "user_rating",
+        "min_room_price",
+        "max_room_price",
+    )
+
+    rating_count = Counter()
+    category_count = Counter()
+    facility_count = Counter()
+    min_room_price = None
+    max_room_price = None
+    for organisation in organisations:
+        rating_count[organisation.get("user_rating")] += 1
+        category_count[organisation.get("category")] += 1
+        facilities = organisation.get("facilities") or []
+        for facility in FACILITIES_PROPERTY_OPTIONS:
+            if facility[1] in facilities:
+                facility_count[facility[1]] += 1
+        if organisation.get("min_room_price") is not None:
+            min_room_price = (
+                organisation.get("min_room_price")
+                if min_room_price is None
+                else min(min_room_price, organisation.get("min_room_price"))
+            )
+        if organisation.get("max_room_price") is not None:
+            max_room_price = (
+                organisation.get("max_room_price")
+                if max_room_price is None
+                else max(max_room_price, organisation.get("max_room_price"))
+            )
+
+    rating_filter_count = [
+        {"rating_star": i, "rating_star_count": rating_count[i]} for i in range(1, 6)
+    ]
+    property_type_filter_count = [
+        {
+            "id": category.get("id"),
+            "property_type": category.get("name"),
+            "property_type_count": category_count[category.get("id")],
+        }
+        for category in PropertyCategory.objects.values("id", "name")
+    ]
+    facility_filter_count = [
+        {"facility_name": facility[1], "facility_count": facility_count[facility[1]]}
+        for facility in FACILITIES_PROPERTY_OPTIONS
+    ]
+    return {
+        "min_room_price": min_room_price,
+        "max_room_price": max_room_price,
+        "facility_filter_count": facility_filter_count,
+        "property_type_filter_count": property_type_filter_count,
+        "rating_filter_count": rating_filter_count,
+    }
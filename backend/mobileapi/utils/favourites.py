@@ -0,0 +1,14 @@
+from organisation.models import UserOrganisationFavorites
+
+
+def get_favourite_organisation_ids(user, organisation_ids=None):
+    """
+    helper function to get the ids of the organisations the user marked as
+    favourite, limited to organisation_ids when provided, in a single query
+    """
+    if not user.is_authenticated:
+        return set()
+    favourites = UserOrganisationFavorites.objects.filter(user=user)
+    if organisation_ids is not None:
+        favourites = favourites.filter(organisation__id__in=organisation_ids)
+    return set(favourites.values_list("organisation__id", flat=True))
@@ -0,0 +1,17 @@
+import copy
+
+
+def clone(instance, **values):
+    """
+    unsaved copy of the instance for the staging commands, the unique fields
+    which have a default get a new value so that the copy can be inserted next
+    to the original
+    """
+    instance = copy.copy(instance)
+    instance.pk = None
+    for field in instance._meta.concrete_fields:
+        if field.unique and field.has_default():
+            setattr(instance, field.attname, field.get_default())
+    for name, value in values.items():
+        setattr(instance, name, value)
+    return instance
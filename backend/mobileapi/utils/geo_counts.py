@@ -0,0 +1,128 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from common.models import BackgroundImage
+from organisation.models import Organisation
+from mobileapi.utils.countries import get_flag_url
+
+DEFAULT_BACKGROUND_IMAGE = "https://img2.pngio.com/index-of-areaedu-wp-content-uploads-2016-02-default-png-600_600.png"
+GEO_COUNTS_CACHE_TIMEOUT = 60 * 60
+GEO_COUNTS_VERSION_KEY = "geo_counts_version"
+
+
+def get_geo_counts_version():
+    return cache.get_or_set(GEO_COUNTS_VERSION_KEY, 1, None)
+
+
+def invalidate_geo_counts():
+    """
+    every cached count is keyed with the version, bumping it drops all of them
+    """
+    try:
+        cache.incr(GEO_COUNTS_VERSION_KEY)
+    except ValueError:
+        cache.set(GEO_COUNTS_VERSION_KEY, 1, None)
+
+
+def get_background_images(names):
+    """
+    helper function to load the background image of every name in a single query,
+    the first image whose name contains the name is used
+    """
+    names = [name for name in names if name]
+    if not names:
+        return {}
+    images = (
+        BackgroundImage.objects.filter(
+            reduce(or_, [Q(name__icontains=name) for name in names])
+        )
+        .order_by("pk")
+        .values_list("name", "image_url")
+    )
+    background_images = {}
+    for image_name, image_url in images:
+        for name in names:
+            if name not in background_images and name.lower() in image_name.lower():
+                background_images[name] = image_url
+    return background_images
+
+
+def get_country_property_counts(continent=None):
+    """
+    number of organisations of every country counted with one group by on the
+    country of the location, cached until an organisation changes
+    """
+    key = "country_property_counts:{}:{}".format(
+        get_geo_counts_version(), (continent or "").lower()
+    )
+    country_data = cache.get(key)
+    if country_data is not None:
+        return country_data
+
+    organisations = Organisation.objects.filter(is_deleted=False)
+    if continent:
+        organisations = organisations.filter(location__continent__icontains=continent)
+    country_count = Counter()
+    for row in organisations.values("location__country").annotate(
+        no_of_property=Count("id")
+    ):
+        country = row.get("location__country")
+        country = country.capitalize() if country else "no_country"
+        country_count[country] += row.get("no_of_property")
+
+    background_images = get_background_images(list(country_count))
+    country_data = []
+    for country, no_of_property in country_count.items():
+        context = {
+            "no_of_property": no_of_property,
+            "location": country,
+            "flag_url": get_flag_url(country),
+            "background_image": background_images.get(
+                country, DEFAULT_BACKGROUND_IMAGE
+            ),
+        }
+        if continent:
+            context.update({"continent": continent.capitalize()})
+        country_data.append(context)
+    cache.set(key, country_data, GEO_COUNTS_CACHE_TIMEOUT)
+    return country_data
+
+
+def get_continent_property_counts():
+    """
+    number of visible organisations of every continent counted with one group by
+    on the continent of the location, cached until an organisation changes
+    """
+    key = f"continent_property_counts:{get_geo_counts_version()}"
+    continent_data = cache.get(key)
+    if continent_data is not None:
+        return continent_data
+
+    organisations = Organisation.objects.filter(is_deleted=False, is_visible=True)
+    continent_count = Counter()
+    for row in organisations.values("location__continent").annotate(
+        no_of_property=Count("id")
+    ):
+        if row.get("location__continent"):
+            continent_count[row.get("location__continent").lower()] += row.get(
+                "no_of_property"
+            )
+
+    background_images = get_background_images(list(continent_count))
+    continent_data = [
+        {
+            "no_of_property": no_of_property,
+            "continent": continent,
+            "flag_url": get_flag_url(continent),
+            "background_image": background_images.get(
+                continent, DEFAULT_BACKGROUND_IMAGE
+            ),
+        }
+        for continent, no_of_property in continent_count.items()
+    ]
+    cache.set(key, continent_data, GEO_COUNTS_CACHE_TIMEOUT)
+    return continent_data
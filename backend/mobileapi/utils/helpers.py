@@ -1,25 +1,24 @@
 from django.db.models import CharField, IntegerField
-from booking.models import Booking
 import datetime
 
-from django.db.models import F, Sum, Avg, Prefetch, Q, Value
+from django.db.models import F, Sum, Prefetch, Q, Value
 from django.db.models.aggregates import Min
 from django.db.models.functions import Coalesce
 
-from backend.countries_list import countries
 from rest_framework.serializers import ValidationError
 from datetime import timedelta
 from django.db import models
 
-from organisation.models import Organisation, OrganisationRoomUnavailability, Room
-from common.models import UserSearchHistory
+from organisation.models import Organisation, Room
+from mobileapi.utils.countries import get_flag_url
+from mobileapi.utils.inventory import filter_available_organisations
+from mobileapi.utils.overlap import overlap_night
+from mobileapi.utils.search import search
+from mobileapi.utils.search_history import record_search
 
 
 def get_country_flag(country):
-    for c in countries:
-        if c["name"] == country.capitalize():
-            return c["flag_url"]
-    return None
+    return get_flag_url(country)
 
 
 def get_dates_between_two_dates(from_date, to_date):
@@ -74,9 +73,12 @@ def get_filter_organisations(request):
             Sum(
                 "booked_room__no_of_rooms",
                 filter=Q(
+                    overlap_night(
+                        "booked_room__booking__checkin_date",
+                        "booked_room__booking__checkout_date",
+                        datetime.date.today(),
+                    ),
                     booked_room__booking__is_deleted=False,
-                    booked_room__booking__checkin_date__gte=datetime.date.today(),
-                    booked_room__booking__checkout_date__gt=datetime.date.today(),
                 ),
             ),
             0,
@@ -93,6 +95,9 @@ def get_filter_organisations(request):
     if max_price and float(max_price) < 0:
         raise ValidationError({"error": "max_price must be valid positive value"})
 
+    if not str(no_of_rooms).isdigit():
+        raise ValidationError({"error": "no_of_rooms must be valid positive value"})
+
     if min_price and max_price:
         if float(max_price) < float(min_price):
             raise ValidationError(
@@ -101,39 +106,18 @@ def get_filter_organisations(request):
 
     search_key = request.query_params.get("search_key")
     if search_key:
-        queryset = queryset.filter(
-            Q(name__icontains=search_key)
-            | Q(location__city__icontains=search_key)
-            | Q(location__country__icontains=search_key)
-            | Q(category__name__icontains=search_key)
-        )
+        queryset = search(queryset, search_key, rank=True)
 
     parent_search_key = request.query_params.get("parent_search_key")
     if parent_search_key:
-        queryset = queryset.filter(
-            Q(name__icontains=parent_search_key)
-            | Q(location__city__icontains=parent_search_key)
-            | Q(location__country__icontains=parent_search_key)
-            | Q(location__continent__icontains=parent_search_key)
-            | Q(category__name__icontains=parent_search_key)
-        )
+        queryset = search(queryset, parent_search_key)
 
     child_search_key = request.query_params.get("child_search_key")
     if child_search_key:
-        queryset = queryset.filter(
-            Q(name__icontains=child_search_key)
-            | Q(location__city__icontains=child_search_key)
-            | Q(location__country__icontains=child_search_key)
-            | Q(location__continent__icontains=child_search_key)
-            | Q(category__name__icontains=child_search_key)
-        )
+        queryset = search(queryset, child_search_key)
 
     if parent_search_key or child_search_key:
-        res = {
-            "parent_search_key": parent_search_key.title() if parent_search_key else "",
-            "child_search_key": child_search_key.title() if child_search_key else "",
-        }
-        UserSearchHistory.objects.create(content=res)
+        record_search(parent_search_key, child_search_key)
 
     if facilities:
         queryset = queryset.filter(facilities__contains=facilities)
@@ -168,58 +152,14 @@ def get_filter_organisations(request):
         raise ValidationError({"error": "checkin_date is required"})
 
     if checkin_date and checkout_date:
-        total_unavailable = OrganisationRoomUnavailability.objects.filter(
-            Q(
-                from_date__gte=checkin_date,
-                to_date__lte=checkout_date,
-            )
-            | Q(
-                from_date__lte=checkin_date,
-                to_date__gte=checkin_date,
-            )
-            | Q(
-                from_date__lte=checkout_date,
-                to_date__gte=checkout_date,
-            ),
-            is_deleted=False,
+        # organisations without the requested rooms on any night of the stay are
+        # excluded in the database from the inventory ledger
+        queryset = filter_available_organisations(
+            queryset,
+            datetime.datetime.strptime(checkin_date, "%Y-%m-%d").date(),
+            datetime.datetime.strptime(checkout_date, "%Y-%m-%d").date(),
+            no_of_rooms=max(int(no_of_rooms), 1),
         )
-        total_bookings = Booking.objects.filter(
-            ~Q(payment_status="Draft"),
-            Q(
-                checkin_date__gte=checkin_date,
-                checkout_date__lte=checkout_date,
-            )
-            | Q(
-                checkin_date__lte=checkin_date,
-                checkout_date__gte=checkin_date,
-            )
-            | Q(
-                checkin_date__lte=checkout_date,
-                checkout_date__gte=checkout_date,
-            ),
-            is_deleted=False,
-            cancelled=False,
-        )
-        queryset = queryset.annotate(total_rooms=Sum("rooms__no_of_rooms"))
-        exclude_org = []
-
-        for q in list(queryset):
-            total_room_booked = (
-                total_bookings.filter(property=q).aggregate(
-                    total_room_booked=Coalesce(Sum("room_detail__no_of_rooms"), 0)
-                )
-            ).get("total_room_booked")
-            total_room_unavailable = (
-                total_unavailable.filter(organisation=q).aggregate(
-                    total_room_unavailable=Coalesce(Sum(ArrayLength("room_numbers")), 0)
-                )
-            ).get("total_room_unavailable")
-            total_room_available = (
-                q.total_rooms - total_room_booked - total_room_unavailable
-            )
-            if total_room_available <= no_of_rooms:
-                exclude_org.append(q.id)
-        queryset = queryset.exclude(id__in=exclude_org)
     if max_price or min_price:
         organisation_ids = rooms.filter(
             price__lte=max_price if max_price else 100000,
@@ -254,8 +194,8 @@ def get_filter_organisations(request):
 
     if adult:
         queryset = queryset.filter(rooms__accomodates__gte=adult)
-    queryset = queryset.annotate(
-        user_rating=Avg("rating__rating_star", filter=Q(rating__is_deleted=False)),
+    queryset = queryset.select_related("rating_summary").annotate(
+        user_rating=F("rating_summary__rating_star_average"),
         min_room_price=Min("rooms__price", filter=Q(rooms__is_deleted=False)),
     )
 
@@ -0,0 +1,462 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from booking.models import BookingDetail
+from organisation.models import OrganisationRoomUnavailability, Room
+from mobileapi.models import RoomInventory
+from mobileapi.utils.overlap import overlap
+
+INVENTORY_HORIZON_DAYS = 365
+ROOM_CATEGORIES = ["Single", "Double", "Deluxe"]
+
+
+def get_nights(from_date, to_date):
+    """
+    list out the nights between from_date and to_date, to_date being the checkout
+    """
+    return [from_date + timedelta(days=i) for i in range((to_date - from_date).days)]
+
+
+def get_stay_range(from_date, to_date):
+    """
+    helper function to convert the searched date range into a checkin/checkout range,
+    same day search is treated as a single night
+    """
+    if to_date <= from_date:
+        to_date = from_date + timedelta(days=1)
+    return from_date, to_date
+
+
+def get_room_capacity(room):
+    if room.get("room_numbers"):
+        return len(room.get("room_numbers"))
+    return room.get("no_of_rooms") or 0
+
+
+def build_room_inventory(rooms, from_date, to_date):
+    """
+    helper function to calculate the inventory of the rooms for every night
+    between from_date and to_date
+    """
+    rooms = list(rooms)
+    room_ids = [room.get("id") for room in rooms]
+    organisation_ids = {room.get("organisation_id") for room in rooms}
+    booked_rooms = defaultdict(int)
+    blocked_rooms = defaultdict(set)
+
+    booking_details = BookingDetail.objects.filter(
+        ~Q(booking__payment_status="Draft"),
+        overlap(
+            "booking__checkin_date", "booking__checkout_date", from_date, to_date
+        ),
+        room__id__in=room_ids,
+        booking__is_deleted=False,
+        booking__cancelled=False,
+    ).values(
+        "room__id", "no_of_rooms", "booking__checkin_date", "booking__checkout_date"
+    )
+    for detail in booking_details:
+        for night in get_nights(
+            max(detail.get("booking__checkin_date"), from_date),
+            min(detail.get("booking__checkout_date"), to_date),
+        ):
+            booked_rooms[(detail.get("room__id"), night)] += (
+                detail.get("no_of_rooms") or 0
+            )
+
+    # unavailability is applied on the room numbers, so overlapping
+    # unavailabilities of the same room number are only counted once
+    unavailabilities = OrganisationRoomUnavailability.objects.filter(
+        overlap("from_date", "to_date", from_date, to_date, end_inclusive=True),
+        organisation__id__in=organisation_ids,
+        is_deleted=False,
+    ).values("organisation_id", "room_numbers", "from_date", "to_date")
+    for unavailability in unavailabilities:
+        for room in rooms:
+            if room.get("organisation_id") != unavailability.get("organisation_id"):
+                continue
+            room_numbers = set(unavailability.get("room_numbers") or []) & set(
+                room.get("room_numbers") or []
+            )
+            if not room_numbers:
+                continue
+            for night in get_nights(
+                max(unavailability.get("from_date"), from_date),
+                min(unavailability.get("to_date") + timedelta(days=1), to_date),
+            ):
+                blocked_rooms[(room.get("id"), night)] |= room_numbers
+
+    inventory = []
+    for room in rooms:
+        total_rooms = get_room_capacity(room)
+        for night in get_nights(from_date, to_date):
+            booked = booked_rooms[(room.get("id"), night)]
+            blocked = len(blocked_rooms[(room.get("id"), night)])
+            inventory.append(
+                RoomInventory(
+                    organisation_id=room.get("organisation_id"),
+                    room_id=room.get("id"),
+                    date=night,
+                    total_rooms=total_rooms,
+                    booked_rooms=booked,
+                    blocked_rooms=blocked,
+                    sellable_rooms=max(total_rooms - booked - blocked, 0),
+                )
+            )
+    return inventory
+
+
+def get_inventory_rooms(rooms):
+    return (
+        rooms.filter(is_deleted=False)
+        .values("id", "organisation_id", "no_of_rooms", "room_numbers")
+        .order_by("id")
+    )
+
+
+def sync_room_inventory(rooms, from_date, to_date):
+    """
+    recalculate the inventory ledger of the given rooms between from_date and
+    to_date. The missing nights are inserted first, skipping the ones another
+    request inserted meanwhile, so that every row of the range is locked before
+    the bookings are read and a concurrent booking can't be overwritten with
+    counts read before it committed
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    rooms = list(get_inventory_rooms(rooms))
+    room_ids = [room.get("id") for room in rooms]
+    with transaction.atomic():
+        present = set(
+            RoomInventory.objects.filter(
+                room__id__in=room_ids, date__gte=from_date, date__lt=to_date
+            ).values_list("room_id", "date")
+        )
+        RoomInventory.objects.bulk_create(
+            [
+                RoomInventory(
+                    organisation_id=room.get("organisation_id"),
+                    room_id=room.get("id"),
+                    date=night,
+                    total_rooms=0,
+                    booked_rooms=0,
+                    blocked_rooms=0,
+                    sellable_rooms=0,
+                )
+                for room in rooms
+                for night in get_nights(from_date, to_date)
+                if (room.get("id"), night) not in present
+            ],
+            ignore_conflicts=True,
+        )
+        existing = {
+            (row.room_id, row.date): row
+            for row in RoomInventory.objects.select_for_update()
+            .filter(room__id__in=room_ids, date__gte=from_date, date__lt=to_date)
+            .order_by("room_id", "date")
+        }
+        inventory = build_room_inventory(rooms, from_date, to_date)
+        to_update = []
+        for row in inventory:
+            current = existing[(row.room_id, row.date)]
+            row.id = current.id
+            if (
+                current.total_rooms,
+                current.booked_rooms,
+                current.blocked_rooms,
+                current.sellable_rooms,
+            ) != (
+                row.total_rooms,
+                row.booked_rooms,
+                row.blocked_rooms,
+                row.sellable_rooms,
+            ):
+                to_update.append(row)
+        RoomInventory.objects.bulk_update(
+            to_update,
+            ["total_rooms", "booked_rooms", "blocked_rooms", "sellable_rooms"],
+        )
+    return inventory
+
+
+def get_room_inventory(rooms, from_date, to_date):
+    """
+    read the inventory ledger of the rooms for the nights between from_date and
+    to_date, rooms missing nights in the ledger are built on the fly without
+    writing them so that the read path takes no locks
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    rooms = rooms.filter(is_deleted=False)
+    inventory = defaultdict(list)
+    for row in RoomInventory.objects.filter(
+        room__in=rooms, date__gte=from_date, date__lt=to_date
+    ).order_by("date"):
+        inventory[row.room_id].append(row)
+
+    nights = (to_date - from_date).days
+    stale_room_ids = [
+        room_id
+        for room_id in rooms.values_list("id", flat=True)
+        if len(inventory[room_id]) < nights
+    ]
+    if stale_room_ids:
+        for room_id in stale_room_ids:
+            inventory[room_id] = []
+        for row in build_room_inventory(
+            get_inventory_rooms(Room.objects.filter(id__in=stale_room_ids)),
+            from_date,
+            to_date,
+        ):
+            inventory[row.room_id].append(row)
+    return inventory
+
+
+def get_booking_nights(booking, from_date, to_date):
+    """
+    number of rooms the booking holds in the ledger for each room type and night
+    """
+    holding = defaultdict(int)
+    if booking.payment_status == "Draft" or booking.is_deleted or booking.cancelled:
+        return holding
+    for detail in booking.room_detail.all().values("room__id", "no_of_rooms"):
+        for night in get_nights(
+            max(booking.checkin_date, from_date), min(booking.checkout_date, to_date)
+        ):
+            holding[(detail.get("room__id"), night)] += detail.get("no_of_rooms") or 0
+    return holding
+
+
+def get_room_ledger_summary(rooms, from_date, to_date, exclude_booking=None):
+    """
+    helper function to get the rooms available for the whole stay and the rooms
+    booked on the busiest night for each room type from one read of the ledger,
+    exclude_booking rooms are treated as available
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    inventory = get_room_inventory(rooms, from_date, to_date)
+    holding = {}
+    if exclude_booking is not None:
+        holding = get_booking_nights(exclude_booking, from_date, to_date)
+
+    summary = {}
+    for room_id, rows in inventory.items():
+        if not rows:
+            continue
+        booked = [
+            max(row.booked_rooms - holding.get((room_id, row.date), 0), 0)
+            for row in rows
+        ]
+        summary[room_id] = {
+            "available_rooms": min(
+                max(row.total_rooms - booked_rooms - row.blocked_rooms, 0)
+                for row, booked_rooms in zip(rows, booked)
+            ),
+            "peak_booked_rooms": max(booked),
+        }
+    return summary
+
+
+def get_room_availability(rooms, from_date, to_date, exclude_booking=None):
+    """
+    helper function to get the number of rooms available for the whole stay
+    of each room type, exclude_booking rooms are treated as available
+    """
+    summary = get_room_ledger_summary(rooms, from_date, to_date, exclude_booking)
+    return {
+        room_id: room.get("available_rooms") for room_id, room in summary.items()
+    }
+
+
+def get_peak_booked_rooms(rooms, from_date, to_date, exclude_booking=None):
+    """
+    highest number of rooms booked on any night of the stay for each room type
+    """
+    summary = get_room_ledger_summary(rooms, from_date, to_date, exclude_booking)
+    return {
+        room_id: room.get("peak_booked_rooms") for room_id, room in summary.items()
+    }
+
+
+def get_category_availability(rooms, from_date, to_date, exclude_booking=None):
+    """
+    helper function to get the availability of every room category the rooms
+    have, the known categories come first and any other category after them
+    """
+    summary = get_room_ledger_summary(rooms, from_date, to_date, exclude_booking)
+    categories = {}
+    for room in rooms.filter(is_deleted=False).values("id", "category", "room_numbers"):
+        category = categories.setdefault(
+            room.get("category"),
+            {
+                "id": room.get("id"),
+                "category": room.get("category"),
+                "available_count": 0,
+                "booked_count": 0,
+                "room_numbers": set(),
+            },
+        )
+        category["id"] = room.get("id")
+        category["room_numbers"] |= set(room.get("room_numbers") or [])
+        room_summary = summary.get(room.get("id"), {})
+        category["available_count"] += room_summary.get("available_rooms", 0)
+        category["booked_count"] += room_summary.get("peak_booked_rooms", 0)
+    return dict(
+        sorted(
+            categories.items(),
+            key=lambda item: (
+                ROOM_CATEGORIES.index(item[0])
+                if item[0] in ROOM_CATEGORIES
+                else len(ROOM_CATEGORIES),
+                item[0] or "",
+            ),
+        )
+    )
+
+
+def get_stale_room_ids(rooms, from_date, to_date):
+    """
+    rooms missing any night of the stay in the ledger, the coverage of all the
+    rooms is checked with a single grouped query
+    """
+    nights = (to_date - from_date).days
+    rooms = rooms.filter(is_deleted=False)
+    ledger_nights = dict(
+        RoomInventory.objects.filter(
+            room__in=rooms, date__gte=from_date, date__lt=to_date
+        )
+        .values_list("room")
+        .annotate(Count("id"))
+    )
+    return [
+        room_id
+        for room_id in rooms.values_list("id", flat=True)
+        if ledger_nights.get(room_id, 0) < nights
+    ]
+
+
+def ensure_room_inventory(rooms, from_date, to_date):
+    """
+    build the ledger nights missing for any of the rooms, only the booking write
+    path calls it, the read path builds the missing nights without saving them
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    stale_room_ids = get_stale_room_ids(rooms, from_date, to_date)
+    if stale_room_ids:
+        sync_room_inventory(
+            Room.objects.filter(id__in=stale_room_ids), from_date, to_date
+        )
+
+
+def filter_available_organisations(queryset, from_date, to_date, no_of_rooms=1):
+    """
+    helper function to keep only the organisations having no_of_rooms sellable
+    on every night of the stay, evaluated for all the organisations at once from
+    the ledger. The few organisations whose rooms miss nights in the ledger are
+    evaluated from their bookings instead, nothing is written
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    organisation_ids = queryset.values("id")
+    rooms = Room.objects.filter(organisation__id__in=organisation_ids)
+    stale_organisation_ids = set(
+        rooms.filter(
+            id__in=get_stale_room_ids(rooms, from_date, to_date)
+        ).values_list("organisation_id", flat=True)
+    )
+    ledger = RoomInventory.objects.filter(
+        organisation__id__in=organisation_ids, date__gte=from_date, date__lt=to_date
+    )
+    full_organisations = (
+        ledger.values("organisation", "date")
+        .annotate(total_sellable=Sum("sellable_rooms"))
+        .filter(total_sellable__lt=no_of_rooms)
+        .values("organisation")
+    )
+    available = (
+        Q(id__in=ledger.filter(date=from_date).values("organisation"))
+        & ~Q(id__in=full_organisations)
+        & ~Q(id__in=stale_organisation_ids)
+    )
+    if stale_organisation_ids:
+        sellable_rooms = defaultdict(int)
+        for row in build_room_inventory(
+            get_inventory_rooms(
+                rooms.filter(organisation__id__in=stale_organisation_ids)
+            ),
+            from_date,
+            to_date,
+        ):
+            sellable_rooms[(row.organisation_id, row.date)] += row.sellable_rooms
+        available |= Q(
+            id__in=[
+                organisation_id
+                for organisation_id in stale_organisation_ids
+                if all(
+                    sellable_rooms[(organisation_id, night)] >= no_of_rooms
+                    for night in get_nights(from_date, to_date)
+                )
+            ]
+        )
+    return queryset.filter(available)
+
+
+def lock_room_inventory(room_ids, from_date, to_date):
+    """
+    lock the ledger rows of the rooms for every night of the stay, the rows are
+    always locked ordered by room and night so that concurrent bookings wait on
+    each other instead of deadlocking. It has to run inside a transaction
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    room_ids = sorted(set(room_ids))
+    ensure_room_inventory(Room.objects.filter(id__in=room_ids), from_date, to_date)
+    return list(
+        RoomInventory.objects.select_for_update()
+        .filter(room__id__in=room_ids, date__gte=from_date, date__lt=to_date)
+        .order_by("room_id", "date")
+    )
+
+
+def reserve_room_inventory(requested_rooms, from_date, to_date, exclude_booking=None):
+    """
+    helper function to take the requested number of rooms of every room type out
+    of the ledger for the whole stay, requested_rooms maps the room id to the
+    number of rooms. The rows stay locked until the transaction ends, so the
+    booking has to be written in the same transaction. Returns the room ids which
+    don't have enough rooms on some night, nothing is reserved in that case
+    """
+    from_date, to_date = get_stay_range(from_date, to_date)
+    lock_from_date, lock_to_date = from_date, to_date
+    holding = {}
+    if exclude_booking is not None:
+        # the rooms and nights the booking gives up are locked and released as
+        # well, so the ledger sync of the booking only touches locked rows
+        lock_from_date = min(from_date, exclude_booking.checkin_date)
+        lock_to_date = max(to_date, exclude_booking.checkout_date)
+        holding = get_booking_nights(exclude_booking, lock_from_date, lock_to_date)
+    rows = lock_room_inventory(
+        set(requested_rooms) | {room_id for room_id, _ in holding},
+        lock_from_date,
+        lock_to_date,
+    )
+
+    full_room_ids = set()
+    to_update = []
+    for row in rows:
+        held = holding.get((row.room_id, row.date), 0)
+        requested = 0
+        if from_date <= row.date < to_date:
+            requested = requested_rooms.get(row.room_id) or 0
+        change = requested - held
+        if change > row.sellable_rooms:
+            full_room_ids.add(row.room_id)
+        elif change:
+            row.booked_rooms = max(row.booked_rooms + change, 0)
+            row.sellable_rooms = max(
+                row.total_rooms - row.booked_rooms - row.blocked_rooms, 0
+            )
+            to_update.append(row)
+    if full_room_ids:
+        return sorted(full_room_ids)
+    RoomInventory.objects.bulk_update(to_update, ["booked_rooms", "sellable_rooms"])
+    return []
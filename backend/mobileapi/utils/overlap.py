@@ -0,0 +1,33 @@
+import datetime
+
+from django.db.models import Q
+
+
+def overlap(start_field, end_field, from_date, to_date, end_inclusive=False):
+    """
+    helper function to filter the rows whose range overlaps the [from_date,
+    to_date) stay, to_date being the checkout. Rows are [start, end) ranges like
+    the bookings, end_inclusive is for the ranges like unavailability, special
+    deals and pricing whose end day is part of the range. A same day stay is
+    treated as a single night.
+
+    Two range comparisons on the columns instead of the three OR-ed branches,
+    so an index on (start, end) is used with a single range scan
+    """
+    if to_date <= from_date:
+        to_date = from_date + datetime.timedelta(days=1)
+    end_lookup = "gte" if end_inclusive else "gt"
+    return Q(
+        **{
+            f"{start_field}__lt": to_date,
+            f"{end_field}__{end_lookup}": from_date,
+        }
+    )
+
+
+def overlap_night(start_field, end_field, night):
+    """
+    rows whose [start, end) range includes the night, like the bookings staying
+    the night
+    """
+    return overlap(start_field, end_field, night, night + datetime.timedelta(days=1))
@@ -0,0 +1,361 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from package.models import Package, PackageBooking
+from mobileapi.models import PackageInventory, PackageReservation
+
+PACKAGE_RESERVATION_MINUTES = getattr(settings, "PACKAGE_RESERVATION_MINUTES", 15)
+
+
+INVENTORY_REBUILD_BATCH_SIZE = 100
+INVENTORY_FIELDS = [
+    "quantity",
+    "booked_quantity",
+    "reserved_quantity",
+    "available_quantity",
+]
+
+
+def get_booked_quantity(booking):
+    """
+    quantity the booking holds of its package, draft, cancelled and deleted
+    bookings do not hold any
+    """
+    if booking.is_deleted or booking.cancelled or booking.payment_status == "Draft":
+        return 0
+    return booking.quantity or 0
+
+
+def build_package_inventory(packages):
+    """
+    helper function to calculate the inventory of the packages from their bookings
+    """
+    packages = list(
+        packages.annotate(
+            total_booked_quantity=Coalesce(
+                Sum(
+                    "package_booking__quantity",
+                    filter=Q(
+                        ~Q(package_booking__payment_status="Draft"),
+                        package_booking__is_deleted=False,
+                        package_booking__cancelled=False,
+                    ),
+                ),
+                0,
+            )
+        ).values_list("id", "quantity", "total_booked_quantity")
+    )
+    reserved = dict(
+        PackageReservation.objects.filter(package_id__in=[row[0] for row in packages])
+        .values("package_id")
+        .annotate(total_reserved_quantity=Sum("quantity"))
+        .values_list("package_id", "total_reserved_quantity")
+    )
+    return {
+        package_id: PackageInventory(
+            package_id=package_id,
+            quantity=quantity,
+            booked_quantity=booked_quantity,
+            reserved_quantity=reserved.get(package_id, 0),
+            available_quantity=quantity
+            - booked_quantity
+            - reserved.get(package_id, 0),
+        )
+        for package_id, quantity, booked_quantity in packages
+    }
+
+
+def annotate_available_quantity(queryset):
+    """
+    annotate the available quantity of the packages from their inventory, the
+    packages which don't have an inventory row yet, like the ones saved with
+    bulk_create, fall back to their quantity less the quantity of their bookings
+    """
+    booked_quantity = (
+        PackageBooking.objects.filter(
+            ~Q(payment_status="Draft"),
+            package=OuterRef("pk"),
+            is_deleted=False,
+            cancelled=False,
+        )
+        .values("package")
+        .annotate(total_booked_quantity=Sum("quantity"))
+        .values("total_booked_quantity")
+    )
+    return queryset.annotate(
+        available_quantity=Coalesce(
+            F("inventory__available_quantity"),
+            ExpressionWrapper(
+                F("quantity") - Coalesce(Subquery(booked_quantity), 0),
+                output_field=IntegerField(),
+            ),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def rebuild_package_inventory(packages=None):
+    """
+    helper function to recalculate the inventory of the packages, returns the
+    inventories which were missing or did not match the bookings. The inventory
+    rows are locked before the bookings are summed and written in the same
+    transaction, so the quantity booked meanwhile is never overwritten, and the
+    packages are reconciled in batches to keep the locks short
+    """
+    if packages is None:
+        packages = Package.objects.all()
+    package_ids = sorted(packages.values_list("id", flat=True))
+    changed = []
+    for start in range(0, len(package_ids), INVENTORY_REBUILD_BATCH_SIZE):
+        changed += rebuild_package_inventory_batch(
+            package_ids[start : start + INVENTORY_REBUILD_BATCH_SIZE]
+        )
+    return changed
+
+
+def rebuild_package_inventory_batch(package_ids):
+    with transaction.atomic():
+        present = set(
+            PackageInventory.objects.filter(package_id__in=package_ids).values_list(
+                "package_id", flat=True
+            )
+        )
+        # the missing rows are inserted first so that every row can be locked
+        PackageInventory.objects.bulk_create(
+            [
+                PackageInventory(
+                    package_id=package_id,
+                    quantity=0,
+                    booked_quantity=0,
+                    reserved_quantity=0,
+                    available_quantity=0,
+                )
+                for package_id in package_ids
+                if package_id not in present
+            ],
+            ignore_conflicts=True,
+        )
+        current = {
+            inventory.package_id: inventory
+            for inventory in PackageInventory.objects.select_for_update()
+            .filter(package_id__in=package_ids)
+            .order_by("package_id")
+        }
+        inventories = build_package_inventory(
+            Package.objects.filter(id__in=package_ids)
+        )
+        changed = []
+        for package_id, inventory in inventories.items():
+            previous = current[package_id]
+            inventory.id = previous.id
+            if package_id in present and all(
+                getattr(inventory, field) == getattr(previous, field)
+                for field in INVENTORY_FIELDS
+            ):
+                continue
+            changed.append(inventory)
+        PackageInventory.objects.bulk_update(changed, INVENTORY_FIELDS)
+    return changed
+
+
+def update_booked_quantity(package_id, change):
+    """
+    helper function to move the booked and available quantity of the package in
+    a single update, the inventory is built from the bookings the first time
+    """
+    if not package_id or not change:
+        return
+    updated = PackageInventory.objects.filter(package_id=package_id).update(
+        booked_quantity=F("booked_quantity") + change,
+        available_quantity=F("available_quantity") - change,
+    )
+    if not updated:
+        rebuild_package_inventory(Package.objects.filter(id=package_id))
+
+
+def apply_package_booking_change(previous, current):
+    """
+    previous and current are the (package id, booked quantity) of the booking
+    before and after the change
+    """
+    previous = previous or (None, 0)
+    current = current or (None, 0)
+    if previous[0] == current[0]:
+        update_booked_quantity(current[0], current[1] - previous[1])
+        return
+    update_booked_quantity(previous[0], -previous[1])
+    update_booked_quantity(current[0], current[1])
+
+
+def sync_package_quantity(package):
+    updated = PackageInventory.objects.filter(package=package).update(
+        quantity=package.quantity,
+        available_quantity=package.quantity
+        - F("booked_quantity")
+        - F("reserved_quantity"),
+    )
+    if not updated:
+        rebuild_package_inventory(Package.objects.filter(id=package.id))
+
+
+def get_available_quantity(package_id):
+    available_quantity = (
+        PackageInventory.objects.filter(package_id=package_id)
+        .values_list("available_quantity", flat=True)
+        .first()
+    )
+    if available_quantity is None:
+        inventories = rebuild_package_inventory(Package.objects.filter(id=package_id))
+        available_quantity = inventories[0].available_quantity if inventories else 0
+    return available_quantity
+
+
+def reserve_package_quantity(package_id, quantity):
+    """
+    helper function to take the quantity out of the available quantity of the
+    package, the update only matches while enough quantity is available so
+    concurrent reservations can never take more than the package has
+    """
+    if not PackageInventory.objects.filter(package_id=package_id).exists():
+        rebuild_package_inventory(Package.objects.filter(id=package_id))
+    return bool(
+        PackageInventory.objects.filter(
+            package_id=package_id, available_quantity__gte=quantity
+        ).update(
+            reserved_quantity=F("reserved_quantity") + quantity,
+            available_quantity=F("available_quantity") - quantity,
+        )
+    )
+
+
+def release_package_quantity(package_id, quantity):
+    PackageInventory.objects.filter(package_id=package_id).update(
+        reserved_quantity=F("reserved_quantity") - quantity,
+        available_quantity=F("available_quantity") + quantity,
+    )
+
+
+def reserve_package_booking(booking):
+    """
+    helper function to hold the quantity of the draft booking until it is paid or
+    the reservation expires, returns False when the package is full
+    """
+    with transaction.atomic():
+        if not reserve_package_quantity(booking.package_id, booking.quantity):
+            return False
+        PackageReservation.objects.create(
+            booking=booking,
+            package_id=booking.package_id,
+            quantity=booking.quantity,
+            expires_on=timezone.now()
+            + datetime.timedelta(minutes=PACKAGE_RESERVATION_MINUTES),
+        )
+    return True
+
+
+def resize_package_reservation(booking, quantity):
+    """
+    helper function to change the quantity held by the draft booking and renew
+    the hold, returns False when the package doesn't have the extra quantity and
+    None when the booking has no reservation
+    """
+    with transaction.atomic():
+        reservation = (
+            PackageReservation.objects.select_for_update()
+            .filter(booking=booking)
+            .first()
+        )
+        if reservation is None:
+            return None
+        change = quantity - reservation.quantity
+        if change > 0 and not reserve_package_quantity(booking.package_id, change):
+            return False
+        if change < 0:
+            release_package_quantity(booking.package_id, -change)
+        reservation.quantity = quantity
+        reservation.expires_on = timezone.now() + datetime.timedelta(
+            minutes=PACKAGE_RESERVATION_MINUTES
+        )
+        reservation.save(update_fields=["quantity", "expires_on"])
+    return True
+
+
+def hold_package_booking(booking):
+    """
+    helper function to make sure the package has the quantity of the booking, to
+    be called in the transaction which saved the booking so that raising on
+    False rolls the booking back. Draft bookings reserve the quantity, the
+    confirmed ones already took it through the inventory signal whose update
+    keeps the inventory row locked until the transaction ends
+    """
+    if booking.is_deleted or booking.cancelled:
+        return True
+    if booking.payment_status == "Draft":
+        held = resize_package_reservation(booking, booking.quantity)
+        if held is None:
+            return reserve_package_booking(booking)
+        return held
+    return PackageInventory.objects.filter(
+        package_id=booking.package_id, available_quantity__gte=0
+    ).exists()
+
+
+def release_package_reservation(booking):
+    """
+    helper function to give back the quantity held by the booking, the booked
+    quantity of a confirmed booking is then added by the inventory signal
+    """
+    reservation = (
+        PackageReservation.objects.filter(booking=booking)
+        .values_list("id", "package_id", "quantity")
+        .first()
+    )
+    if reservation is None:
+        return
+    if PackageReservation.objects.filter(id=reservation[0]).delete()[0]:
+        release_package_quantity(reservation[1], reservation[2])
+
+
+def get_reserved_quantity(booking):
+    return (
+        PackageReservation.objects.filter(booking=booking)
+        .values_list("quantity", flat=True)
+        .first()
+        or 0
+    )
+
+
+def expire_package_reservations(now=None):
+    """
+    helper function to release the reservations which expired, the rows locked by
+    a confirmation in progress are skipped and picked up on the next run
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        reservations = list(
+            PackageReservation.objects.select_for_update(skip_locked=True)
+            .filter(expires_on__lt=now)
+            .values_list("id", "package_id", "quantity")
+        )
+        released = {}
+        for _, package_id, quantity in reservations:
+            released[package_id] = released.get(package_id, 0) + quantity
+        PackageReservation.objects.filter(
+            id__in=[reservation[0] for reservation in reservations]
+        ).delete()
+        for package_id in sorted(released):
+            release_package_quantity(package_id, released[package_id])
+    return len(reservations)
@@ -0,0 +1,293 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from organisation.models import Organisation
+from package.models import Package
+from mobileapi.models import OrganisationBookingCounter, PackageBookingCounter
+
+# the rankings follow the booking counters within the timeout, the version only
+# drops them when a location changes or the counters are rebuilt
+POPULARITY_CACHE_TIMEOUT = getattr(settings, "POPULARITY_CACHE_TIMEOUT", 5 * 60)
+POPULARITY_VERSION_KEY = "popularity_version"
+# number of the most booked ids kept in a ranking
+POPULARITY_RANK_LIMIT = getattr(settings, "POPULARITY_RANK_LIMIT", 500)
+LOCATION_FIELDS = ["city", "country", "continent"]
+COUNTER_FIELDS = ["bookings"] + LOCATION_FIELDS
+COUNTER_REBUILD_BATCH_SIZE = 500
+
+
+def get_popularity_version():
+    return cache.get_or_set(POPULARITY_VERSION_KEY, 1, None)
+
+
+def invalidate_popularity():
+    """
+    every cached ranking is keyed with the version, bumping it drops all of them
+    """
+    try:
+        cache.incr(POPULARITY_VERSION_KEY)
+    except ValueError:
+        cache.set(POPULARITY_VERSION_KEY, 1, None)
+
+
+def is_active_booking(booking):
+    return not booking.is_deleted and not booking.cancelled
+
+
+def get_location(location):
+    location = location or {}
+    return {field: (location.get(field) or "").lower() for field in LOCATION_FIELDS}
+
+
+def get_organisation_location(organisation_id):
+    location = (
+        Organisation.objects.filter(id=organisation_id)
+        .values_list("location", flat=True)
+        .first()
+    )
+    return get_location(location)
+
+
+def create_counter(counter_type, object_id):
+    """
+    helper function to create the counter of the organisation or package from
+    its bookings, returns False when the counter exists already. The bookings
+    are counted in the transaction of the change so the change is included
+    """
+    model, id_field, object_model, build_counters = COUNTERS[counter_type]
+    counters = build_counters(object_model.objects.filter(id=object_id))
+    if not counters:
+        return False
+    _, created = model.objects.get_or_create(
+        **{id_field: object_id},
+        defaults={field: getattr(counters[0], field) for field in COUNTER_FIELDS},
+    )
+    return created
+
+
+def update_counter(counter_type, object_id, change):
+    """
+    helper function to move the bookings of the counter in a single update, the
+    counter is created from the bookings the first time and the change is only
+    applied when another request created it meanwhile
+    """
+    if not object_id:
+        return
+    model, id_field, _, _ = COUNTERS[counter_type]
+    counters = model.objects.filter(**{id_field: object_id})
+    if counters.update(bookings=Greatest(F("bookings") + change, 0)):
+        return
+    if not create_counter(counter_type, object_id):
+        counters.update(bookings=Greatest(F("bookings") + change, 0))
+
+
+def update_organisation_counter(organisation_id, change):
+    update_counter("organisation", organisation_id, change)
+
+
+def update_package_counter(package_id, change):
+    update_counter("package", package_id, change)
+
+
+def apply_booking_change(update_counter, previous, current):
+    """
+    helper function to move a booking between the counters, previous and current
+    are the (object id, active) of the booking before and after the change
+    """
+    if previous == current:
+        return
+    if previous and previous[1]:
+        update_counter(previous[0], -1)
+    if current and current[1]:
+        update_counter(current[0], 1)
+
+
+def update_counter_location(organisation):
+    """
+    the counters carry the location of the organisation so that rankings of a
+    city, country or continent are read from the counters alone
+    """
+    location = get_location(organisation.location)
+    updated = OrganisationBookingCounter.objects.filter(
+        organisation=organisation
+    ).exclude(**location).update(**location)
+    if not OrganisationBookingCounter.objects.filter(
+        organisation=organisation
+    ).exists():
+        updated += create_counter("organisation", organisation.id)
+    updated += PackageBookingCounter.objects.filter(
+        package__organisation=organisation
+    ).exclude(**location).update(**location)
+    if updated:
+        transaction.on_commit(invalidate_popularity)
+
+
+def update_package_location(package):
+    location = get_organisation_location(package.organisation_id)
+    if not PackageBookingCounter.objects.filter(package=package).update(**location):
+        create_counter("package", package.id)
+    transaction.on_commit(invalidate_popularity)
+
+
+def build_organisation_counters(organisations):
+    organisations = organisations.annotate(
+        number_of_booked=Count(
+            "booked_organisation",
+            filter=Q(
+                booked_organisation__is_deleted=False,
+                booked_organisation__cancelled=False,
+            ),
+        )
+    ).values_list("id", "location", "number_of_booked")
+    return [
+        OrganisationBookingCounter(
+            organisation_id=organisation_id,
+            bookings=bookings,
+            **get_location(location),
+        )
+        for organisation_id, location, bookings in organisations
+    ]
+
+
+def build_package_counters(packages):
+    packages = packages.annotate(
+        number_of_booked=Count(
+            "package_booking",
+            filter=Q(
+                package_booking__is_deleted=False,
+                package_booking__cancelled=False,
+            ),
+        )
+    ).values_list("id", "organisation__location", "number_of_booked")
+    return [
+        PackageBookingCounter(
+            package_id=package_id, bookings=bookings, **get_location(location)
+        )
+        for package_id, location, bookings in packages
+    ]
+
+
+COUNTERS = {
+    "organisation": (
+        OrganisationBookingCounter,
+        "organisation_id",
+        Organisation,
+        build_organisation_counters,
+    ),
+    "package": (PackageBookingCounter, "package_id", Package, build_package_counters),
+}
+
+
+def rebuild_booking_counters():
+    """
+    helper function to recount the bookings of every organisation and package,
+    used to create the missing counters and to correct any drift. Returns the
+    number of organisation and package counters which were corrected
+    """
+    changed = [
+        rebuild_counters("organisation", Organisation.objects.all()),
+        rebuild_counters("package", Package.objects.all()),
+    ]
+    if any(changed):
+        transaction.on_commit(invalidate_popularity)
+    return tuple(changed)
+
+
+def rebuild_counters(counter_type, objects):
+    object_ids = sorted(objects.values_list("id", flat=True))
+    changed = 0
+    for start in range(0, len(object_ids), COUNTER_REBUILD_BATCH_SIZE):
+        changed += rebuild_counters_batch(
+            counter_type, object_ids[start : start + COUNTER_REBUILD_BATCH_SIZE]
+        )
+    return changed
+
+
+def rebuild_counters_batch(counter_type, object_ids):
+    """
+    the counters are locked before the bookings are counted and written in the
+    same transaction, so a booking saved meanwhile waits for the rebuild and is
+    added to the recounted value instead of being overwritten. Only the counters
+    which drifted are written
+    """
+    model, id_field, object_model, build_counters = COUNTERS[counter_type]
+    with transaction.atomic():
+        # the missing counters are inserted first so that every counter is locked
+        model.objects.bulk_create(
+            [model(**{id_field: object_id}) for object_id in object_ids],
+            ignore_conflicts=True,
+        )
+        current = {
+            getattr(counter, id_field): counter
+            for counter in model.objects.select_for_update()
+            .filter(**{f"{id_field}__in": object_ids})
+            .order_by(id_field)
+        }
+        changed = []
+        for counter in build_counters(object_model.objects.filter(id__in=object_ids)):
+            previous = current[getattr(counter, id_field)]
+            counter.id = previous.id
+            if any(
+                getattr(counter, field) != getattr(previous, field)
+                for field in COUNTER_FIELDS
+            ):
+                changed.append(counter)
+        model.objects.bulk_update(changed, COUNTER_FIELDS)
+    return len(changed)
+
+
+def create_missing_counters(counter_type):
+    """
+    helper function to count the bookings of the organisations or packages which
+    have no counter yet, so that they are ranked before the counters are rebuilt
+    """
+    model, _, object_model, build_counters = COUNTERS[counter_type]
+    counters = build_counters(object_model.objects.filter(booking_counter__isnull=True))
+    model.objects.bulk_create(counters, ignore_conflicts=True)
+    return len(counters)
+
+
+def get_popular_ids(counter_type, city=None, country=None, continent=None):
+    """
+    ids of the most booked organisations or packages, globally or within the
+    city, country and continent, cached per scope for POPULARITY_CACHE_TIMEOUT
+    """
+    scope = {
+        field: value.lower()
+        for field, value in zip(LOCATION_FIELDS, [city, country, continent])
+        if value
+    }
+    key = "popular_ids:{}:{}:{}".format(
+        get_popularity_version(),
+        counter_type,
+        "|".join(scope.get(field, "") for field in LOCATION_FIELDS),
+    )
+    ids = cache.get(key)
+    if ids is None:
+        model, id_field, _, _ = COUNTERS[counter_type]
+        create_missing_counters(counter_type)
+        ids = list(
+            model.objects.filter(**scope)
+            .order_by("-bookings", id_field)
+            .values_list(id_field, flat=True)[:POPULARITY_RANK_LIMIT]
+        )
+        cache.set(key, ids, POPULARITY_CACHE_TIMEOUT)
+    return ids
+
+
+def get_ranked_page(ranked_ids, queryset):
+    """
+    helper function to keep the ranked ids which are in the queryset, the filter
+    runs on the bounded list of the most booked ids instead of aggregating the
+    bookings
+    """
+    matching = set(queryset.filter(id__in=ranked_ids).values_list("id", flat=True))
+    return [object_id for object_id in ranked_ids if object_id in matching]
+
+
+def order_by_ids(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[object_id] for object_id in ids if object_id in objects]
@@ -0,0 +1,95 @@
+import datetime
+import heapq
+from collections import defaultdict
+
+from organisation.models import OrganisationRoomPricing, Room
+from mobileapi.utils.overlap import overlap
+
+
+def get_pricing_rules(organisation_id, from_date, to_date):
+    """
+    helper function to get the pricing rules of every room type of the organisation
+    overlapping from_date and to_date, sorted by their from_date
+    """
+    pricings = (
+        OrganisationRoomPricing.objects.filter(
+            overlap(
+                "from_date",
+                "to_date",
+                from_date,
+                to_date + datetime.timedelta(days=1),
+                end_inclusive=True,
+            ),
+            organisation__id=organisation_id,
+            is_deleted=False,
+        )
+        .order_by("from_date")
+        .values_list("room_type", "from_date", "to_date", "price")
+    )
+    rules = defaultdict(list)
+    for room_type, rule_from_date, rule_to_date, price in pricings:
+        rules[room_type].append((rule_from_date, rule_to_date, price))
+    return rules
+
+
+def resolve_daily_prices(base_price, rules, from_date, to_date):
+    """
+    sweep the dates between from_date and to_date once, keeping the rules active
+    on the date in a heap so that the minimum price of the date is on top, dates
+    without an active rule take the base price
+    """
+    prices = {}
+    active = []
+    index = 0
+    date_ = from_date
+    while date_ <= to_date:
+        while index < len(rules) and rules[index][0] <= date_:
+            heapq.heappush(active, (rules[index][2], rules[index][1]))
+            index += 1
+        # rules ending before the date are dropped once they reach the top
+        while active and active[0][1] < date_:
+            heapq.heappop(active)
+        prices[date_] = active[0][0] if active else base_price
+        date_ += datetime.timedelta(days=1)
+    return prices
+
+
+def get_room_type_prices(organisation_id, from_date, to_date):
+    """
+    price of every room type of the organisation for each date between from_date
+    and to_date, to_date included
+    """
+    base_prices = {}
+    for category, price in Room.objects.filter(
+        organisation__id=organisation_id, is_deleted=False
+    ).values_list("category", "price"):
+        if price is not None and (
+            category not in base_prices or price < base_prices[category]
+        ):
+            base_prices[category] = price
+    rules = get_pricing_rules(organisation_id, from_date, to_date)
+    return {
+        room_type: resolve_daily_prices(
+            base_prices.get(room_type), rules.get(room_type, []), from_date, to_date
+        )
+        for room_type in set(base_prices) | set(rules)
+    }
+
+
+def get_calendar_prices(organisation_id, from_date, to_date):
+    """
+    minimum price among the room types of the organisation for each date between
+    from_date and to_date, 0 when the organisation has no price for the date
+    """
+    room_type_prices = get_room_type_prices(organisation_id, from_date, to_date)
+    calendar_prices = {}
+    date_ = from_date
+    while date_ <= to_date:
+        prices = [
+            prices.get(date_)
+            for prices in room_type_prices.values()
+            if prices.get(date_) is not None
+        ]
+        calendar_prices[date_] = min(prices) if prices else 0
+        date_ += datetime.timedelta(days=1)
+    return calendar_prices
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from booking.models import RatingByIndividual
+from mobileapi.models import OrganisationRatingSummary, RATING_DIMENSIONS
+
+RATING_FIELDS = ("rating_star",) + RATING_DIMENSIONS
+
+
+def get_rating_contribution(rating):
+    """
+    values a rating adds into the summary of the organisation, deleted ratings
+    doesn't contribute
+    """
+    if rating is None or rating.get("is_deleted"):
+        return None
+    return {field: rating.get(field) or 0 for field in RATING_FIELDS}
+
+
+def set_rating_star_average(summary):
+    summary.rating_star_average = (
+        summary.rating_star_sum / summary.rating_count
+        if summary.rating_count
+        else None
+    )
+
+
+def apply_rating_change(organisation_id, previous=None, current=None):
+    """
+    helper function to incrementally update the rating summary of the
+    organisation when a rating is created, edited, deleted or soft deleted, a
+    missing summary is built from all the ratings instead of starting from zero
+    """
+    previous = get_rating_contribution(previous)
+    current = get_rating_contribution(current)
+    if previous is None and current is None:
+        return
+    with transaction.atomic():
+        summary = (
+            OrganisationRatingSummary.objects.select_for_update()
+            .filter(organisation_id=organisation_id)
+            .first()
+        )
+        if summary is None:
+            rebuild_rating_summary(organisation_id)
+            return
+        for contribution, sign in ((previous, -1), (current, 1)):
+            if contribution is None:
+                continue
+            summary.rating_count += sign
+            summary.rating_star_sum += sign * contribution.get("rating_star")
+            for dimension in RATING_DIMENSIONS:
+                setattr(
+                    summary,
+                    f"{dimension}_sum",
+                    getattr(summary, f"{dimension}_sum")
+                    + sign * contribution.get(dimension),
+                )
+        set_rating_star_average(summary)
+        summary.save()
+
+
+def rebuild_rating_summary(organisation_id):
+    """
+    recalculate the rating summary of the organisation from its ratings, the
+    ratings are read once the summary row is locked
+    """
+    with transaction.atomic():
+        OrganisationRatingSummary.objects.get_or_create(
+            organisation_id=organisation_id
+        )
+        summary = OrganisationRatingSummary.objects.select_for_update().get(
+            organisation_id=organisation_id
+        )
+        aggregates = RatingByIndividual.objects.filter(
+            rated_on__id=organisation_id, is_deleted=False
+        ).aggregate(
+            rating_count=Count("id"),
+            rating_star_sum=Sum("rating_star"),
+            **{f"{dimension}_sum": Sum(dimension) for dimension in RATING_DIMENSIONS},
+        )
+        for field, value in aggregates.items():
+            setattr(summary, field, value or 0)
+        set_rating_star_average(summary)
+        summary.save()
+    return summary
+
+
+def get_rating_summary(organisation):
+    """
+    rating summary of the organisation, an empty summary for organisations
+    that are not rated yet
+    """
+    try:
+        return organisation.rating_summary
+    except OrganisationRatingSummary.DoesNotExist:
+        return OrganisationRatingSummary(organisation=organisation)
@@ -0,0 +1,146 @@
+import json
+import threading
+
+import pandas as pd
+from django.conf import settings
+from django.db.models import F, Min, Q
+
+from backend.utils import hotel_recommendor_model
+from organisation.models import Organisation
+from mobileapi.models import RecommendationArtifact
+
+DEFAULT_RECOMMENDATION_COUNTRY = "Nepal"
+ARTIFACT_VERSIONS_KEPT = 3
+# the artifact is rebuilt by the rebuild_recommendations command, started next to
+# the web server by scripts/start_server, which checks the organisations for
+# changes every this many seconds
+RECOMMENDATION_REBUILD_INTERVAL = getattr(
+    settings, "RECOMMENDATION_REBUILD_INTERVAL", 300
+)
+
+_artifact = {"version": None, "rankings": {}}
+_artifact_lock = threading.Lock()
+
+
+def get_recommendation_queryset():
+    return Organisation.objects.filter(
+        is_deleted=False, property_status="Published", is_visible=True
+    ).values(
+        "photo_url",
+        "location",
+        "name",
+        "category",
+        "description",
+        "safety",
+        "facilities",
+        "recommended",
+        "id",
+    ).annotate(
+        user_rating=F("rating_summary__rating_star_average"),
+        user_review_count=F("rating_summary__rating_count"),
+        min_room_price=Min("rooms__price", filter=Q(rooms__is_deleted=False)),
+        category_name=F("category__name"),
+    )
+
+
+def get_ranking_key(country, continent=None):
+    return f"{(country or '').lower()}|{(continent or '').lower()}"
+
+
+def get_ranking_pairs(organisations):
+    """
+    (country, continent) pairs ranked by the artifact, the ones of the catalog
+    and every country and continent alone with the default country, which are
+    the fallbacks of the lookup. The names are kept as they are stored
+    """
+    pairs = {(DEFAULT_RECOMMENDATION_COUNTRY, None)}
+    for organisation in organisations:
+        location = organisation.get("location") or {}
+        country = location.get("country")
+        continent = location.get("continent")
+        if country:
+            pairs.add((country, None))
+            if continent:
+                pairs.add((country, continent))
+        if continent:
+            pairs.add((DEFAULT_RECOMMENDATION_COUNTRY, continent))
+    return sorted(pairs, key=lambda pair: get_ranking_key(*pair))
+
+
+def build_recommendation_artifact(only_changed=False):
+    """
+    helper function to run the recommender for the country and continent pairs of
+    the catalog and save the ranked ids as a new version. With only_changed
+    nothing is built while the organisation features are the ones of the latest
+    artifact, None is returned then
+    """
+    organisations = list(get_recommendation_queryset().order_by("id"))
+    features = pd.DataFrame(organisations)
+    serialized_features = features.to_json(orient="records", default_handler=str)
+    if only_changed and (
+        RecommendationArtifact.objects.values_list("features", flat=True).first()
+        == serialized_features
+    ):
+        return None
+
+    rankings = {}
+    for country, continent in get_ranking_pairs(organisations):
+        key = get_ranking_key(country, continent)
+        if key in rankings:
+            continue
+        recommended_organisations = (
+            hotel_recommendor_model(country, features, continent)
+            if not features.empty
+            else []
+        )
+        rankings[key] = [
+            int(organisation_id) for organisation_id in recommended_organisations
+        ]
+    artifact = RecommendationArtifact.objects.create(
+        organisation_count=len(organisations),
+        features=serialized_features,
+        rankings=json.dumps(rankings),
+    )
+    stale_versions = RecommendationArtifact.objects.values_list("id", flat=True)[
+        ARTIFACT_VERSIONS_KEPT:
+    ]
+    RecommendationArtifact.objects.filter(id__in=list(stale_versions)).delete()
+    return artifact
+
+
+def get_recommendation_rankings():
+    """
+    rankings of the latest artifact, kept in memory until a newer version is built
+    """
+    version = RecommendationArtifact.objects.values_list("id", flat=True).first()
+    if version is None:
+        return None
+    with _artifact_lock:
+        if _artifact["version"] != version:
+            rankings = (
+                RecommendationArtifact.objects.filter(id=version)
+                .values_list("rankings", flat=True)
+                .first()
+            )
+            _artifact["version"] = version
+            _artifact["rankings"] = json.loads(rankings)
+        return _artifact["rankings"]
+
+
+def get_recommended_organisation_ids(country, continent=None):
+    """
+    ranked organisation ids of the country and continent from the latest artifact,
+    the default country ranking is used for a country the artifact doesn't cover
+    """
+    rankings = get_recommendation_rankings()
+    if rankings is None:
+        # nothing is recommended until the first artifact is built
+        return []
+    for key in [
+        get_ranking_key(country, continent),
+        get_ranking_key(DEFAULT_RECOMMENDATION_COUNTRY, continent),
+        get_ranking_key(DEFAULT_RECOMMENDATION_COUNTRY),
+    ]:
+        if key in rankings:
+            return rankings[key]
+    return []
@@ -0,0 +1,132 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db.models import F
+
+from organisation.models import Organisation
+from package.models import Package
+from mobileapi.models import OrganisationSearchDocument, PackageSearchDocument
+
+ORGANISATION_LOCATION_FIELDS = (
+    "city",
+    "country",
+    "continent",
+    "street_name",
+    "street_address",
+    "zip_code",
+)
+SEARCH_CONFIG = "simple"
+
+
+def get_search_content(values):
+    """
+    lower cased text of the values, one per line so that a search key never
+    matches across two fields
+    """
+    return "\n".join(str(value).strip().lower() for value in values if value)
+
+
+def get_organisation_search_content(organisation):
+    location = organisation.location or {}
+    return get_search_content(
+        [organisation.name]
+        + [location.get(field) for field in ORGANISATION_LOCATION_FIELDS]
+        + [organisation.category.name if organisation.category_id else None]
+    )
+
+
+def get_package_search_content(package):
+    return get_search_content(
+        [
+            package.title,
+            package.package_type.name if package.package_type_id else None,
+            get_organisation_search_content(package.organisation)
+            if package.organisation_id
+            else None,
+        ]
+    )
+
+
+def update_organisation_search_document(organisation):
+    """
+    helper function to save the search document of the organisation and of its
+    packages, whose documents contain the organisation text
+    """
+    OrganisationSearchDocument.objects.update_or_create(
+        organisation=organisation,
+        defaults={"content": get_organisation_search_content(organisation)},
+    )
+    OrganisationSearchDocument.objects.filter(organisation=organisation).update(
+        search_vector=SearchVector("content", config=SEARCH_CONFIG)
+    )
+    for package in Package.objects.filter(organisation=organisation).select_related(
+        "package_type", "organisation__category"
+    ):
+        update_package_search_document(package)
+
+
+def update_package_search_document(package):
+    PackageSearchDocument.objects.update_or_create(
+        package=package, defaults={"content": get_package_search_content(package)}
+    )
+    PackageSearchDocument.objects.filter(package=package).update(
+        search_vector=SearchVector("content", config=SEARCH_CONFIG)
+    )
+
+
+def rebuild_search_documents():
+    organisations = Organisation.objects.select_related("category")
+    for organisation in organisations.iterator():
+        update_organisation_search_document(organisation)
+    return organisations.count()
+
+
+def create_missing_search_documents():
+    """
+    helper function to create the search documents missing for the organisations
+    and packages saved without the signals, like with bulk_create, searches only
+    match the objects which have a search document
+    """
+    organisations = Organisation.objects.filter(
+        search_document__isnull=True
+    ).select_related("category")
+    count = 0
+    for organisation in organisations.iterator():
+        update_organisation_search_document(organisation)
+        count += 1
+    packages = Package.objects.filter(search_document__isnull=True).select_related(
+        "package_type", "organisation__category"
+    )
+    for package in packages.iterator():
+        update_package_search_document(package)
+        count += 1
+    return count
+
+
+def search(queryset, search_key, document="search_document", rank=False):
+    """
+    helper function shared by the organisation, package and special deal searches,
+    document is the path from the queryset model to the search document. Matching
+    is a case insensitive substring match served by the trigram index, with rank
+    the results are ordered by full text rank and trigram similarity.
+
+    Every search matches all the fields of the document, the name, location and
+    category of the organisation and the title and type of the package, so some
+    views now also match the continent, street and zip code they did not look at
+    """
+    search_key = (search_key or "").strip().lower()
+    if not search_key:
+        return queryset
+    queryset = queryset.filter(**{f"{document}__content__contains": search_key})
+    if rank:
+        queryset = queryset.annotate(
+            search_rank=SearchRank(
+                F(f"{document}__search_vector"),
+                SearchQuery(search_key, config=SEARCH_CONFIG),
+            )
+            + TrigramSimilarity(f"{document}__content", search_key)
+        ).order_by("-search_rank")
+    return queryset
@@ -0,0 +1,132 @@
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from common.models import UserSearchHistory
+from mobileapi.models import PopularSearch
+
+SEARCH_HISTORY_FLUSH_SIZE = getattr(settings, "SEARCH_HISTORY_FLUSH_SIZE", 100)
+SEARCH_HISTORY_FLUSH_INTERVAL = getattr(settings, "SEARCH_HISTORY_FLUSH_INTERVAL", 30)
+
+
+class SearchHistoryBuffer:
+    """
+    search history events collected in memory and written with one bulk insert
+    once the buffer is full or the flush interval passed, the popular search
+    counters are updated with the same flush
+    """
+
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.events = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+
+    def add(self, content):
+        with self.lock:
+            self.events.append(content)
+            full = len(self.events) >= self.flush_size
+            if self.flusher is None:
+                self.flusher = threading.Thread(
+                    target=self.flush_periodically, name="search-history", daemon=True
+                )
+                self.flusher.start()
+        if full:
+            threading.Thread(target=self.flush, daemon=True).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+        if not events:
+            return
+        with self.flush_lock:
+            try:
+                write_search_history(events)
+            except Exception:
+                # the events are written again with the next flush
+                with self.lock:
+                    self.events[:0] = events
+                raise
+            finally:
+                close_old_connections()
+
+
+def update_popular_searches(events):
+    """
+    helper function to add the search history events into the popular search
+    counters, the missing keys are inserted first skipping the ones another
+    process inserted meanwhile, so the counters are only ever incremented
+    """
+    searches = Counter(
+        (
+            event.get("parent_search_key") or "",
+            event.get("child_search_key") or "",
+        )
+        for event in events
+        if isinstance(event, dict)
+    )
+    keys = sorted(searches)
+    with transaction.atomic():
+        PopularSearch.objects.bulk_create(
+            [
+                PopularSearch(
+                    parent_search_key=parent_search_key,
+                    child_search_key=child_search_key,
+                )
+                for parent_search_key, child_search_key in keys
+            ],
+            ignore_conflicts=True,
+        )
+        for parent_search_key, child_search_key in keys:
+            PopularSearch.objects.filter(
+                parent_search_key=parent_search_key, child_search_key=child_search_key
+            ).update(
+                count=F("count") + searches[(parent_search_key, child_search_key)],
+                last_searched_on=timezone.now(),
+            )
+
+
+def write_search_history(events):
+    """
+    helper function to insert the search history events and add them into the
+    popular search counters
+    """
+    with transaction.atomic():
+        UserSearchHistory.objects.bulk_create(
+            [UserSearchHistory(content=event) for event in events]
+        )
+        update_popular_searches(events)
+
+
+search_history_buffer = SearchHistoryBuffer(
+    SEARCH_HISTORY_FLUSH_SIZE, SEARCH_HISTORY_FLUSH_INTERVAL
+)
+atexit.register(search_history_buffer.flush)
+
+
+def record_search(parent_search_key, child_search_key):
+    search_history_buffer.add(
+        {
+            "parent_search_key": parent_search_key.title() if parent_search_key else "",
+            "child_search_key": child_search_key.title() if child_search_key else "",
+        }
+    )
+
+
+def get_popular_searches(limit=10):
+    return PopularSearch.objects.order_by("-count", "-last_searched_on").values(
+        "parent_search_key", "child_search_key", "count"
+    )[:limit]
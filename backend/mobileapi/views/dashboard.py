@@ -1,4 +1,4 @@
-from django.db.models import Sum, Count, F, Q
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
@@ -6,18 +6,17 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from booking.serializers import UserBookingSerializer
 import datetime
-import pandas as pd
+
+from backend.utils import convert_str_to_date
 
 from organisation.models import Organisation
 from booking.models import Booking
 from mobileapi.serializers.dashboard import TodaysBookingSerializer
-
-
-def get_forward_month_list():
-    months_choices = []
-    for i in range(1, 13):
-        months_choices.append((i, datetime.date(2008, i, 1).strftime("%b")))
-    return months_choices
+from mobileapi.utils.dashboard import (
+    GRANULARITY_FUNCTIONS,
+    get_booking_analytics,
+    get_dashboard_totals,
+)
 
 
 def check_if_organisation_authorized(organisation, user):
@@ -37,119 +36,85 @@ def check_if_organisation_authorized(organisation, user):
         )
 
 
-def get_year_based_bookings(organisation, last_year, current_year):
-    if last_year:
-        bookings = Booking.objects.filter(
-            created_on__date__year=last_year,
-            is_deleted=False,
-            cancelled=False,
-            property=organisation,
-        ).values(
-            "id",
-            "room_detail__room__category",
-            "room_detail__price",
-            "created_on__date__month",
-            "paid_amount",
-        )
-    else:
-        bookings = Booking.objects.filter(
-            created_on__date__year=current_year,
-            is_deleted=False,
-            cancelled=False,
-            property=organisation,
-        ).values(
-            "id",
-            "room_detail__room__category",
-            "room_detail__price",
-            "created_on__date__month",
-            "paid_amount",
-        )
-    return bookings
-
-
-class DashboardTotalAnalytics(APIView):
+def get_analytics_range(query_params):
+    """
+    helper function to get the date range and granularity of the analytics, it
+    defaults to the months of the current year or of the last_year param
+    """
+    from_date = query_params.get("from_date")
+    to_date = query_params.get("to_date")
+    granularity = query_params.get("granularity", "month")
+    if granularity not in GRANULARITY_FUNCTIONS:
+        raise ValidationError({"error": "granularity must be day, week or month"})
+    if from_date and to_date:
+        from_date = convert_str_to_date(from_date)
+        to_date = convert_str_to_date(to_date)
+        if from_date > to_date:
+            raise ValidationError({"error": "from_date must be before to_date"})
+        return from_date, to_date, granularity, lambda period: period.isoformat()
+    year = query_params.get("last_year") or datetime.date.today().year
+    try:
+        year = int(year)
+    except ValueError:
+        raise ValidationError({"error": "last_year must be a year"})
+    return (
+        datetime.date(year, 1, 1),
+        datetime.date(year, 12, 31),
+        "month",
+        lambda period: period.strftime("%b"),
+    )
+
+
+class DashboardAnalyticsView(APIView):
     """
-    api view to calculat
+    api view returning every dashboard tile along with the booking count and the
+    earning based on room type of each period in a single call
     """
 
+    permission_classes = (IsAuthenticated,)
+
     def get(self, request, *args, **kwargs):
         organisation = self.request.query_params.get("property")
         organisation = check_if_organisation_authorized(organisation, self.request.user)
-        today_date = datetime.date.today()
-        first = today_date.replace(day=1)
-        current_month = today_date.month
-        lastMonth = first - datetime.timedelta(days=1)
-        yesterday_date = datetime.date.today() - datetime.timedelta(1)
-        today_bookings = Booking.objects.filter(
-            created_on__date=today_date,
-            is_deleted=False,
-            cancelled=False,
-            property=organisation,
-        )
-        yesterday_bookings = Booking.objects.filter(
-            created_on__date=yesterday_date,
-            is_deleted=False,
-            cancelled=False,
-            property=organisation,
-        )
-        today_booking_count = today_bookings.count()
-        yesterday_booking_count = yesterday_bookings.count()
-        booking_guests_today = today_bookings.annotate(
-            total_guests=F("room_detail__no_of_children")
-            + F("room_detail__no_of_adults")
+        from_date, to_date, granularity, label = get_analytics_range(
+            self.request.query_params
         )
-        booking_guests_yesterday = yesterday_bookings.annotate(
-            total_guests=F("room_detail__no_of_children")
-            + F("room_detail__no_of_adults")
+        analytics = get_booking_analytics(organisation, from_date, to_date, granularity)
+        periods = analytics.get("periods")
+        return Response(
+            {
+                "totals": get_dashboard_totals(organisation),
+                "granularity": granularity,
+                "categories": analytics.get("categories"),
+                "bookings": {
+                    label(period): analytics["bookings"][period] for period in periods
+                },
+                "revenue": {
+                    label(period): analytics["revenue"][period] for period in periods
+                },
+                "guests": {
+                    label(period): analytics["guests"][period] for period in periods
+                },
+                "earning_based_on_room_type": {
+                    label(period): [
+                        {category: analytics["category_revenue"][period][category]}
+                        for category in analytics.get("categories")
+                    ]
+                    for period in periods
+                },
+            }
         )
-        today_guest_count = booking_guests_today.aggregate(Sum("total_guests"))
-        yesterday_guest_count = booking_guests_yesterday.aggregate(Sum("total_guests"))
-        today_revenue = booking_guests_today.aggregate(Sum("paid_amount"))
-        yesterday_revenue = booking_guests_yesterday.aggregate(Sum("paid_amount"))
 
-        bookings_occupy_current_month = Booking.objects.filter(
-            created_on__date__year=today_date.year,
-            created_on__date__month=current_month,
-            is_deleted=False,
-            cancelled=False,
-            property=organisation,
-        ).aggregate(Sum("room_detail__no_of_rooms"))
 
-        bookings_occupy_last_month = Booking.objects.filter(
-            created_on__date__year=today_date.year,
-            created_on__date__month=lastMonth.month,
-            is_deleted=False,
-            cancelled=False,
-            property=organisation,
-        ).aggregate(Sum("room_detail__no_of_rooms"))
+class DashboardTotalAnalytics(APIView):
+    """
+    api view to calculate the booking, guest, revenue and room tiles of the dashboard
+    """
 
-        earning_analytics = {
-            "today_booking_count": today_booking_count,
-            "yesterday_booking_count": yesterday_booking_count,
-            "today_guest_count": today_guest_count.get("total_guests__sum")
-            if today_guest_count.get("total_guests__sum")
-            else 0,
-            "yesterday_guest_count": yesterday_guest_count.get("total_guests__sum")
-            if yesterday_guest_count.get("total_guests__sum")
-            else 0,
-            "today_revenue": today_revenue.get("paid_amount__sum")
-            if today_revenue.get("paid_amount__sum")
-            else 0,
-            "yesterday_revenue": yesterday_revenue.get("paid_amount__sum")
-            if yesterday_revenue.get("paid_amount__sum")
-            else 0,
-            "bookings_occupy_current_month": bookings_occupy_current_month.get(
-                "room_detail__no_of_rooms__sum"
-            )
-            if bookings_occupy_current_month.get("room_detail__no_of_rooms__sum")
-            else 0,
-            "bookings_occupy_last_month": bookings_occupy_last_month.get(
-                "room_detail__no_of_rooms__sum"
-            )
-            if bookings_occupy_last_month.get("room_detail__no_of_rooms__sum")
-            else 0,
-        }
-        return Response(earning_analytics)
+    def get(self, request, *args, **kwargs):
+        organisation = self.request.query_params.get("property")
+        organisation = check_if_organisation_authorized(organisation, self.request.user)
+        return Response(get_dashboard_totals(organisation))
 
 
 class DashboardEarningAnalyticsView(APIView):
@@ -162,69 +127,17 @@ class DashboardEarningAnalyticsView(APIView):
     def get(self, request, *args, **kwargs):
         organisation = self.request.query_params.get("property")
         organisation = check_if_organisation_authorized(organisation, self.request.user)
-        current_year = datetime.date.today().year
-        last_year = self.request.query_params.get("last_year")
-        bookings = get_year_based_bookings(organisation, last_year, current_year)
-        months = get_forward_month_list()
-        earning_based_on_room_type = {}
-        bookings_dataframe = pd.DataFrame(bookings)
-        for mnth in months:
-            if not bookings_dataframe.empty:
-                earning_based_on_room_type.update(
-                    {
-                        mnth[1]: [
-                            {
-                                "Single": bookings_dataframe.loc[
-                                    (
-                                        bookings_dataframe[
-                                            "room_detail__room__category"
-                                        ]
-                                        == "Single"
-                                    )
-                                    & (
-                                        bookings_dataframe["created_on__date__month"]
-                                        == mnth[0]
-                                    ),
-                                    "paid_amount",
-                                ].sum()
-                            },
-                            {
-                                "Double": bookings_dataframe.loc[
-                                    (
-                                        bookings_dataframe[
-                                            "room_detail__room__category"
-                                        ]
-                                        == "Double"
-                                    )
-                                    & (
-                                        bookings_dataframe["created_on__date__month"]
-                                        == mnth[0]
-                                    ),
-                                    "paid_amount",
-                                ].sum()
-                            },
-                            {
-                                "Deluxe": bookings_dataframe.loc[
-                                    (
-                                        bookings_dataframe[
-                                            "room_detail__room__category"
-                                        ]
-                                        == "Deluxe"
-                                    )
-                                    & (
-                                        bookings_dataframe["created_on__date__month"]
-                                        == mnth[0]
-                                    ),
-                                    "paid_amount",
-                                ].sum()
-                            },
-                        ]
-                    }
-                )
-            else:
-                earning_based_on_room_type.update(
-                    {mnth[1]: [{"Single": 0}, {"Double": 0}, {"Deluxe": 0}]}
-                )
+        from_date, to_date, granularity, label = get_analytics_range(
+            self.request.query_params
+        )
+        analytics = get_booking_analytics(organisation, from_date, to_date, granularity)
+        earning_based_on_room_type = {
+            label(period): [
+                {category: analytics["category_revenue"][period][category]}
+                for category in analytics.get("categories")
+            ]
+            for period in analytics.get("periods")
+        }
         return Response(earning_based_on_room_type)
 
 
@@ -276,24 +189,14 @@ class DashboardTotalBooking(APIView):
     def get(self, request, *args, **kwargs):
         organisation = self.request.query_params.get("property")
         organisation = check_if_organisation_authorized(organisation, self.request.user)
-        current_year = datetime.date.today().year
-        last_year = self.request.query_params.get("last_year")
-        monthly_number_of_bookings = {}
-        months = get_forward_month_list()
-        bookings = get_year_based_bookings(organisation, last_year, current_year)
-        bookings_dataframe = pd.DataFrame(bookings)
-        for mnth in months:
-            if not bookings_dataframe.empty:
-                monthly_number_of_bookings.update(
-                    {
-                        mnth[1]: bookings_dataframe.loc[
-                            bookings_dataframe["created_on__date__month"] == mnth[0],
-                            "id",
-                        ].count()
-                    }
-                )
-            else:
-                monthly_number_of_bookings.update({mnth[1]: 0})
+        from_date, to_date, granularity, label = get_analytics_range(
+            self.request.query_params
+        )
+        analytics = get_booking_analytics(organisation, from_date, to_date, granularity)
+        monthly_number_of_bookings = {
+            label(period): analytics["bookings"][period]
+            for period in analytics.get("periods")
+        }
         return Response(monthly_number_of_bookings)
 
 
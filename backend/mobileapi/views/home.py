@@ -5,9 +5,10 @@ from mobileapi.serializers.organisation import (
     ContinentPropertyAnnotateSerializer
 )
 from organisation.models import Organisation
-from mobileapi.utils.helpers import get_country_flag
-from backend.countries_list import countries
-from common.models import BackgroundImage
+from mobileapi.utils.geo_counts import (
+    get_continent_property_counts,
+    get_country_property_counts,
+)
 
 
 class RecommendationPackageListView(ListAPIView):
@@ -16,7 +17,9 @@ class RecommendationPackageListView(ListAPIView):
     """
 
     serializer_class = OrganisationListInfoSerializer
-    queryset = Organisation.objects.filter(is_deleted=False)
+    queryset = Organisation.objects.filter(is_deleted=False).select_related(
+        "rating_summary"
+    )
 
 
 class CountryPropertyCountView(ListAPIView):
@@ -28,31 +31,7 @@ class CountryPropertyCountView(ListAPIView):
 
     def get_queryset(self):
         continent = self.request.query_params.get("continent")
-        organisations = Organisation.objects.filter(is_deleted=False).values('location__country')
-        if continent:
-            organisations = organisations.filter(location__continent__icontains=continent)
-
-        countries_list = [org.get("location__country").capitalize()
-                          if org.get('location__country')
-                          else "no_country"
-                          for org in organisations]
-        country_data = []
-        for country in set(countries_list):
-            background_image = BackgroundImage.objects.filter(name__icontains=country).first()
-            context = {
-                "no_of_property": organisations.filter(
-                    location__country=country
-                ).count(),
-                "location": country,
-                "flag_url": get_country_flag(country),
-                "background_image": background_image.image_url if background_image else "https://img2.pngio.com/index-of-areaedu-wp-content-uploads-2016-02-default-png-600_600.png"
-            }
-            if continent:
-                context.update({
-                    "continent": continent.capitalize()
-                })
-            country_data.append(context)
-        return country_data
+        return get_country_property_counts(continent)
 
 
 class ContinentPropertyCountView(ListAPIView):
@@ -62,22 +41,4 @@ class ContinentPropertyCountView(ListAPIView):
     serializer_class = ContinentPropertyAnnotateSerializer
 
     def get_queryset(self):
-        organisations = Organisation.objects.filter(is_deleted=False, is_visible=True).values('location__continent')
-        continent_list = [org.get("location__continent").lower()
-                          if org.get('location__continent')
-                          else "no_country"
-                          for org in organisations]
-        continent_data = []
-        for continent in set(continent_list):
-            background_image = BackgroundImage.objects.filter(name__icontains=continent).first()
-            if continent != "no_country":
-                context = {
-                    "no_of_property": organisations.filter(
-                        location__continent__icontains=continent
-                    ).count(),
-                    "continent": continent,
-                    "flag_url": get_country_flag(continent),
-                    "background_image": background_image.image_url if background_image else "https://img2.pngio.com/index-of-areaedu-wp-content-uploads-2016-02-default-png-600_600.png"
-                }
-                continent_data.append(context)
-        return continent_data
+        return get_continent_property_counts()
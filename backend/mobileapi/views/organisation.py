@@ -1,6 +1,6 @@
 import math
 
-from django.db.models import Q, Avg, Count, Min, Max, F, Sum
+from django.db.models import Q, Min, F, Sum
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from rest_framework import generics
@@ -14,21 +14,30 @@ from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
 import datetime
 
-import pandas as pd
-from booking.models import RatingByIndividual
 from mobileapi.serializers.organisation import *
 from mobileapi.serializers.organisation import OrganisationListFilterInfoSerilizer
-from backend.utils import hotel_recommendor_model
 from booking.models import BookingDetail
 from mobileapi.serializers.organisation import OrganisationFetchRoomNumberSerializer
 from django.db.models.query import Prefetch
 from organisation.models import OrganisationRoomUnavailability, Organisation
-from mobileapi.utils.helpers import get_country_flag, validate_rating
+from mobileapi.utils.helpers import validate_rating
+from mobileapi.utils.countries import get_flag_url
 from backend.utils import (
     CustomPageSizePagination,
     OrganisationListCustomPageSizePagination,
 )
 from mobileapi.utils.helpers import get_filter_organisations
+from mobileapi.utils.facets import get_organisation_facets
+from mobileapi.utils.favourites import get_favourite_organisation_ids
+from mobileapi.utils.ratings import get_rating_summary
+from mobileapi.utils.overlap import overlap_night
+from mobileapi.utils.search import search
+from mobileapi.utils.recommendations import (
+    DEFAULT_RECOMMENDATION_COUNTRY,
+    get_recommendation_queryset,
+    get_recommended_organisation_ids,
+)
+from mobileapi.models import RATING_DIMENSIONS
 from webapi.utils.helpers import get_client_ip, get_visitor_info
 
 
@@ -65,12 +74,7 @@ class OrganisationListView(generics.ListAPIView):
         queryset = self.queryset
         search_key = self.request.query_params.get("search_key")
         if search_key:
-            queryset = queryset.filter(
-                Q(name__icontains=search_key)
-                | Q(location__city__icontains=search_key)
-                | Q(location__country__icontains=search_key)
-                | Q(category__name__icontains=search_key)
-            )
+            queryset = search(queryset, search_key)
 
         if facilities:
             queryset = queryset.filter(facilities__contains=facilities)
@@ -93,7 +97,9 @@ class OrganisationListView(generics.ListAPIView):
                 )
             )
 
-        queryset = queryset.annotate(user_rating=Avg("rating__rating_star") or 0)
+        queryset = queryset.select_related("rating_summary").annotate(
+            user_rating=F("rating_summary__rating_star_average")
+        )
         if self.request.query_params.get("ratings"):
             queryset = queryset.filter(
                 user_rating=self.request.query_params.get("ratings")
@@ -104,14 +110,8 @@ class OrganisationListView(generics.ListAPIView):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         if page is not None:
-            favourite_organisation = []
+            favourite_organisation = get_favourite_organisation_ids(request.user)
             if request.user.is_authenticated:
-                favourite_organisation = UserOrganisationFavorites.objects.filter(
-                    user=request.user
-                ).values("organisation__id")
-                favourite_organisation = [
-                    i.get("organisation__id") for i in favourite_organisation
-                ]
                 if self.request.query_params.get("favourite") == "true":
                     queryset = queryset.filter(id__in=favourite_organisation)
 
@@ -121,10 +121,7 @@ class OrganisationListView(generics.ListAPIView):
             serializer = self.get_serializer(page, many=True)
 
             for q in serializer.data:
-                if q.get("id") in favourite_organisation:
-                    q["favourite"] = True
-                else:
-                    q["favourite"] = False
+                q["favourite"] = q.get("id") in favourite_organisation
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(queryset, many=True)
@@ -178,9 +175,12 @@ class OrganisationListViewV2(generics.ListAPIView):
                 Sum(
                     "booked_room__no_of_rooms",
                     filter=Q(
+                        overlap_night(
+                            "booked_room__booking__checkin_date",
+                            "booked_room__booking__checkout_date",
+                            datetime.date.today(),
+                        ),
                         booked_room__booking__is_deleted=False,
-                        booked_room__booking__checkin_date__gte=datetime.date.today(),
-                        booked_room__booking__checkout_date__gt=datetime.date.today(),
                     ),
                 ),
                 0,
@@ -200,12 +200,7 @@ class OrganisationListViewV2(generics.ListAPIView):
 
         search_key = self.request.query_params.get("search_key")
         if search_key:
-            queryset = queryset.filter(
-                Q(name__icontains=search_key)
-                | Q(location__city__icontains=search_key)
-                | Q(location__country__icontains=search_key)
-                | Q(category__name__icontains=search_key)
-            )
+            queryset = search(queryset, search_key)
 
         if facilities:
             queryset = queryset.filter(facilities__contains=facilities)
@@ -270,8 +265,8 @@ class OrganisationListViewV2(generics.ListAPIView):
                 )
             )
 
-        queryset = queryset.annotate(
-            user_rating=Avg("rating__rating_star", filter=Q(rating__is_deleted=False))
+        queryset = queryset.select_related("rating_summary").annotate(
+            user_rating=F("rating_summary__rating_star_average")
         )
 
         if self.request.query_params.get("ratings"):
@@ -286,9 +281,7 @@ class OrganisationListViewV2(generics.ListAPIView):
         page_size = int(self.request.query_params.get("page_size", 10))
         page_no = int(self.request.query_params.get("page_no", 0))
         queryset = queryset.annotate(
-            user_review_count=Count(
-                "rating", distinct=True, filter=Q(rating__is_deleted=False)
-            )
+            user_review_count=F("rating_summary__rating_count")
         )
         rating_filter_count = {}
         rating_filter_count.update(
@@ -338,16 +331,11 @@ class OrganisationListViewV3(generics.ListAPIView):
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
+            favourite_organisation = get_favourite_organisation_ids(
+                self.request.user, [organisation.id for organisation in page]
+            )
             for data in serializer.data:
-                if (
-                    self.request.user.is_authenticated
-                    and UserOrganisationFavorites.objects.filter(
-                        organisation__id=data.get("id"), user=self.request.user
-                    ).exists()
-                ):
-                    data.update({"is_favourite": True})
-                else:
-                    data.update({"is_favourite": False})
+                data.update({"is_favourite": data.get("id") in favourite_organisation})
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(queryset, many=True)
@@ -357,55 +345,7 @@ class OrganisationListViewV3(generics.ListAPIView):
 class OrganisationSearchResult(APIView):
     def get(self, request, *args, **kwargs):
         queryset = get_filter_organisations(self.request)
-        rating_filter_count = []
-        for i in range(1, 6):
-            rating_filter_count.append(
-                {
-                    "rating_star": i,
-                    "rating_star_count": queryset.filter(user_rating=i).count(),
-                }
-            )
-        property_type_filter_count = []
-        property_categorys = list(PropertyCategory.objects.all())
-        for category in property_categorys:
-            property_type_filter_count.append(
-                {
-                    "id": category.id,
-                    "property_type": category.name,
-                    "property_type_count": queryset.filter(
-                        category__id=category.id
-                    ).count(),
-                }
-            )
-
-        facility_filter_count = []
-        FACILITIES_PROPERTY_OPTIONS = (
-            ("Desk/workspace", "Desk/workspace"),
-            ("Private pool", "Private pool"),
-            ("Gym", "Gym"),
-        )
-        for facility in FACILITIES_PROPERTY_OPTIONS:
-            facility_filter_count.append(
-                {
-                    "facility_name": facility[1],
-                    "facility_count": queryset.filter(
-                        facilities__contains=facility
-                    ).count(),
-                }
-            )
-        min_room_price = queryset.aggregate(Min("rooms__price")).get(
-            "rooms__price__min"
-        )
-        max_room_price = queryset.aggregate(Max("rooms__price")).get(
-            "rooms__price__max"
-        )
-        res = {
-            "min_room_price": min_room_price,
-            "max_room_price": max_room_price,
-            "facility_filter_count": facility_filter_count,
-            "property_type_filter_count": property_type_filter_count,
-            "rating_filter_count": rating_filter_count,
-        }
+        res = get_organisation_facets(queryset)
         return Response(res)
 
 
@@ -440,51 +380,30 @@ class OrganisationDetailView(generics.RetrieveAPIView):
         queryset = (
             self.get_queryset()
             .filter(is_deleted=False, is_visible=True, property_status="Published")
-            .annotate(
-                rating_location_average=Avg(
-                    "rating__location", filter=Q(rating__is_deleted=False)
-                ),
-                rating_comfort_average=Avg(
-                    "rating__comfort", filter=Q(rating__is_deleted=False)
-                ),
-                rating_personnel_average=Avg(
-                    "rating__personnel", filter=Q(rating__is_deleted=False)
-                ),
-                rating_cleanliness_average=Avg(
-                    "rating__cleanliness", filter=Q(rating__is_deleted=False)
-                ),
-                rating_good_offer_average=Avg(
-                    "rating__good_offer", filter=Q(rating__is_deleted=False)
-                ),
-                rating_service_average=Avg(
-                    "rating__service", filter=Q(rating__is_deleted=False)
-                ),
-            )
+            .select_related("rating_summary")
         )
         queryset = self.filter_queryset(queryset)
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
         obj = get_object_or_404(queryset, **filter_kwargs)
         self.check_object_permissions(self.request, obj)
-
+        rating_summary = get_rating_summary(obj)
+        for dimension in RATING_DIMENSIONS:
+            setattr(
+                obj,
+                f"rating_{dimension}_average",
+                rating_summary.get_average(dimension),
+            )
         return obj
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        user_rating = RatingByIndividual.objects.filter(
-            rated_on__id=instance.id, is_deleted=False
-        ).aggregate(Avg("rating_star"))
-        instance.user_rating = user_rating.get("rating_star__avg")
-        instance.favourite = False
-        instance.user_review_count = RatingByIndividual.objects.filter(
-            rated_on__id=instance.id, is_deleted=False
-        ).count()
-        instance.favourite = False
-        if request.user.is_authenticated:
-            if UserOrganisationFavorites.objects.filter(
-                user=self.request.user, organisation=self.get_object()
-            ).exists():
-                instance.favourite = True
+        rating_summary = get_rating_summary(instance)
+        instance.user_rating = rating_summary.rating_star_average
+        instance.user_review_count = rating_summary.rating_count
+        instance.favourite = instance.id in get_favourite_organisation_ids(
+            request.user, [instance.id]
+        )
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -496,38 +415,30 @@ class HotelRecommendationAPIView(APIView, CustomPageSizePagination):
     def get(self, request, *args, **kwargs):
         country = self.request.query_params.get("country")
         continent = self.request.query_params.get("continent")
-        queryset = Organisation.objects.filter(
-            is_deleted=False, property_status="Published", is_visible=True
-        ).values(
-            "photo_url",
-            "location",
-            "name",
-            "category",
-            "description",
-            "safety",
-            "facilities",
-            "recommended",
-            "safety",
-            "id",
-        )
-        queryset = queryset.annotate(
-            user_rating=Avg("rating__rating_star", filter=Q(rating__is_deleted=False)),
-            min_room_price=Min("rooms__price", filter=Q(rooms__is_deleted=False)),
-            category_name=F("category__name"),
-        )
-        organisation = pd.DataFrame(queryset)
         if country is None:
             client_ip = get_client_ip(request)
             result = get_visitor_info(client_ip, request)
-            country = result.get("country") if result.get("country") else "Nepal"
-        recommended_organisations = hotel_recommendor_model(
-            country, organisation, continent
+            country = (
+                result.get("country")
+                if result.get("country")
+                else DEFAULT_RECOMMENDATION_COUNTRY
+            )
+        recommended_organisations = get_recommended_organisation_ids(
+            country, continent
         )
-        organisations = queryset.filter(id__in=recommended_organisations)
-        if country:
-            for organisation in list(organisations):
-                organisation["flag"] = get_country_flag(country)
-        organisations = self.paginate_queryset(organisations, self.request)
+        page = self.paginate_queryset(recommended_organisations, self.request)
+        organisations = {
+            organisation.get("id"): organisation
+            for organisation in get_recommendation_queryset().filter(id__in=page)
+        }
+        organisations = [
+            organisations.get(organisation_id)
+            for organisation_id in page
+            if organisation_id in organisations
+        ]
+        flag_url = get_flag_url(country)
+        for organisation in organisations:
+            organisation["flag"] = flag_url
         serializer = OrganisationListInfoSerializer(organisations, many=True)
         return self.get_paginated_response(serializer.data)
 
@@ -553,15 +464,22 @@ class MineOrganisationListView(APIView, CustomPageSizePagination):
                 Sum(
                     "booked_room__no_of_rooms",
                     filter=Q(
+                        overlap_night(
+                            "booked_room__booking__checkin_date",
+                            "booked_room__booking__checkout_date",
+                            datetime.date.today(),
+                        ),
                         booked_room__booking__is_deleted=False,
-                        booked_room__booking__checkin_date__gte=datetime.date.today(),
-                        booked_room__booking__checkout_date__gt=datetime.date.today(),
                     ),
                 ),
                 0,
             )
         )
-        queryset = queryset.filter(is_deleted=False).prefetch_related(Prefetch("rooms"))
+        queryset = (
+            queryset.filter(is_deleted=False)
+            .select_related("rating_summary")
+            .prefetch_related(Prefetch("rooms"))
+        )
         page = self.paginate_queryset(queryset, self.request)
         serializer = OrganisationListInfoSerializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -1,4 +1,3 @@
-from django.db.models import Q, Sum
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework.exceptions import ValidationError
@@ -10,7 +9,7 @@ from mobileapi.serializers.unavailability import (
     OrganisationRoomUnavailabilitySerializer,
 )
 from mobileapi.utils.custom_filter import RoomUnavailabilityFilter
-from booking.models import BookingDetail
+from mobileapi.utils.inventory import get_category_availability
 
 
 class OrganisationRoomUnAvailabilityViewset(viewsets.ModelViewSet):
@@ -36,8 +35,6 @@ class OrganisationRoomUnAvailabilityViewset(viewsets.ModelViewSet):
         room_numbers = serializer.validated_data.get("room_numbers")
         organisation = self.request.query_params.get("organisation")
         room_types = self.request.data.get("room_type")
-        from_date = self.request.data.get("from_date")
-        to_date = self.request.data.get("to_date")
         try:
             Organisation.objects.get(
                 id=organisation, user=self.request.user, is_deleted=False
@@ -54,138 +51,40 @@ class OrganisationRoomUnAvailabilityViewset(viewsets.ModelViewSet):
             raise ValidationError(
                 {"error": "room unavailability with such room_detail already exists"}
             )
-        organisation_room_numbers = Room.objects.filter(organisation__id=organisation)
-        organisation_rooms = []
-        [
-            [
-                organisation_rooms.append(room_number)
-                for room_number in room.room_numbers
-            ]
-            for room in list(organisation_room_numbers)
-        ]
+        # unavailability to_date is inclusive
+        from_date = serializer.validated_data.get("from_date")
+        to_date = serializer.validated_data.get("to_date")
+        categories = get_category_availability(
+            Room.objects.filter(organisation__id=organisation, is_deleted=False),
+            from_date,
+            to_date + datetime.timedelta(days=1),
+        )
+        organisation_rooms = set().union(
+            *[category.get("room_numbers") for category in categories.values()]
+        )
         for room in room_numbers:
             if room not in organisation_rooms:
                 raise ValidationError({"error": f"Invalid room : {room}"})
 
-        booked_rooms = BookingDetail.objects.filter(
-            ~Q(booking__payment_status="Draft"),
-            Q(
-                booking__checkin_date__gte=from_date,
-                booking__checkout_date__lte=to_date,
-            )
-            | Q(
-                booking__checkin_date__lte=from_date,
-                booking__checkout_date__gte=from_date,
-            )
-            | Q(
-                booking__checkin_date__lte=to_date,
-                booking__checkout_date__gte=to_date,
-            ),
-            booking__property__id=organisation,
-            booking__is_deleted=False,
-            booking__cancelled=False,
-        )
-        single_booked_rooms = booked_rooms.filter(room__category="Single").aggregate(
-            Sum("no_of_rooms")
-        )
-        double_booked_rooms = booked_rooms.filter(room__category="Double").aggregate(
-            Sum("no_of_rooms")
-        )
-        deluxe_booked_rooms = booked_rooms.filter(room__category="Deluxe").aggregate(
-            Sum("no_of_rooms")
-        )
-
-        if single_booked_rooms.get("no_of_rooms__sum") is None:
-            single_booked_rooms = 0
-        else:
-            single_booked_rooms = single_booked_rooms.get("no_of_rooms__sum")
-
-        if double_booked_rooms.get("no_of_rooms__sum") is None:
-            double_booked_rooms = 0
-        else:
-            double_booked_rooms = double_booked_rooms.get("no_of_rooms__sum")
-
-        if deluxe_booked_rooms.get("no_of_rooms__sum") is None:
-            deluxe_booked_rooms = 0
-        else:
-            deluxe_booked_rooms = deluxe_booked_rooms.get("no_of_rooms__sum")
-
         for room_type in room_types:
-            organisation_rooms = []
-            count = 0
-            [
-                [
-                    organisation_rooms.append(room_number)
-                    for room_number in room.room_numbers
-                ]
-                for room in list(organisation_room_numbers.filter(category=room_type))
-            ]
-            for room in room_numbers:
-                if room in organisation_rooms:
-                    count += 1
-
-            if room_type == "Single":
-                if single_booked_rooms == len(organisation_rooms):
-                    raise ValidationError(
-                        {
-                            "error": "All the rooms are already booked for the selected date range"
-                        }
-                    )
-                elif len(organisation_rooms) - single_booked_rooms < count:
-                    available_rooms = len(organisation_rooms) - single_booked_rooms
-                    if available_rooms < 0:
-                        raise ValidationError(
-                            {
-                                "error": "All the rooms are already booked for the selected date range"
-                            }
-                        )
-                    raise ValidationError(
-                        {
-                            "error": f"{single_booked_rooms} rooms are already booked for the selected date range"
-                        }
-                    )
-
-            if room_type == "Double":
-                if double_booked_rooms == len(organisation_rooms):
-                    raise ValidationError(
-                        {
-                            "error": "All the rooms are already booked for the selected date range"
-                        }
-                    )
-                elif len(organisation_rooms) - double_booked_rooms < count:
-                    available_rooms = len(organisation_rooms) - double_booked_rooms
-                    if available_rooms < 0:
-                        raise ValidationError(
-                            {
-                                "error": "All the rooms are already booked for the selected date range"
-                            }
-                        )
-                    raise ValidationError(
-                        {
-                            "error": f"{double_booked_rooms} rooms are already booked for the selected date range"
-                        }
-                    )
-
-            if room_type == "Deluxe":
-                if deluxe_booked_rooms == len(organisation_rooms):
-                    raise ValidationError(
-                        {
-                            "error": "All the rooms are already booked for the selected date range"
-                        }
-                    )
-                elif len(organisation_rooms) - deluxe_booked_rooms < count:
-                    available_rooms = len(organisation_rooms) - deluxe_booked_rooms
-                    if available_rooms < 0:
-                        raise ValidationError(
-                            {
-                                "error": "All the rooms are already booked for the selected date range"
-                            }
-                        )
-                    raise ValidationError(
-                        {
-                            "error": f"{deluxe_booked_rooms} rooms are already booked for the selected date range"
-                        }
-                    )
+            category = categories.get(room_type)
+            if category is None:
+                continue
+            total_rooms = len(category.get("room_numbers"))
+            booked_rooms = category.get("booked_count")
+            count = len(category.get("room_numbers") & set(room_numbers))
+            if booked_rooms >= total_rooms:
+                raise ValidationError(
+                    {
+                        "error": "All the rooms are already booked for the selected date range"
+                    }
+                )
+            if total_rooms - booked_rooms < count:
+                raise ValidationError(
+                    {
+                        "error": f"{booked_rooms} rooms are already booked for the selected date range"
+                    }
+                )
 
     def get_queryset(self):
         queryset = OrganisationRoomUnavailability.objects.filter(
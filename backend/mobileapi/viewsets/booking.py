@@ -13,7 +13,9 @@ class UserBookedByViewset(viewsets.ModelViewSet):
     def get_queryset(self):
         bookings = []
         if self.request.user.is_authenticated:
-            bookings = Booking.objects.filter(booked_by=self.request.user, is_deleted=False)
+            bookings = Booking.objects.filter(
+                booked_by=self.request.user, is_deleted=False
+            ).select_related('property__rating_summary')
         return bookings
 
     def perform_create(self, serializer):
@@ -1,4 +1,4 @@
-from django.db.models import Q, Case, When, Value, CharField
+from django.db.models import Case, When, Value, CharField
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.exceptions import ValidationError, PermissionDenied
@@ -9,6 +9,7 @@ from rest_framework.response import Response
 
 from mobileapi.serializers.special_deal import OrganisationSpecialDealSerializer
 from organisation.models import OrganisationSpecialDeal, Organisation
+from mobileapi.utils.search import search
 
 
 def special_deal_validation(request):
@@ -76,15 +77,7 @@ class OrganisationSpecialDealViewset(viewsets.ModelViewSet):
                 to_date__lt=datetime.date.today()
             )
         if q:
-            queryset = queryset.filter(
-                Q(organisation__location__city__icontains=q)
-                | Q(organisation__location__country__icontains=q)
-                | Q(organisation__location__street_name__icontains=q)
-                | Q(organisation__location__street_address__icontains=q)
-                | Q(organisation__location__zip_code__icontains=q)
-                | Q(organisation__name__icontains=q)
-                | Q(organisation__category__name__icontains=q)
-            )
+            queryset = search(queryset, q, document="organisation__search_document")
 
         queryset = queryset.annotate(
             upcoming=Case(
@@ -0,0 +1,82 @@
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout of the gateway requests in seconds
+PAYMENT_GATEWAY_TIMEOUT = getattr(settings, "PAYMENT_GATEWAY_TIMEOUT", (3.05, 10))
+PAYMENT_GATEWAY_RETRIES = getattr(settings, "PAYMENT_GATEWAY_RETRIES", 3)
+PAYMENT_GATEWAY_POOL_SIZE = getattr(settings, "PAYMENT_GATEWAY_POOL_SIZE", 20)
+
+_session = None
+
+
+class PaymentGatewayError(Exception):
+    """
+    raised when the payment gateway cannot be reached or keeps failing
+    """
+
+
+def get_payment_session():
+    """
+    keep alive session shared by the gateway requests, connection errors and
+    gateway 5xx responses are retried with exponential backoff. A read timeout is
+    never retried, the gateway may have verified the payment already and would
+    reject the second verification
+    """
+    global _session
+    if _session is None:
+        retry = Retry(
+            total=PAYMENT_GATEWAY_RETRIES,
+            read=0,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=PAYMENT_GATEWAY_POOL_SIZE,
+            pool_maxsize=PAYMENT_GATEWAY_POOL_SIZE,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
+def post_to_gateway(url, payload, headers=None):
+    try:
+        return get_payment_session().post(
+            url, payload, headers=headers, timeout=PAYMENT_GATEWAY_TIMEOUT
+        )
+    except requests.exceptions.RequestException as e:
+        raise PaymentGatewayError(str(e))
+
+
+def verify_khalti_payment(token, amount):
+    """
+    verify the khalti payment token, amount is in paisa
+    """
+    response = post_to_gateway(
+        settings.KHALTI_VERIFY_URL,
+        {"token": token, "amount": amount},
+        headers={"Authorization": "Key {}".format(settings.KHALTI_SECRET_KEY)},
+    )
+    try:
+        detail = response.json()
+    except ValueError:
+        detail = response.text
+    return {"success": response.status_code == 200, "detail": detail}
+
+
+def verify_esewa_payment(token, amount, product_id):
+    """
+    verify the esewa payment with the reference id returned by esewa
+    """
+    response = post_to_gateway(
+        settings.ESEWA_VERIFY_URL,
+        {"amt": amount, "scd": settings.ESEWA_SCD, "rid": token, "pid": product_id},
+    )
+    return {"success": "Success" in response.text, "detail": response.text}
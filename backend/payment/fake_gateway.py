@@ -0,0 +1,70 @@
+"""
+local khalti and esewa verification server for tests and load benchmarks, point
+KHALTI_VERIFY_URL and ESEWA_VERIFY_URL to http://<host>:<port>/khalti/ and
+http://<host>:<port>/esewa/, tokens starting with "fail" are rejected
+"""
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def get_handler(delay=0):
+    class FakeGatewayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, status, body, content_type):
+            body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            data = {
+                key: value[0]
+                for key, value in parse_qs(self.rfile.read(length).decode()).items()
+            }
+            if delay:
+                time.sleep(delay)
+            if self.path.startswith("/khalti"):
+                token = data.get("token", "")
+                if token.startswith("fail"):
+                    self.send(
+                        400,
+                        json.dumps({"detail": "Invalid token.", "token": token}),
+                        "application/json",
+                    )
+                else:
+                    self.send(
+                        200,
+                        json.dumps(
+                            {"idx": token, "amount": int(data.get("amount") or 0)}
+                        ),
+                        "application/json",
+                    )
+            elif self.path.startswith("/esewa"):
+                rid = data.get("rid", "")
+                code = "Failure" if rid.startswith("fail") else "Success"
+                self.send(
+                    200,
+                    f"<response><response_code>{code}</response_code></response>",
+                    "text/xml",
+                )
+            else:
+                self.send(404, "", "text/plain")
+
+    return FakeGatewayHandler
+
+
+def get_fake_gateway(host="127.0.0.1", port=0, delay=0):
+    """
+    fake gateway server, port 0 picks a free port available on server.server_port,
+    run it with server.serve_forever in a thread and stop it with server.shutdown
+    """
+    return ThreadingHTTPServer((host, port), get_handler(delay))
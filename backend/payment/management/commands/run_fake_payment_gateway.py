@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from payment.fake_gateway import get_fake_gateway
+
+
+class Command(BaseCommand):
+    help = "Run a local fake khalti and esewa verification server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0,
+            help="Seconds to wait before answering, to simulate a slow gateway",
+        )
+
+    def handle(self, *args, **options):
+        server = get_fake_gateway(options["host"], options["port"], options["delay"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fake payment gateway on http://{options['host']}:{server.server_port}"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -118,7 +118,12 @@ class GST(models.Model):
         return self.country
 
 
-PAYMENT_STATUS = (("success", "Success"), ("failure", "Failure"))
+# refund is a captured payment whose booking could not be confirmed
+PAYMENT_STATUS = (
+    ("success", "Success"),
+    ("failure", "Failure"),
+    ("refund", "Refund"),
+)
 
 
 class KhaltiTransactionDetail(models.Model):
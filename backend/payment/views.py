@@ -1,19 +1,18 @@
 from django.db import transaction
 from django.shortcuts import render
-from django.conf import settings
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework import viewsets, filters, status
 from rest_framework.permissions import IsAuthenticated
-import requests
 import json
 from rest_framework.response import Response
 from booking.models import Booking
 from booking.serializers import BookingInvoiceSerializer, UserBookingSerializer
+from .clients import PaymentGatewayError, verify_esewa_payment, verify_khalti_payment
 from .models import PaymentMethod, SetRate, GST, KhaltiTransactionDetail
 from .serializers import PaymentMethodSerializer, SetRateSerializer
 from organisation.models import Organisation, Room
-from booking.models import Booking, BookingDetail
+from booking.models import BookingDetail
 from django.db.models import Sum
 from users.models import UserReferStat
 
@@ -32,90 +31,54 @@ class VerifyKhaltiPayment(APIView):
     """
 
     def khalti_verification(self, token, amount, booking_id, payment_processor):
-        payload = {
-            "token": token,
-            "amount": amount,
-        }
-        headers = {
-            "Authorization": "Key {}".format(settings.KHALTI_SECRET_KEY)
-        }
         try:
             booking = Booking.objects.get(id=booking_id)
-            if amount < float(booking.total_amount) * 0.10:
-                raise ValidationError({"amount": "you must pay minimum 10% to confirm booking"})
-            try:
-                response = requests.post(settings.KHALTI_VERIFY_URL, payload, headers=headers)
-                if response.status_code == 200:
-                    booking.khalti_payment_status = "success"
-                    booking.payment_status = "Paid"
-                    booking.payment_method = payment_processor
-                    booking.paid_amount = amount
-                    booking.save()
-                    KhaltiTransactionDetail.objects.create(
-                        token=token,
-                        payment_status="success",
-                        booking_id=booking,
-                        amount=amount
-                    )
-                    serializer = UserBookingSerializer(booking)
-                    return {"status": 200, "detail": serializer.data}
-
-                else:
-                    booking.khalti_payment_status = "failure"
-                    booking.save()
-                    KhaltiTransactionDetail.objects.create(
-                        token=token,
-                        payment_status="failure",
-                        booking_id=booking,
-                        amount=amount
-                    )
-                    return {"status": 401, "detail": response.json()}
-
-            except requests.exceptions.HTTPError as e:
-                booking.status = "failed verification"
-                booking.save()
-                return Response({
-                    'status': False,
-                    'detail': 'unable to send payment verification request to khalti',
-                })
         except Booking.DoesNotExist:
-            return Response({
-                'status': False,
-                'details': "Unable to verify payment.Booking not available."
-            })
-
-    def esewa_verification(self, token, amount, booking_id):
-        payload = {
-            'amt': amount,
-            'scd': settings.ESEWA_SCD,
-            'rid': token,
-            'pid': booking_id,
-        }
+            return {"status": 400, "detail": "Unable to verify payment.Booking not available."}
+        if amount < float(booking.total_amount) * 0.10:
+            raise ValidationError({"amount": "you must pay minimum 10% to confirm booking"})
+        # the gateway is called outside of any transaction so that a slow gateway
+        # doesn't keep the booking row locked
         try:
-            booking = Booking.objects.get(id=booking_id)
-            try:
-                response = requests.post(settings.ESEWA_VERIFY_URL, payload)
-                if response.text.__contains__('Success'):
-                    booking.status = "success"
-                    booking.save()
-                    return {"status": 200, "detail": response.text}
-
-                else:
-                    booking.status = "failed"
-                    booking.save()
-                    return {"status": 200, "detail": response.text}
+            verification = verify_khalti_payment(token, amount)
+        except PaymentGatewayError:
+            return {"status": 503, "detail": "unable to send payment verification request to khalti"}
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(id=booking_id)
+            if verification.get("success"):
+                booking.khalti_payment_status = "success"
+                booking.payment_status = "Paid"
+                booking.payment_method = payment_processor
+                booking.paid_amount = amount
+            else:
+                booking.khalti_payment_status = "failure"
+            booking.save()
+            KhaltiTransactionDetail.objects.create(
+                token=token,
+                payment_status="success" if verification.get("success") else "failure",
+                booking_id=booking,
+                amount=amount
+            )
+        if verification.get("success"):
+            serializer = UserBookingSerializer(booking)
+            return {"status": 200, "detail": serializer.data}
+        return {"status": 401, "detail": verification.get("detail")}
 
-            except requests.exceptions.HTTPError as e:
-                booking.status = "failed verification"
-                booking.save()
-                return Response({
-                    'status': False,
-                    'detail': 'unable to send payment verification request to esewa',
-                })
-        except Booking.DoesNotExist:
+    def esewa_verification(self, token, amount, booking_id):
+        if not Booking.objects.filter(id=booking_id).exists():
             return {"status": 400, "detail": "booking id doesn't exists"}
+        try:
+            verification = verify_esewa_payment(token, amount, booking_id)
+        except PaymentGatewayError:
+            return {"status": 503, "detail": "unable to send payment verification request to esewa"}
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(id=booking_id)
+            booking.status = "success" if verification.get("success") else "failed"
+            booking.save()
+        if verification.get("success"):
+            return {"status": 200, "detail": verification.get("detail")}
+        return {"status": 401, "detail": verification.get("detail")}
 
-    @transaction.atomic()
     def post(self, request, *args, **kwargs):
         token = request.data.get('token', False)
         amount = request.data.get('amount', False)
@@ -139,7 +102,7 @@ class VerifyKhaltiPayment(APIView):
                 raise ValidationError({"error": "A unique ID of product or item or ticket etc "
                                                 "generated by merchant for payment is missing"})
             res = self.esewa_verification(token, amount, booking_id)
-            if res.get('status_code') == 200:
+            if res.get('status') == 200:
                 return Response({"detail": res.get("detail")}, status=status.HTTP_200_OK)
             else:
                 return Response({"detail": res.get("detail")}, status=status.HTTP_400_BAD_REQUEST)
@@ -6,6 +6,7 @@ from webapi.views.admin_bookings import (
     OwnerCompletedOrganisationBooking,
     OwnerCancelledOrganisationBooking,
 )
+from webapi.views.export_job import ExportJobStatusView
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -15,4 +16,7 @@ router.register("organisation-completed-booking", OwnerCompletedOrganisationBook
 router.register("organisation-cancelled-booking", OwnerCancelledOrganisationBooking)
 
 
-urlpatterns = [path("owner/", include(router.urls))]
+urlpatterns = [
+    path("owner/", include(router.urls)),
+    path("owner/export-jobs/<uuid:job_id>/", ExportJobStatusView.as_view()),
+]
@@ -4,6 +4,7 @@ from webapi.views.organisation import (
     PopularDestinationAPIView,
     OrganisationRoomListAPIView,
     OrganisationRoomAvailability,
+    OrganisationNameSuggestion,
 )
 from webapi.views.calendar_price import OrganisationCalendarPricingAPIView
 
@@ -21,4 +22,5 @@ urlpatterns = [
     ),
     path("organisation_rooms/", OrganisationRoomListAPIView.as_view()),
     path("room-availability", OrganisationRoomAvailability.as_view()),
+    path("organisation_name_suggestion/", OrganisationNameSuggestion.as_view()),
 ]
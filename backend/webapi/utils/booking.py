@@ -1,39 +1,67 @@
-from django.db.models import Q
-from booking.models import BookingDetail
-from organisation.models import OrganisationRoomUnavailability
+from collections import defaultdict
+
+from rest_framework.serializers import ValidationError
+from organisation.models import OrganisationRoomUnavailability, Room
 from booking.helpers import get_dates
+from mobileapi.utils.inventory import get_peak_booked_rooms, reserve_room_inventory
+from mobileapi.utils.overlap import overlap
 
 
 def get_booked_rooms(checkin_date, checkout_date, instance=None):
-    booked_rooms = BookingDetail.objects.filter(
-        ~Q(booking__payment_status="Draft"),
-        Q(
-            booking__checkin_date__gte=checkin_date,
-            booking__checkout_date__lte=checkout_date,
+    """
+    rooms booked on the busiest night of the stay for each room type of the
+    booking property, read from the inventory ledger
+    """
+    rooms = Room.objects.filter(organisation=instance.property)
+    peak_booked_rooms = get_peak_booked_rooms(
+        rooms, checkin_date, checkout_date, exclude_booking=instance
+    )
+    booked_rooms = [
+        {"id": room_id, "room__id": room_id, "no_of_rooms": no_of_rooms}
+        for room_id, no_of_rooms in peak_booked_rooms.items()
+        if no_of_rooms
+    ]
+    return booked_rooms
+
+
+def reserve_booking_rooms(room_detail, checkin_date, checkout_date, booking=None):
+    """
+    helper function to take the rooms of the booking out of the inventory ledger,
+    to be called in the transaction writing the booking so that two bookings
+    can't both take the last room
+    """
+    requested_rooms = defaultdict(int)
+    for room in room_detail or []:
+        requested_rooms[int(room.get("room"))] += int(room.get("no_of_rooms") or 0)
+    if booking is not None:
+        # rooms of other properties are rejected by the booking validation
+        property_room_ids = set(
+            Room.objects.filter(
+                id__in=requested_rooms, organisation=booking.property_id
+            ).values_list("id", flat=True)
         )
-        | Q(
-            booking__checkin_date__lte=checkin_date,
-            booking__checkout_date__gte=checkin_date,
+        requested_rooms = {
+            room_id: no_of_rooms
+            for room_id, no_of_rooms in requested_rooms.items()
+            if room_id in property_room_ids
+        }
+    full_rooms = reserve_room_inventory(
+        requested_rooms, checkin_date, checkout_date, exclude_booking=booking
+    )
+    if full_rooms:
+        raise ValidationError(
+            {
+                "error": "rooms are not available for the selected dates",
+                "rooms": full_rooms,
+            }
         )
-        | Q(
-            booking__checkin_date__lte=checkout_date,
-            booking__checkout_date__gte=checkout_date,
-        ),
-        booking__property=instance.property,
-        booking__is_deleted=False,
-        booking__cancelled=False,
-    ).values("id", "room__id", "no_of_rooms")
-
-    if instance:
-        booked_rooms = booked_rooms.filter(~Q(booking=instance))
-    return booked_rooms
 
 
 def get_room_unavailability(checkin_date, checkout_date, booking):
     booking_unavailability = OrganisationRoomUnavailability.objects.filter(
-        Q(from_date__gte=checkin_date, to_date__lte=checkout_date)
-        | Q(from_date__lte=checkin_date, to_date__gte=checkin_date)
-        | Q(from_date__lte=checkout_date, to_date__gte=checkout_date),
+        overlap(
+            "from_date", "to_date", checkin_date, checkout_date, end_inclusive=True
+        ),
         organisation=booking.property,
         is_deleted=False,
     ).values("id", "room_type", "room_numbers")
@@ -1,9 +1,87 @@
-import pandas as pd
 from django.db.models import ExpressionWrapper, DurationField, F
-from .generate_excel import get_media_file_from_data_frame
+from .generate_excel import get_csv_streaming_response, save_rows_to_excel
 
+EXPORT_CHUNK_SIZE = 2000
 
-def booking_export(queryset, filename):
+
+def get_export_value(value):
+    """
+    convert the database value into a value the excel and csv writers accept
+    """
+    if value is None:
+        return ""
+    if hasattr(value, "days") and hasattr(value, "seconds"):
+        return value.days
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def group_export_rows(rows, booking_id_index, joined_index):
+    """
+    helper function to merge the consecutive rows of a booking into a single row,
+    joining the values of the joined column, rows must be ordered by booking id
+    """
+    current = None
+    joined = []
+    for row in rows:
+        if current is not None and row[booking_id_index] == current[booking_id_index]:
+            if row[joined_index] is not None:
+                joined.append(str(row[joined_index]))
+            continue
+        if current is not None:
+            current[joined_index] = ", ".join(joined)
+            yield [get_export_value(value) for value in current]
+        current = list(row)
+        joined = [str(row[joined_index])] if row[joined_index] is not None else []
+    if current is not None:
+        current[joined_index] = ", ".join(joined)
+        yield [get_export_value(value) for value in current]
+
+
+def report_progress(rows, progress):
+    """
+    call progress with the number of rows written after every chunk
+    """
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        yield row
+        if count % EXPORT_CHUNK_SIZE == 0:
+            progress(count)
+    progress(count)
+
+
+def export_rows(
+    queryset,
+    columns,
+    db_columns,
+    filename,
+    joined_column,
+    export_format,
+    progress=None,
+):
+    """
+    iterate the queryset in chunks with a server side cursor, merge the rows of every
+    booking and write them into a constant memory excel file or a streamed csv
+    """
+    rows = (
+        queryset.order_by("uuid")
+        .values_list(*db_columns)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    rows = group_export_rows(
+        rows, columns.index("Booking ID"), columns.index(joined_column)
+    )
+    if progress:
+        rows = report_progress(rows, progress)
+    if export_format == "csv":
+        return get_csv_streaming_response(rows, columns, filename + ".csv")
+    return save_rows_to_excel(rows, columns, "exports/", filename + ".xlsx")
+
+
+def booking_export(queryset, filename, export_format="xlsx", progress=None):
     columns = [
         "Name",
         "Phone",
@@ -34,26 +112,19 @@ def booking_export(queryset, filename):
         ),
         guests=F("room_detail__no_of_children") + F("room_detail__no_of_adults"),
         room_type=F("room_detail__room__category"),
-    ).values_list(*db_columns)
-    df = pd.DataFrame.from_records(queryset, columns=columns)
-    df = df.groupby("Booking ID", as_index=False).agg(
-        {
-            "Name": "first",
-            "Phone": "first",
-            "Booking ID": "first",
-            "Checkin At": "first",
-            "Checkout At": "first",
-            "Nights": "first",
-            "Room Type": ", ".join,
-            "Guest": "first",
-            "Paid": "first",
-            "Cost": "first",
-        }
     )
-    return get_media_file_from_data_frame(df, filename)
+    return export_rows(
+        queryset,
+        columns,
+        db_columns,
+        filename,
+        "Room Type",
+        export_format,
+        progress,
+    )
 
 
-def package_booking_export(queryset, filename):
+def package_booking_export(queryset, filename, export_format="xlsx", progress=None):
     columns = [
         "Name",
         "Booking ID",
@@ -76,26 +147,18 @@ def package_booking_export(queryset, filename):
         "paid_amount",
         "total_amount",
     ]
-    queryset = queryset.values_list(*db_columns)
-    df = pd.DataFrame.from_records(queryset, columns=columns)
-    df = df.groupby("Booking ID", as_index=False).agg(
-        {
-            "Name": "first",
-            "Booking ID": "first",
-            "Checkin At": "first",
-            "Checkout At": "first",
-            "Nights": "first",
-            "Package Type": ", ".join,
-            "Quantity": "first",
-            "Paid": "first",
-            "Cost": "first",
-        }
+    return export_rows(
+        queryset,
+        columns,
+        db_columns,
+        filename,
+        "Package Type",
+        export_format,
+        progress,
     )
 
-    return get_media_file_from_data_frame(df, filename)
-
 
-def checkin_export(queryset, filename):
+def checkin_export(queryset, filename, export_format="xlsx", progress=None):
     columns = [
         "Name",
         "Phone",
@@ -124,19 +187,13 @@ def checkin_export(queryset, filename):
         ),
         guests=F("room_detail__no_of_children") + F("room_detail__no_of_adults"),
         room_type=F("room_detail__room__category"),
-    ).values_list(*db_columns)
-    df = pd.DataFrame.from_records(queryset, columns=columns)
-    df = df.groupby("Booking ID", as_index=False).agg(
-        {
-            "Name": "first",
-            "Phone": "first",
-            "Booking ID": "first",
-            "Checkin At": "first",
-            "Nights": "first",
-            "Room Type": ", ".join,
-            "Guest": "first",
-            "Paid": "first",
-            "Cost": "first",
-        }
     )
-    return get_media_file_from_data_frame(df, filename)
+    return export_rows(
+        queryset,
+        columns,
+        db_columns,
+        filename,
+        "Room Type",
+        export_format,
+        progress,
+    )
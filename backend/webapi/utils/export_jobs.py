@@ -0,0 +1,185 @@
+import datetime
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from mobileapi.models import ExportJob
+from webapi.utils.export_booking_data import (
+    booking_export,
+    checkin_export,
+    package_booking_export,
+)
+
+EXPORTS = {
+    "booking": booking_export,
+    "package_booking": package_booking_export,
+    "checkin": checkin_export,
+}
+
+# views whose queryset is rebuilt by the worker from the stored query parameters
+EXPORT_VIEWS = {
+    "webapi.views.admin_bookings.OwnerUpcomingOrganisationBooking",
+    "webapi.views.admin_bookings.OwnerOngoingOrganisationBooking",
+    "webapi.views.admin_bookings.OwnerCompletedOrganisationBooking",
+    "webapi.views.admin_bookings.OwnerCancelledOrganisationBooking",
+    "webapi.views.admin_package_bookings.OwnerUpcomingPackageBooking",
+    "webapi.views.admin_package_bookings.OwnerOngoingPackageBooking",
+    "webapi.views.admin_package_bookings.OwnerCompletedPackageBooking",
+    "webapi.views.admin_package_bookings.OwnerCancelledPackageBooking",
+}
+
+# exports are built by the run_export_jobs command, started next to the web server
+# by scripts/start_server, so that building the file doesn't hold the web workers.
+# EXPORT_JOBS_IN_PROCESS builds them on a small local pool instead when no
+# consumer is running, like in development
+EXPORT_WORKERS = getattr(settings, "EXPORT_WORKERS", 2)
+EXPORT_JOBS_IN_PROCESS = getattr(settings, "EXPORT_JOBS_IN_PROCESS", False)
+# pending and running jobs older than this were lost by a restart
+EXPORT_JOB_TIMEOUT_MINUTES = getattr(settings, "EXPORT_JOB_TIMEOUT_MINUTES", 30)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=EXPORT_WORKERS, thread_name_prefix="export"
+        )
+    return _executor
+
+
+def get_export_filters(request):
+    return {
+        key: value
+        for key, value in request.query_params.items()
+        if key != "export_format"
+    }
+
+
+def get_export_job_key(export_type, filename, request):
+    """
+    exports of the same type, filters and day requested by the same user share the
+    key, the day is part of the filename
+    """
+    filters = sorted(get_export_filters(request).items())
+    content = f"{export_type}:{filename}:{request.user.id}:{filters}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_export_view_path(view):
+    return f"{view.__class__.__module__}.{view.__class__.__name__}"
+
+
+def get_export_queryset(job):
+    """
+    rebuild the queryset of the job with the view it was requested on, the user
+    and the query parameters are given to the view the way the request did
+    """
+    if job.view not in EXPORT_VIEWS:
+        raise ValueError(f"{job.view} is not an export view")
+    request = SimpleNamespace(user=job.user, query_params=json.loads(job.filters))
+    return import_string(job.view)(request=request).get_queryset()
+
+
+def get_export_job_data(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "download_url": job.download_url,
+        "error": job.error,
+    }
+
+
+def expire_export_jobs():
+    """
+    helper function to fail the pending and running jobs which did not finish in
+    time, so that they are neither reused nor built anymore
+    """
+    return ExportJob.objects.filter(
+        status__in=["Pending", "Running"],
+        created_on__lt=timezone.now()
+        - datetime.timedelta(minutes=EXPORT_JOB_TIMEOUT_MINUTES),
+    ).update(status="Failed", error="Export expired", completed_on=timezone.now())
+
+
+def enqueue_export_job(export_type, view, filename):
+    """
+    helper function to create the export job or reuse the identical one which did
+    not fail, the unique key lets only one of the concurrent requests create it.
+    The job is submitted to the local pool when it is created
+    """
+    request = view.request
+    expire_export_jobs()
+    job, created = ExportJob.objects.exclude(status="Failed").get_or_create(
+        key=get_export_job_key(export_type, filename, request),
+        defaults={
+            "user": request.user,
+            "export_type": export_type,
+            "filename": filename,
+            "view": get_export_view_path(view),
+            "filters": json.dumps(get_export_filters(request)),
+        },
+    )
+    if created and EXPORT_JOBS_IN_PROCESS:
+        transaction.on_commit(lambda: get_executor().submit(run_export_job, job.id))
+    return job
+
+
+def run_export_job(job_id):
+    """
+    build the export of a pending job, the job is claimed with a row lock so that
+    it is built only once when several workers pick it up
+    """
+    try:
+        with transaction.atomic():
+            job = (
+                ExportJob.objects.select_for_update(skip_locked=True)
+                .filter(id=job_id, status="Pending")
+                .first()
+            )
+            if job is None:
+                return
+            job.status = "Running"
+            job.save(update_fields=["status"])
+        export = EXPORTS[job.export_type]
+        queryset = get_export_queryset(job)
+        total_rows = queryset.values("uuid").distinct().count()
+        ExportJob.objects.filter(id=job.id).update(total_rows=total_rows)
+
+        def progress(processed_rows):
+            ExportJob.objects.filter(id=job.id).update(processed_rows=processed_rows)
+
+        # the file of each job is stored under its own name
+        download_url = export(queryset, f"{job.filename}_{job.id}", progress=progress)
+        ExportJob.objects.filter(id=job.id).update(
+            status="Completed", download_url=download_url, completed_on=timezone.now()
+        )
+    except Exception as e:
+        ExportJob.objects.filter(id=job_id).update(
+            status="Failed", error=str(e), completed_on=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def get_export_response(export_type, view, filename):
+    """
+    csv exports are streamed in the response, excel exports are queued as an export
+    job whose status is polled until the download url is ready. The queryset of the
+    view is built here so that invalid filters are rejected before the job is queued
+    """
+    queryset = view.get_queryset()
+    if view.request.query_params.get("export_format") == "csv":
+        export = EXPORTS[export_type]
+        return export(queryset, filename, export_format="csv")
+    job = enqueue_export_job(export_type, view, filename)
+    return Response(get_export_job_data(job))
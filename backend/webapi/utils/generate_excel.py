@@ -1,11 +1,16 @@
+import csv
 import os
+import tempfile
 import uuid
 from io import BytesIO
 
 from django.conf import settings
+from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
 import pandas as pd
+import xlsxwriter
 
 
 def to_excel_auto_width(filename, df):
@@ -89,3 +94,49 @@ def get_media_file_from_data_frame(df: pd.DataFrame, filename):
     if url:
         return url
     return None
+
+
+def save_rows_to_excel(rows, columns, directory, filename):
+    """
+    write the rows into an excel file in constant memory mode, so that only the
+    current row is kept in memory, and save it to the default storage
+    """
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as temp_file:
+        workbook = xlsxwriter.Workbook(temp_file.name, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("Sheet1")
+        worksheet.set_column(0, len(columns) - 1, 20)
+        worksheet.write_row(0, 0, columns)
+        for index, row in enumerate(rows, start=1):
+            worksheet.write_row(index, 0, row)
+        workbook.close()
+        temp_file.seek(0)
+        path = default_storage.save(directory + filename, File(temp_file))
+    # the storage renames the file when the name is taken, so the url is built
+    # from the path it was saved to
+    if hasattr(settings, "AWS_STORAGE_BUCKET_NAME"):
+        path = "https://{}.s3.amazonaws.com/media/{}".format(
+            settings.AWS_STORAGE_BUCKET_NAME, path
+        )
+    return path
+
+
+class Echo:
+    """
+    file like object returning the value written, used to stream the csv rows
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_csv_streaming_response(rows, columns, filename):
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,163 @@
+import bisect
+import csv
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+
+IP_API_URL = "http://ip-api.com/json/"
+GEO_CACHE_SIZE = getattr(settings, "GEO_CACHE_SIZE", 10000)
+GEO_CACHE_TTL = getattr(settings, "GEO_CACHE_TTL", 24 * 60 * 60)
+GEO_LOOKUP_TIMEOUT = getattr(settings, "GEO_LOOKUP_TIMEOUT", 2)
+# failed lookups are only remembered shortly so they are retried soon
+GEO_FAILURE_CACHE_TTL = getattr(settings, "GEO_FAILURE_CACHE_TTL", 60)
+# optional csv of start_ip,end_ip,country_code,country rows used before ip-api
+GEOIP_RANGES_FILE = getattr(settings, "GEOIP_RANGES_FILE", None)
+
+
+class TTLCache:
+    """
+    thread safe least recently used cache whose entries expire after ttl seconds
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+class IPRangeDatabase:
+    """
+    ip ranges sorted by their start address, an address is resolved with a bisect
+    on the starts and a check against the end of the range found
+    """
+
+    def __init__(self, ranges):
+        ranges = sorted(ranges)
+        self.starts = [start for start, _, _ in ranges]
+        self.ends = [end for _, end, _ in ranges]
+        self.countries = [country for _, _, country in ranges]
+
+    @classmethod
+    def from_csv(cls, path):
+        ranges = []
+        with open(path, newline="") as ranges_file:
+            for row in csv.reader(ranges_file):
+                if len(row) < 4 or row[0].startswith("#"):
+                    continue
+                ranges.append(
+                    (
+                        int(ipaddress.ip_address(row[0])),
+                        int(ipaddress.ip_address(row[1])),
+                        {"country": row[3], "countryCode": row[2]},
+                    )
+                )
+        return cls(ranges)
+
+    def lookup(self, address):
+        index = bisect.bisect_right(self.starts, int(address)) - 1
+        if index >= 0 and int(address) <= self.ends[index]:
+            return self.countries[index]
+        return None
+
+
+_cache = TTLCache(GEO_CACHE_SIZE, GEO_CACHE_TTL)
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geo")
+_pending = set()
+_pending_lock = threading.Lock()
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_ip_range_database():
+    global _database
+    if _database is None and GEOIP_RANGES_FILE:
+        with _database_lock:
+            if _database is None:
+                _database = IPRangeDatabase.from_csv(GEOIP_RANGES_FILE)
+    return _database
+
+
+def get_cache_key(address):
+    """
+    addresses of the same /24 ipv4 or /48 ipv6 network share the country
+    """
+    prefix = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def fetch_ip_country(address, key):
+    """
+    look up the country on ip-api, timeouts, rate limited and failed replies are
+    cached for GEO_FAILURE_CACHE_TTL only
+    """
+    country = {"country": None, "countryCode": None}
+    try:
+        res = requests.get(IP_API_URL + str(address), timeout=GEO_LOOKUP_TIMEOUT)
+        res_json = res.json()
+        if res.status_code == 200 and res_json.get("status") != "fail":
+            country = {
+                "country": res_json.get("country"),
+                "countryCode": res_json.get("countryCode"),
+            }
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+    _cache.set(key, country, None if country.get("country") else GEO_FAILURE_CACHE_TTL)
+    with _pending_lock:
+        _pending.discard(key)
+    return country
+
+
+def resolve_ip_country(ip_address, wait=False):
+    """
+    helper function to resolve the country of the ip address from the cache or the
+    offline ip range database, on a miss the ip-api lookup runs in the background
+    and the empty country is returned right away unless wait is set
+    """
+    empty = {"country": None, "countryCode": None}
+    try:
+        address = ipaddress.ip_address(str(ip_address).strip())
+    except ValueError:
+        return empty
+    if not address.is_global:
+        return empty
+    key = get_cache_key(address)
+    country = _cache.get(key)
+    if country is not None:
+        return country
+    database = get_ip_range_database()
+    country = database.lookup(address) if database else None
+    if country is not None:
+        _cache.set(key, country)
+        return country
+    if wait:
+        return fetch_ip_country(address, key)
+    with _pending_lock:
+        if key in _pending:
+            return empty
+        _pending.add(key)
+    _executor.submit(fetch_ip_country, address, key)
+    return empty
@@ -1,14 +1,10 @@
-import requests
-import json
 from django.contrib.sites.shortcuts import get_current_site
 from django.db.models import Q
 from booking.models import Booking
 from package.models import PackageBooking
 from rest_framework.generics import get_object_or_404
 from datetime import date
-
-
-url = "http://ip-api.com/json/"
+from webapi.utils.geo import resolve_ip_country
 
 
 def get_client_ip(request):
@@ -20,15 +16,16 @@ def get_client_ip(request):
     return ip
 
 
-def get_visitor_info(ip_address, request):
-    res = requests.get(url + str(ip_address))
-    res_text = json.loads(res.text)
-    visited_url = request.get_full_path()
-
+def get_visitor_info(ip_address, request, wait=False):
+    """
+    country of the visitor from the cached geo resolution, the network lookup is
+    only awaited when wait is set
+    """
+    country = resolve_ip_country(ip_address, wait=wait)
     result = {
         "ip_address": ip_address,
-        "country": res_text.get("country"),
-        "countryCode": res_text.get("countryCode"),
+        "country": country.get("country"),
+        "countryCode": country.get("countryCode"),
     }
     return result
 
@@ -0,0 +1,70 @@
+import datetime
+
+from checkin.models import AssignedRoom
+from organisation.models import Room
+from mobileapi.utils.overlap import overlap
+
+ROOM_STATUS_BOOKED = "Booked"
+
+
+def get_occupied_room_nights(organisation, from_date, to_date):
+    """
+    helper function to explode the rooms assigned in the organisation into a set of
+    (room_number, night) pairs for the nights between from_date and to_date
+    """
+    assigned_rooms = AssignedRoom.objects.filter(
+        overlap(
+            "checkin_checkout_information__booking__checkin_date",
+            "checkin_checkout_information__booking__checkout_date",
+            from_date,
+            to_date,
+        ),
+        checkin_checkout_information__booking__property=organisation,
+    ).values_list(
+        "assigned_rooms",
+        "checkin_checkout_information__booking__checkin_date",
+        "checkin_checkout_information__booking__checkout_date",
+    )
+    occupied = set()
+    for room_numbers, checkin_date, checkout_date in assigned_rooms:
+        night = max(checkin_date, from_date)
+        last_night = min(checkout_date, to_date)
+        while night < last_night:
+            for room_number in room_numbers or []:
+                occupied.add((room_number, night))
+            night += datetime.timedelta(days=1)
+    return occupied
+
+
+def get_room_status_grid(organisation, room_categories, from_date, days):
+    """
+    status of every room number of the given categories for each of the days from
+    from_date, the assignments are read once and every cell is a set lookup
+    """
+    to_date = from_date + datetime.timedelta(days=days)
+    dates = [from_date + datetime.timedelta(days=i) for i in range(days)]
+    occupied = get_occupied_room_nights(organisation, from_date, to_date)
+    rooms = (
+        Room.objects.filter(
+            organisation=organisation, category__in=room_categories, is_deleted=False
+        )
+        .order_by("category", "id")
+        .values_list("room_numbers", flat=True)
+    )
+    room_detail = []
+    for room_numbers in rooms:
+        for room_number in room_numbers or []:
+            room_detail.append(
+                {
+                    room_number: [
+                        {
+                            "date": date_.strftime("%Y-%m-%d"),
+                            "status": ROOM_STATUS_BOOKED
+                            if (room_number, date_) in occupied
+                            else None,
+                        }
+                        for date_ in dates
+                    ]
+                }
+            )
+    return room_detail
@@ -4,13 +4,12 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.serializers import ValidationError
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
-from rest_framework.response import Response
 from backend.utils import CustomPageSizePagination
 from booking.models import Booking
 from booking.serializers import UserBookingSerializer
 from datetime import date, datetime
 from backend.utils import convert_str_to_date
-from webapi.utils.export_booking_data import booking_export
+from webapi.utils.export_jobs import get_export_response
 from mobileapi.views.dashboard import check_if_organisation_authorized
 from io import BytesIO
 import pandas as pd
@@ -72,10 +71,9 @@ class OwnerUpcomingOrganisationBooking(CommonBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = booking_export(queryset, "booking-upcoming_" + d_.strftime("%Y-%m-%d"))
-        return Response({"download_url": url})
+        filename = "booking-upcoming_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("booking", self, filename)
 
 
 class OwnerOngoingOrganisationBooking(CommonBookingInfoViewset):
@@ -90,10 +88,9 @@ class OwnerOngoingOrganisationBooking(CommonBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = booking_export(queryset, "booking-ongoing_" + d_.strftime("%Y-%m-%d"))
-        return Response({"download_url": url})
+        filename = "booking-ongoing_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("booking", self, filename)
 
 
 class OwnerCompletedOrganisationBooking(CommonBookingInfoViewset):
@@ -108,10 +105,9 @@ class OwnerCompletedOrganisationBooking(CommonBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = booking_export(queryset, "booking-completed_" + d_.strftime("%Y-%m-%d"))
-        return Response({"download_url": url})
+        filename = "booking-completed_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("booking", self, filename)
 
 
 class OwnerCancelledOrganisationBooking(CommonBookingInfoViewset):
@@ -149,7 +145,6 @@ class OwnerCancelledOrganisationBooking(CommonBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = booking_export(queryset, "booking-cancelled_" + d_.strftime("%Y-%m-%d"))
-        return Response({"download_url": url})
+        filename = "booking-cancelled_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("booking", self, filename)
@@ -4,13 +4,12 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.serializers import ValidationError
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
-from rest_framework.response import Response
 from backend.utils import CustomPageSizePagination
 from package.models import PackageBooking
 from webapi.serializers.package import PackageBookingSerializer
 from datetime import date
 from backend.utils import convert_str_to_date
-from webapi.utils.export_booking_data import package_booking_export
+from webapi.utils.export_jobs import get_export_response
 from mobileapi.views.dashboard import check_if_organisation_authorized
 
 
@@ -40,7 +39,7 @@ class CommonPackageBookingInfoViewset(ModelViewSet):
             )
             queryset = PackageBooking.objects.filter(
                 is_deleted=False, cancelled=False, package__organisation=organisation
-            )
+            ).select_related("package__organisation__rating_summary")
             if guest_name:
                 queryset = queryset.filter(Q(user_info__name__icontains=guest_name))
             if from_date:
@@ -66,12 +65,9 @@ class OwnerUpcomingPackageBooking(CommonPackageBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = package_booking_export(
-            queryset, "package-booking-upcoming_" + d_.strftime("%Y-%m-%d")
-        )
-        return Response({"download_url": url})
+        filename = "package-booking-upcoming_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("package_booking", self, filename)
 
 
 class OwnerOngoingPackageBooking(CommonPackageBookingInfoViewset):
@@ -86,12 +82,9 @@ class OwnerOngoingPackageBooking(CommonPackageBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = package_booking_export(
-            queryset, "package-booking-ongoing_" + d_.strftime("%Y-%m-%d")
-        )
-        return Response({"download_url": url})
+        filename = "package-booking-ongoing_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("package_booking", self, filename)
 
 
 class OwnerCompletedPackageBooking(CommonPackageBookingInfoViewset):
@@ -105,12 +98,9 @@ class OwnerCompletedPackageBooking(CommonPackageBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = package_booking_export(
-            queryset, "package-booking-completed_" + d_.strftime("%Y-%m-%d")
-        )
-        return Response({"download_url": url})
+        filename = "package-booking-completed_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("package_booking", self, filename)
 
 
 class OwnerCancelledPackageBooking(CommonPackageBookingInfoViewset):
@@ -133,7 +123,7 @@ class OwnerCancelledPackageBooking(CommonPackageBookingInfoViewset):
             )
             queryset = PackageBooking.objects.filter(
                 is_deleted=False, cancelled=True, package__organisation=organisation
-            )
+            ).select_related("package__organisation__rating_summary")
             if guest_name:
                 queryset = queryset.filter(Q(user_info__name__icontains=guest_name))
             if from_date:
@@ -148,9 +138,6 @@ class OwnerCancelledPackageBooking(CommonPackageBookingInfoViewset):
 
     @action(detail=False, methods=["get"])
     def export(self, request):
-        queryset = self.get_queryset()
         d_ = date.today()
-        url = package_booking_export(
-            queryset, "package-booking-cancelled_" + d_.strftime("%Y-%m-%d")
-        )
-        return Response({"download_url": url})
+        filename = "package-booking-cancelled_" + d_.strftime("%Y-%m-%d")
+        return get_export_response("package_booking", self, filename)
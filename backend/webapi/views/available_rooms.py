@@ -6,6 +6,7 @@ from django.db.models import Q
 from checkin.models import CheckInCheckOutInformation
 from organisation.models import Organisation, RoomDetail
 from booking.models import Booking, BookingDetail
+from mobileapi.utils.overlap import overlap
 
 
 class GetAvailableRoomNumbers(APIView):
@@ -26,17 +27,11 @@ class GetAvailableRoomNumbers(APIView):
                 )
             checkin_checkout_info = CheckInCheckOutInformation.objects.filter(
                 ~Q(booking__payment_status="Draft"),
-                Q(
-                    booking__checkin_date__gte=booking.checkin_date,
-                    booking__checkout_date__lte=booking.checkout_date,
-                )
-                | Q(
-                    booking__checkin_date__lte=booking.checkin_date,
-                    booking__checkout_date__gte=booking.checkin_date,
-                )
-                | Q(
-                    booking__checkin_date__lte=booking.checkout_date,
-                    booking__checkout_date__gte=booking.checkout_date,
+                overlap(
+                    "booking__checkin_date",
+                    "booking__checkout_date",
+                    booking.checkin_date,
+                    booking.checkout_date,
                 ),
                 checkin_status="Check in",
             ).values("room__assigned_rooms")
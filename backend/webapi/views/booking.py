@@ -1,7 +1,12 @@
 from numpy import inf
 from checkin.serializers import CheckInCheckOutInformationSerialzer
-from webapi.utils.booking import get_booked_rooms, get_room_unavailability
+from webapi.utils.booking import (
+    get_booked_rooms,
+    get_room_unavailability,
+    reserve_booking_rooms,
+)
 from webapi.serializers.booking import UpdateBookingCheckoutSerializer
+from django.db import transaction
 from django.db.models import Q
 from rest_framework import status
 from rest_framework.generics import (
@@ -15,7 +20,7 @@ from rest_framework.serializers import ValidationError
 from rest_framework.views import APIView
 from booking.serializers import UserBookingSerializer, UserBookingUpdateSerializer
 from booking.domain.model import RoomDetail, booking_factory
-from organisation.models import OrganisationRoomUnavailability, Room
+from organisation.models import Room
 from booking.models import Booking, BookingDetail
 from booking.helpers import get_booking_price_detail
 from datetime import date, datetime
@@ -26,6 +31,7 @@ from backend.utils import convert_str_to_date
 from booking.util.update_booking import update_booking
 from checkin.models import CheckInCheckOutInformation
 from booking.helpers import get_dates
+from mobileapi.utils.inventory import lock_room_inventory
 import json
 
 
@@ -69,13 +75,9 @@ class UpdateBookingAPIView(RetrieveUpdateAPIView):
             "%Y-%m-%d",
         ).date()
         booked_rooms = get_booked_rooms(checkin_date, checkout_date, instance=instance)
-        booking_unavailability = OrganisationRoomUnavailability.objects.filter(
-            Q(from_date__gte=checkin_date, to_date__lte=checkout_date)
-            | Q(from_date__lte=checkin_date, to_date__gte=checkin_date)
-            | Q(from_date__lte=checkout_date, to_date__gte=checkout_date),
-            organisation=instance.property,
-            is_deleted=False,
-        ).values("id", "room_type", "room_numbers")
+        booking_unavailability = get_room_unavailability(
+            checkin_date, checkout_date, instance
+        )
         room_id_to_book = [room.get("room") for room in rooms]
         rooms = Room.objects.filter(
             id__in=room_id_to_book, organisation=instance.property
@@ -90,7 +92,14 @@ class UpdateBookingAPIView(RetrieveUpdateAPIView):
         except Exception as e:
             raise ValidationError({"error": e})
 
-        self.perform_update(serializer)
+        with transaction.atomic():
+            reserve_booking_rooms(
+                self.request.data.get("room_detail"),
+                checkin_date,
+                checkout_date,
+                booking=instance,
+            )
+            self.perform_update(serializer)
         res = {"booking_detail": serializer.data}
         res.update(booking_price_info)
 
@@ -174,14 +183,24 @@ class UpdateBookingDetailView(APIView):
                 rooms=list(rooms)
             )
             booking_price_info = get_booking_price_detail(request)
-            booking = update_booking(
-                booking_model,
-                booking_id,
-                booking_price_info.get("total"),
-                booking_price_info.get("gst_amount"),
-            )
         except Exception as e:
             raise ValidationError({"error": e})
+        with transaction.atomic():
+            reserve_booking_rooms(
+                request.data.get("room_detail"),
+                checkin_date,
+                checkout_date,
+                booking=booking,
+            )
+            try:
+                booking = update_booking(
+                    booking_model,
+                    booking_id,
+                    booking_price_info.get("total"),
+                    booking_price_info.get("gst_amount"),
+                )
+            except Exception as e:
+                raise ValidationError({"error": e})
         serializer = UserBookingUpdateSerializer(booking)
         return Response(serializer.data)
 
@@ -276,49 +295,57 @@ class UpdateBookingCheckoutView(APIView):
             checkin.updated_checkout_date = None
             checkin.save()
         else:
-            booked_rooms = get_booked_rooms(
-                checkin.booking.checkout_date,
-                serializer.validated_data.get("checkout_date"),
-                instance=checkin.booking,
-            )
-            booking_unavailability = get_room_unavailability(
-                checkin.booking.checkout_date,
-                serializer.validated_data.get("checkout_date"),
-                checkin.booking,
-            )
-            data = {
-                "property": checkin.booking.property.id,
-                "checkin_date": checkin.booking.checkout_date,
-                "checkout_date": serializer.validated_data.get("checkout_date"),
-                "user_info": checkin.booking.user_info,
-                "room_detail": room_detail,
-            }
-            room_id_to_book = [room.get("room") for room in room_detail]
-            rooms = Room.objects.filter(
-                id__in=room_id_to_book, organisation=checkin.booking.property
-            ).values(
-                "id",
-                "category",
-                "children_accomodate",
-                "accomodates",
-                "no_of_rooms",
-                "room_numbers",
-                "price",
-            )
-            try:
-                booking_factory(
-                    **data,
-                    unavailable_rooms=list(booking_unavailability),
-                    booked_rooms=list(booked_rooms),
-                    rooms=list(rooms)
+            # the ledger rows of the extra nights stay locked until the checkout
+            # is saved, so they can't be booked by another request in between
+            with transaction.atomic():
+                lock_room_inventory(
+                    [room.get("room") for room in room_detail],
+                    checkin.booking.checkout_date,
+                    serializer.validated_data.get("checkout_date"),
                 )
-                checkin.updated_checkout_date = serializer.validated_data.get(
-                    "checkout_date"
+                booked_rooms = get_booked_rooms(
+                    checkin.booking.checkout_date,
+                    serializer.validated_data.get("checkout_date"),
+                    instance=checkin.booking,
                 )
-                checkin.save()
-
-            except Exception as e:
-                raise ValidationError({"error": e})
+                booking_unavailability = get_room_unavailability(
+                    checkin.booking.checkout_date,
+                    serializer.validated_data.get("checkout_date"),
+                    checkin.booking,
+                )
+                data = {
+                    "property": checkin.booking.property.id,
+                    "checkin_date": checkin.booking.checkout_date,
+                    "checkout_date": serializer.validated_data.get("checkout_date"),
+                    "user_info": checkin.booking.user_info,
+                    "room_detail": room_detail,
+                }
+                room_id_to_book = [room.get("room") for room in room_detail]
+                rooms = Room.objects.filter(
+                    id__in=room_id_to_book, organisation=checkin.booking.property
+                ).values(
+                    "id",
+                    "category",
+                    "children_accomodate",
+                    "accomodates",
+                    "no_of_rooms",
+                    "room_numbers",
+                    "price",
+                )
+                try:
+                    booking_factory(
+                        **data,
+                        unavailable_rooms=list(booking_unavailability),
+                        booked_rooms=list(booked_rooms),
+                        rooms=list(rooms)
+                    )
+                    checkin.updated_checkout_date = serializer.validated_data.get(
+                        "checkout_date"
+                    )
+                    checkin.save()
+
+                except Exception as e:
+                    raise ValidationError({"error": e})
         serializer = CheckInCheckOutInformationSerialzer(checkin)
         return Response(serializer.data)
 
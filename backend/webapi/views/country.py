@@ -1,16 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from webapi.serializers.country import CountrySerializer
-from backend.countries_list import countries
+from mobileapi.utils.countries import country_registry
 from webapi.utils.helpers import get_client_ip, get_visitor_info
 
 
 class CountryListAPIView(APIView):
     def get(self, request, *args, **kwargs):
         countries_ = []
-        for country in countries:
+        for country in country_registry.countries:
             countries_.append(
-                {"country": country["name"], "short_code": country["alpha2_code"]}
+                {"country": country["name"], "short_code": country["code"]}
             )
         serializer = CountrySerializer(countries_, many=True)
         return Response(serializer.data)
@@ -23,5 +23,5 @@ class GetCountryAPIView(APIView):
 
     def get(self, request, *args, **kwargs):
         client_ip = get_client_ip(request)
-        result = get_visitor_info(client_ip, request)
+        result = get_visitor_info(client_ip, request, wait=True)
         return Response(result)
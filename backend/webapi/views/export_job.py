@@ -0,0 +1,20 @@
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from mobileapi.models import ExportJob
+from webapi.utils.export_jobs import get_export_job_data
+
+
+class ExportJobStatusView(APIView):
+    """
+    api view to poll the status and progress of an export job, download_url is set
+    once the export is completed
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        job = get_object_or_404(ExportJob, id=kwargs.get("job_id"), user=request.user)
+        return Response(get_export_job_data(job))
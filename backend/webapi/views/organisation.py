@@ -1,9 +1,9 @@
 from backend.utils import convert_str_to_date
 from booking.models import Booking
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-import pandas as pd
 import datetime
-from django.db.models import Q, Count, Sum, Avg, Min
+from django.db.models import Q, F, Min
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from common.models import UserSearchHistory
@@ -16,56 +16,96 @@ from webapi.serializers.organisation import (
 )
 from mobileapi.serializers.organisation import OrganisationListInfoSerializer
 from mobileapi.views.dashboard import check_if_organisation_authorized
-from organisation.models import Organisation, Room, OrganisationRoomUnavailability
+from organisation.models import Organisation, Room
+from mobileapi.utils.inventory import get_category_availability
+from mobileapi.utils.autocomplete import AUTOCOMPLETE_LIMIT, get_suggestions
+from mobileapi.utils.popularity import get_popular_ids, get_ranked_page, order_by_ids
+from mobileapi.utils.search import search
+from mobileapi.utils.search_history import (
+    get_popular_searches,
+    update_popular_searches,
+)
 
 
 class UserSearchHistoryAPIView(ListCreateAPIView):
+    """
+    api view to list and create the search history, popular=true lists the most
+    searched keys from the popular search counters
+    """
+
     queryset = UserSearchHistory.objects.filter(is_deleted=False)
     serializer_class = UserSearchHistorySerializer
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("popular") == "true":
+            limit = request.query_params.get("limit", "10")
+            if not limit.isdigit():
+                raise ValidationError({"limit": "limit must be a positive number"})
+            return Response(list(get_popular_searches(int(limit))))
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+            update_popular_searches([serializer.instance.content])
+
 
 class PopularDestinationAPIView(ListAPIView):
     """
     CASE:
         1. If no search_key provided most booked hotel in the world
+        2. city, country or continent ranks the hotels within the location
     """
 
     serializer_class = OrganisationListInfoSerializer
 
     def get_queryset(self):
-        queryset = Organisation.objects.filter(
-            is_deleted=False, is_visible=True
-        ).annotate(
-            number_of_booked=Count(
-                "booked_organisation",
-                filter=Q(
-                    booked_organisation__is_deleted=False,
-                    booked_organisation__cancelled=False,
-                ),
-            )
+        return Organisation.objects.filter(is_deleted=False, is_visible=True)
+
+    def list(self, request, *args, **kwargs):
+        ranked_ids = get_popular_ids(
+            "organisation",
+            city=self.request.query_params.get("city"),
+            country=self.request.query_params.get("country"),
+            continent=self.request.query_params.get("continent"),
         )
+        queryset = self.get_queryset()
         parent_search_key = self.request.query_params.get("parent_search_key")
         child_search_key = self.request.query_params.get("child_search_key")
         if parent_search_key:
-            queryset = queryset.filter(
-                Q(name__icontains=parent_search_key)
-                | Q(location__city__icontains=parent_search_key)
-                | Q(location__country__icontains=parent_search_key)
-                | Q(location__continent__icontains=parent_search_key)
-            )
+            queryset = search(queryset, parent_search_key)
 
         if child_search_key:
-            queryset = queryset.filter(
-                Q(name__icontains=child_search_key)
-                | Q(location__city__icontains=child_search_key)
-                | Q(location__country__icontains=child_search_key)
-                | Q(location__continent__icontains=child_search_key)
-            )
-        queryset = queryset.annotate(
-            user_rating=Avg("rating__rating_star", filter=Q(rating__is_deleted=False)),
-            min_room_price=Min("rooms__price", filter=Q(rooms__is_deleted=False)),
+            queryset = search(queryset, child_search_key)
+        organisation_ids = get_ranked_page(ranked_ids, queryset)
+        page = self.paginate_queryset(organisation_ids)
+        organisations = order_by_ids(
+            Organisation.objects.select_related("rating_summary").annotate(
+                number_of_booked=F("booking_counter__bookings"),
+                user_rating=F("rating_summary__rating_star_average"),
+                min_room_price=Min("rooms__price", filter=Q(rooms__is_deleted=False)),
+            ),
+            organisation_ids if page is None else page,
+        )
+        serializer = self.get_serializer(organisations, many=True)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+
+class OrganisationNameSuggestion(APIView):
+    """
+    api view to suggest organisation names and locations while typing
+    """
+
+    def get(self, request, *args, **kwargs):
+        name = self.request.query_params.get("name", "")
+        limit = self.request.query_params.get("limit", str(AUTOCOMPLETE_LIMIT))
+        if not limit.isdigit():
+            raise ValidationError({"limit": "limit must be a positive number"})
+        return Response(
+            {"suggestions": get_suggestions("organisation", name, int(limit))}
         )
-        return queryset.order_by("-number_of_booked")
 
 
 class OrganisationRoomListAPIView(ListAPIView):
@@ -123,13 +163,6 @@ class OrganisationRoomAvailability(APIView):
             organisation = get_object_or_404(
                 Organisation, id=booking.property.id, is_deleted=False
             )
-            bookings = Booking.objects.filter(
-                ~Q(payment_status="Draft"),
-                ~Q(id=booking_id),
-                property=organisation,
-                is_deleted=False,
-                cancelled=False,
-            )
             from_date = checkin_date
             to_date = checkout_date
             if to_date < from_date:
@@ -137,129 +170,20 @@ class OrganisationRoomAvailability(APIView):
                     {"error": "to_date should not be less than from_date"}
                 )
 
-            # here I got all the bookings in the given from and to dates
-            bookings = bookings.filter(
-                Q(checkin_date__gte=from_date, checkout_date__lte=to_date)
-                | Q(checkin_date__lte=from_date, checkout_date__gte=from_date)
-                | Q(checkin_date__lte=to_date, checkout_date__gte=to_date)
-            )
-
-            # since we have single, double, deluxe category I calculated total number of provided category room is booked
-            single_number_of_room_booked = bookings.filter(
-                room_detail__room__category="Single"
-            ).aggregate(Sum("room_detail__no_of_rooms"))
-            double_number_of_room_booked = bookings.filter(
-                room_detail__room__category="Double"
-            ).aggregate(Sum("room_detail__no_of_rooms"))
-            deluxe_number_of_room_booked = bookings.filter(
-                room_detail__room__category="Deluxe"
-            ).aggregate(Sum("room_detail__no_of_rooms"))
-            if not single_number_of_room_booked.get("room_detail__no_of_rooms__sum"):
-                single_number_of_room_booked = 0
-            else:
-                single_number_of_room_booked = single_number_of_room_booked.get(
-                    "room_detail__no_of_rooms__sum"
-                )
-
-            if not double_number_of_room_booked.get("room_detail__no_of_rooms__sum"):
-                double_number_of_room_booked = 0
-            else:
-                double_number_of_room_booked = double_number_of_room_booked.get(
-                    "room_detail__no_of_rooms__sum"
-                )
-
-            if not deluxe_number_of_room_booked.get("room_detail__no_of_rooms__sum"):
-                deluxe_number_of_room_booked = 0
-            else:
-                deluxe_number_of_room_booked = deluxe_number_of_room_booked.get(
-                    "room_detail__no_of_rooms__sum"
-                )
-
-            # check how many rooms are unavailable on provided date range
-            organisation_unavailability = OrganisationRoomUnavailability.objects.filter(
-                Q(from_date__gte=from_date, to_date__lte=to_date)
-                | Q(from_date__lte=from_date, to_date__gte=from_date)
-                | Q(from_date__lte=to_date, to_date__gte=to_date),
-                organisation=organisation,
-                is_deleted=False,
-            ).values("room_numbers")
-            unavailable_rooms = [
-                r
-                for room in organisation_unavailability
-                for r in room.get("room_numbers")
+            rooms = Room.objects.filter(organisation=organisation, is_deleted=False)
+            # rooms held by the booking itself are available to the booking
+            room_detail = [
+                {
+                    "id": category.get("id"),
+                    "category": category.get("category"),
+                    "available_count": category.get("available_count"),
+                }
+                for category in get_category_availability(
+                    rooms, from_date, to_date, exclude_booking=booking
+                ).values()
             ]
-            rooms = Room.objects.filter(
-                organisation=organisation, is_deleted=False
-            ).values("id", "room_numbers", "category")
-
-            available_room_category = {
-                room.get("category"): room.get("id") for room in rooms
-            }
-            rooms_df = pd.DataFrame(rooms)
-            if not rooms_df.empty:
-                rooms_df["filtered_rooms"] = rooms_df.apply(
-                    lambda row: list(set(row["room_numbers"]) - set(unavailable_rooms)),
-                    axis=1,
-                )
-                rooms_df["room_count"] = rooms_df.apply(
-                    lambda row: len(row["filtered_rooms"]), axis=1
-                )
-                total_single_room = rooms_df.loc[
-                    rooms_df["category"] == "Single", "room_count"
-                ].sum()
-                total_double_room = rooms_df.loc[
-                    rooms_df["category"] == "Double", "room_count"
-                ].sum()
-                total_deluxe_room = rooms_df.loc[
-                    rooms_df["category"] == "Deluxe", "room_count"
-                ].sum()
-                res = {}
-                room_detail = []
-                total_single_available = (
-                    total_single_room - single_number_of_room_booked
-                )
-                if "Single" in available_room_category.keys():
-                    room_detail.append(
-                        {
-                            "id": available_room_category["Single"],
-                            "category": "Single",
-                            "available_count": total_single_available
-                            if total_single_available >= 0
-                            else 0,
-                        }
-                    )
-
-                total_double_available = (
-                    total_double_room - double_number_of_room_booked
-                )
-
-                if "Double" in available_room_category.keys():
-                    room_detail.append(
-                        {
-                            "id": available_room_category["Double"],
-                            "category": "Double",
-                            "available_count": total_double_available
-                            if total_double_available >= 0
-                            else 0,
-                        }
-                    )
-
-                total_deluxe_available = (
-                    total_deluxe_room - deluxe_number_of_room_booked
-                )
-
-                if "Deluxe" in available_room_category.keys():
-                    room_detail.append(
-                        {
-                            "id": available_room_category["Deluxe"],
-                            "category": "Deluxe",
-                            "available_count": total_deluxe_available
-                            if total_deluxe_available >= 0
-                            else 0,
-                        }
-                    )
-                res.update({"room_details": room_detail})
-                return Response(res)
+            if room_detail:
+                return Response({"room_details": room_detail})
             return Response([])
         else:
             raise ValidationError(
@@ -1,19 +1,13 @@
-from django.conf import settings
 from django.db.models import (
-    Count,
     Prefetch,
-    Avg,
-    Q,
     Min,
     Max,
     Case,
     When,
     CharField,
     Value,
-    IntegerField,
     ExpressionWrapper,
 )
-from django.db.models.functions import Coalesce
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.generics import (
@@ -26,11 +20,14 @@ from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
-import datetime
-
 from rest_framework.views import APIView
 from organisation.models import Organisation
-from payment.models import KhaltiTransactionDetail
+from payment.clients import (
+    PaymentGatewayError,
+    verify_esewa_payment,
+    verify_khalti_payment,
+)
+from payment.models import EsewaTransactionDetail, KhaltiTransactionDetail
 from webapi.serializers.package import (
     PackageSerializer,
     PackageBookingSerializer,
@@ -39,15 +36,20 @@ from webapi.serializers.package import (
 from package.models import Package, PackageBooking, PackageType
 from webapi.custom_filters import PackageFilterSet
 from mobileapi.utils.helpers import validate_rating
-import requests
+from mobileapi.utils.autocomplete import AUTOCOMPLETE_LIMIT, get_suggestions
+from mobileapi.utils.package_inventory import (
+    annotate_available_quantity,
+    get_available_quantity,
+    hold_package_booking,
+)
+from mobileapi.utils.popularity import get_popular_ids, get_ranked_page, order_by_ids
+from mobileapi.utils.search import search
 from django.contrib.auth import get_user_model
 from package.helpers import calculate_price
 from datetime import date, datetime
-from rest_framework.exceptions import ValidationError
-from django.db.models import Sum, F
+from django.db.models import F
 from backend.constant import MIN_BOOKING_PAYOUT_PERCENTAGE
 from django.db import transaction
-from booking.utils import packagebooking_esewa_verification
 
 User = get_user_model()
 
@@ -112,20 +114,10 @@ class PackageListView(ListAPIView):
                 queryset = queryset.filter(package_type__id__in=category)
 
         if q:
-            queryset = queryset.filter(
-                Q(title__icontains=q)
-                | Q(organisation__location__city__icontains=q)
-                | Q(organisation__location__country__icontains=q)
-                | Q(organisation__location__street_name__icontains=q)
-                | Q(organisation__location__street_address__icontains=q)
-                | Q(organisation__location__zip_code__icontains=q)
-                | Q(organisation__name__icontains=q)
-                | Q(organisation__category__name__icontains=q)
-                | Q(package_type__name__icontains=q)
-            )
+            queryset = search(queryset, q)
         if ratings:
             queryset = queryset.annotate(
-                user_rating=Avg("organisation__rating__rating_star")
+                user_rating=F("organisation__rating_summary__rating_star_average")
             )
             queryset = validate_rating(ratings, queryset)
         if night_range:
@@ -152,24 +144,10 @@ class PackageListView(ListAPIView):
             ).order_by("organisation", "-created_on")
             queryset = Package.objects.filter(id__in=queryset).order_by("-created_on")
 
-        if queryset:
-            queryset = queryset.annotate(
-                available_quantity=F("quantity")
-                - Coalesce(
-                    Sum(
-                        "package_booking__quantity",
-                        filter=Q(
-                            ~Q(package_booking__payment_status="Draft"),
-                            package_booking__is_deleted=False,
-                            package_booking__cancelled=False,
-                        ),
-                    ),
-                    0,
-                )
-            )
-            if available:
-                queryset = queryset.filter(available_quantity__gt=0)
-        return queryset
+        queryset = annotate_available_quantity(queryset)
+        if available:
+            queryset = queryset.filter(available_quantity__gt=0)
+        return queryset.select_related("organisation__rating_summary")
 
 
 class PackageSearchAPIView(APIView):
@@ -223,17 +201,12 @@ class PackageDetailAPIView(RetrieveAPIView):
 
     def get_object(self):
         obj = get_object_or_404(
-            Package, id=self.kwargs.get("pk"), is_deleted=False, is_active=True
-        )
-        total_booked_quantity = PackageBooking.objects.filter(
-            ~Q(payment_status="Draft"),
+            Package.objects.select_related("organisation__rating_summary"),
+            id=self.kwargs.get("pk"),
             is_deleted=False,
-            cancelled=False,
-            package=obj,
-        ).aggregate(total_booked_quantity=Coalesce(Sum("quantity"), 0))
-        obj.available_quantity = obj.quantity - total_booked_quantity.get(
-            "total_booked_quantity"
+            is_active=True,
         )
+        obj.available_quantity = get_available_quantity(obj.id)
         return obj
 
 
@@ -243,9 +216,11 @@ class PackageBookingAPI(viewsets.ModelViewSet):
     queryset = PackageBooking.objects.none()
 
     def get_queryset(self):
-        queryset = PackageBooking.objects.filter(
-            is_deleted=False, booked_by=self.request.user
-        ).annotate(booking_id=F("uuid"))
+        queryset = (
+            PackageBooking.objects.filter(is_deleted=False, booked_by=self.request.user)
+            .select_related("package__organisation__rating_summary")
+            .annotate(booking_id=F("uuid"))
+        )
         upcoming = self.request.query_params.get("upcoming")
         ongoing = self.request.query_params.get("ongoing")
         completed = self.request.query_params.get("completed")
@@ -290,9 +265,14 @@ class PackageBookingAPI(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         package = self.request.data.get("package")
-        serializer.save(
-            package=Package.objects.get(id=package), booked_by=self.request.user
-        )
+        # the quantity is held in the same transaction, so a full package rolls
+        # the booking back instead of overselling it
+        with transaction.atomic():
+            booking = serializer.save(
+                package=Package.objects.get(id=package), booked_by=self.request.user
+            )
+            if not hold_package_booking(booking):
+                raise ValidationError({"error": "This Package is already full"})
 
     # def perform_create(self, serializer):
     # serializer.save(booked_by=self.request.user)
@@ -330,14 +310,7 @@ class PackageBookingAPI(viewsets.ModelViewSet):
 
         # check that package can be book or not based on the quantity
         if package_obj:
-            packagebook_obj = package_obj.package_booking.filter(
-                ~Q(payment_status="Draft"), is_deleted=False, cancelled=False
-            ).aggregate(Sum("quantity"))
-            if packagebook_obj.get("quantity__sum") is None:
-                booked_quantity = 0
-            else:
-                booked_quantity = packagebook_obj.get("quantity__sum")
-            available_quantity = package_obj.quantity - booked_quantity
+            available_quantity = get_available_quantity(package_obj.id)
 
             if available_quantity < self.request.data.get("quantity"):
                 raise ValidationError({"error": "This Package is already full"})
@@ -387,104 +360,119 @@ class PackageBookingAPI(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"])
     def confirm_booking(self, request, *args, **kwargs):
-        with transaction.atomic():
-            token = request.data.get("token", False)
-            amount = request.data.get("paid_amount", False)
-            package_obj = Package.objects.get(id=self.request.data["package_id"])
-            quantity = self.request.data.get("quantity")
-
-            packagebooking = self.get_object()
-            payment_method = request.data.get("payment_method", False)
-            # check if package is inactive
-            print(payment_method)
-            if package_obj.is_active == False:
-                raise ValidationError({"amount": "This package is already expired"})
-            if amount < (
-                packagebooking.total_amount * MIN_BOOKING_PAYOUT_PERCENTAGE / 100
-            ):
-                raise ValidationError({"error": "you must pay 15% of total amount"})
+        token = request.data.get("token", False)
+        amount = request.data.get("paid_amount", False)
+        package_obj = Package.objects.get(id=self.request.data["package_id"])
+        quantity = self.request.data.get("quantity")
 
-            if amount > packagebooking.total_amount:
-                raise ValidationError(
-                    {"error": "cannot be paid more than the actual amount"}
-                )
+        packagebooking = self.get_object()
+        payment_method = request.data.get("payment_method", False)
+        # check if package is inactive
+        if package_obj.is_active == False:
+            raise ValidationError({"amount": "This package is already expired"})
+        if amount < (packagebooking.total_amount * MIN_BOOKING_PAYOUT_PERCENTAGE / 100):
+            raise ValidationError({"error": "you must pay 15% of total amount"})
 
-            serializer = PackageBookingSerializer(packagebooking)
+        if amount > packagebooking.total_amount:
+            raise ValidationError(
+                {"error": "cannot be paid more than the actual amount"}
+            )
 
-            if float(amount) == float(packagebooking.total_amount):
-                packagebooking.payment_status = "Paid"
-            else:
-                packagebooking.payment_status = "Partially Paid"
+        # the quantity is held before the payment is captured, the hold of a draft
+        # is renewed so it doesn't expire while the gateway is verifying
+        with transaction.atomic():
+            locked_booking = PackageBooking.objects.select_for_update().get(
+                id=packagebooking.id
+            )
+            if not hold_package_booking(locked_booking):
+                raise ValidationError({"error": "This Package is already full"})
 
+        # the payment is verified before the transaction is opened, so that a slow
+        # gateway doesn't keep the package booking row locked
+        verification = None
+        try:
             if payment_method == "khalti":
-                try:
-                    packagebooking = PackageBooking.objects.get(id=packagebooking.id)
-                    try:
-                        payload = {
-                            "token": token,
-                            "amount": amount * 100,
-                        }
-                        headers = {
-                            "Authorization": "Key {}".format(settings.KHALTI_SECRET_KEY)
+                verification = verify_khalti_payment(token, amount * 100)
+            elif payment_method == "e-sewa":
+                verification = verify_esewa_payment(token, amount, packagebooking.id)
+        except PaymentGatewayError:
+            raise ValidationError(
+                {
+                    "detail": "unable to send payment verification request to "
+                    + payment_method,
+                }
+            )
+
+        with transaction.atomic():
+            packagebooking = PackageBooking.objects.select_for_update().get(
+                id=packagebooking.id
+            )
+            # the hold is only lost when it expired during the verification and the
+            # package got full in the meantime
+            held = hold_package_booking(packagebooking)
+            if verification is None and not held:
+                raise ValidationError({"error": "This Package is already full"})
+
+            if verification is not None:
+                payment_status = "success" if verification.get("success") else "failure"
+                if payment_method == "khalti":
+                    packagebooking.khalti_payment_status = payment_status
+                if verification.get("success") and not held:
+                    # the captured payment is kept on record to be refunded
+                    payment_status = "refund"
+                if payment_method == "khalti":
+                    KhaltiTransactionDetail.objects.create(
+                        token=token,
+                        payment_status=payment_status,
+                        packagebooking_id=packagebooking,
+                        amount=amount,
+                    )
+                else:
+                    EsewaTransactionDetail.objects.create(
+                        token=token,
+                        payment_status=payment_status,
+                        package_booking_id=packagebooking,
+                        amount=amount,
+                    )
+                if not verification.get("success"):
+                    # the booking keeps its stored payment status
+                    if payment_method == "khalti":
+                        packagebooking.save(update_fields=["khalti_payment_status"])
+                    return Response(
+                        {"status": 401, "detail": verification.get("detail")}
+                    )
+                if not held:
+                    if payment_method == "khalti":
+                        packagebooking.save(update_fields=["khalti_payment_status"])
+                    return Response(
+                        {
+                            "status": 409,
+                            "detail": "This Package is already full, the payment "
+                            "will be refunded",
                         }
-                        response = requests.post(
-                            settings.KHALTI_VERIFY_URL, payload, headers=headers
-                        )
-                        if response.status_code == 200:
-                            packagebooking.khalti_payment_status = "success"
-                            packagebooking.payment_method = payment_method
-                            packagebooking.payment_status = "Paid"
-                            packagebooking.paid_amount = amount
-                            packagebooking.save()
-                            KhaltiTransactionDetail.objects.create(
-                                token=token,
-                                payment_status="success",
-                                packagebooking_id=packagebooking,
-                                amount=amount,
-                            )
-                        else:
-                            packagebooking.khalti_payment_status = "failure"
-                            packagebooking.save()
-                            KhaltiTransactionDetail.objects.create(
-                                token=token,
-                                payment_status="failure",
-                                packagebooking_id=packagebooking,
-                                amount=amount,
-                            )
-                            return Response({"status": 401, "detail": response.json()})
-
-                    except requests.exceptions.HTTPError as e:
-                        packagebooking.status = "failed verification"
-                        packagebooking.save()
-                        raise ValidationError(
-                            {
-                                "detail": "unable to send payment verification request to khalti",
-                            }
-                        )
-                except PackageBooking.DoesNotExist:
-                    raise ValidationError(
-                        {"details": "Unable to verify payment.Booking not available."}
                     )
 
-            elif payment_method == "e-sewa":
-                packagebooking_esewa_verification(
-                    token, amount, package_booking_id=packagebooking
-                )
+            if payment_method == "khalti":
+                packagebooking.payment_status = "Paid"
+            elif float(amount) == float(packagebooking.total_amount):
+                packagebooking.payment_status = "Paid"
             else:
-                pass
+                packagebooking.payment_status = "Partially Paid"
+
             packagebooking.payment_method = payment_method
             packagebooking.paid_amount = amount
             # saving the remaining amount to be paid
             packagebooking.remaining_amount = (
                 float(packagebooking.total_amount) - packagebooking.paid_amount
             )
+            # the inventory signal turns the held quantity into booked quantity
             packagebooking.save()
 
-            calc = calculate_price(package_obj, quantity)
-            packagebooking_serializer = PackageBookingSerializer(packagebooking)
-            res = {"packagebooking_detail": packagebooking_serializer.data}
-            res.update(calc)
-            return Response(res, status=status.HTTP_200_OK)
+        calc = calculate_price(package_obj, quantity)
+        packagebooking_serializer = PackageBookingSerializer(packagebooking)
+        res = {"packagebooking_detail": packagebooking_serializer.data}
+        res.update(calc)
+        return Response(res, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["post"], url_path="price")
     def get_pricing_detail(self, request):
@@ -543,21 +531,8 @@ class PackageViewset(viewsets.ModelViewSet):
 
         queryset = Package.objects.filter(
             organisation__user=self.request.user, is_deleted=False
-        )
-        queryset = queryset.annotate(
-            available_quantity=F("quantity")
-            - Coalesce(
-                Sum(
-                    "package_booking__quantity",
-                    filter=Q(
-                        ~Q(package_booking__payment_status="Draft"),
-                        package_booking__is_deleted=False,
-                        package_booking__cancelled=False,
-                    ),
-                ),
-                0,
-            )
-        )
+        ).select_related("organisation__rating_summary")
+        queryset = annotate_available_quantity(queryset)
 
         if organisation:
             queryset = queryset.filter(
@@ -581,111 +556,58 @@ class PopularPackageListAPIView(ListAPIView):
     """
     CASE:
         1. If no search_key provided most booked package in the world
+        2. city, country or continent ranks the packages within the location
     """
 
     serializer_class = PackageSerializer
 
     def get_queryset(self):
-        current = self.request.query_params.get("current")
-        queryset = (
-            Package.objects.filter(
-                is_deleted=False,
-                booking_start_date__lte=date.today(),
-                booking_end_date__gte=date.today(),
-            )
-            .annotate(
-                number_of_booked=Count(
-                    "package_booking",
-                    filter=Q(
-                        package_booking__is_deleted=False,
-                        package_booking__cancelled=False,
-                    ),
-                    output_field=IntegerField(),
-                ),
-            )
-            .annotate(
-                available_quantity=F("quantity")
-                - Coalesce(
-                    Sum(
-                        "package_booking__quantity",
-                        filter=Q(
-                            package_booking__is_deleted=False,
-                            package_booking__cancelled=False,
-                        ),
-                    ),
-                    0,
+        return (
+            annotate_available_quantity(
+                Package.objects.filter(
+                    is_deleted=False,
+                    booking_start_date__lte=date.today(),
+                    booking_end_date__gte=date.today(),
                 )
             )
-            .filter(available_quantity__gt=0)
+            .select_related("organisation__rating_summary")
+            .annotate(number_of_booked=F("booking_counter__bookings"))
+        )
+
+    def list(self, request, *args, **kwargs):
+        current = self.request.query_params.get("current")
+        ranked_ids = get_popular_ids(
+            "package",
+            city=self.request.query_params.get("city"),
+            country=self.request.query_params.get("country"),
+            continent=self.request.query_params.get("continent"),
         )
+        queryset = self.get_queryset().filter(available_quantity__gt=0)
         parent_search_key = self.request.query_params.get("parent_search_key")
         child_search_key = self.request.query_params.get("child_search_key")
         if parent_search_key:
-            queryset = queryset.filter(
-                Q(package_type__name__icontains=parent_search_key)
-                | Q(organisation__location__city__icontains=parent_search_key)
-                | Q(organisation__location__country__icontains=parent_search_key)
-                | Q(organisation__location__continent__icontains=parent_search_key)
-            )
+            queryset = search(queryset, parent_search_key)
 
         if child_search_key:
-            queryset = queryset.filter(
-                Q(package_type__name__icontains=child_search_key)
-                | Q(organisation__location__city__icontains=child_search_key)
-                | Q(organisation__location__country__icontains=child_search_key)
-                | Q(organisation__location__continent__icontains=child_search_key)
-            )
+            queryset = search(queryset, child_search_key)
         if current:
             queryset = queryset.exclude(id=current)
-        return queryset.order_by("-number_of_booked")
+        package_ids = get_ranked_page(ranked_ids, queryset)
+        page = self.paginate_queryset(package_ids)
+        packages = order_by_ids(
+            self.get_queryset(), package_ids if page is None else page
+        )
+        serializer = self.get_serializer(packages, many=True)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
 
 class PackageNameSuggestion(APIView):
     def get(self, request, *args, **kwargs):
         name = self.request.query_params.get("name", "")
-        name_suggestions = []
-
-        if name:
-            packages = Package.objects.filter(
-                is_deleted=False,
-                booking_start_date__lte=date.today(),
-                booking_end_date__gte=date.today(),
-            ).values(
-                "package_type__name",
-                "title",
-                "organisation__name",
-                "organisation__location",
-                "organisation__category__name",
-            )
-
-            for package in packages:
-                organisation_location = package.get("organisation__location", {})
-                if name.lower() in organisation_location.get("city", "").lower():
-                    name_suggestions.append(organisation_location.get("city").title())
-                if name.lower() in organisation_location.get("country", "").lower():
-                    name_suggestions.append(
-                        organisation_location.get("country").title()
-                    )
-                if name.lower() in organisation_location.get("street_name", "").lower():
-                    name_suggestions.append(
-                        organisation_location.get("street_name").title()
-                    )
-                if name.lower() in organisation_location.get("continent", "").lower():
-                    name_suggestions.append(
-                        organisation_location.get("continent").title()
-                    )
-                if name.lower() in package.get("organisation__name", "").lower():
-                    name_suggestions.append(package.get("organisation__name").title())
-                if name.lower() in package.get("package_type__name", "").lower():
-                    name_suggestions.append(package.get("package_type__name").title())
-                if name.lower() in package.get("title").lower():
-                    name_suggestions.append(package.get("title").title())
-
-                if name.lower() in package.get("organisation__category__name").lower():
-                    name_suggestions.append(
-                        package.get("organisation__category__name").title()
-                    )
-
-        res = {"suggestions": list(set(name_suggestions))}
-
+        limit = self.request.query_params.get("limit", str(AUTOCOMPLETE_LIMIT))
+        if not limit.isdigit():
+            raise ValidationError({"limit": "limit must be a positive number"})
+        res = {"suggestions": get_suggestions("package", name, int(limit))}
         return Response(res)
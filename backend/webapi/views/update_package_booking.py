@@ -1,7 +1,6 @@
 from booking.serializers import UserBookingSerializer
 import json
-from django.db.models import Q, Sum, F
-from django.db.models.functions import Coalesce
+from django.db import transaction
 from package.models import Package, PackageBooking
 from rest_framework import serializers
 from rest_framework.views import APIView
@@ -16,6 +15,12 @@ from webapi.serializers.package import (
 )
 from package.domain.model import package_booking_factory
 from package.helpers import calculate_price
+from mobileapi.utils.package_inventory import (
+    get_available_quantity,
+    get_booked_quantity,
+    get_reserved_quantity,
+    hold_package_booking,
+)
 
 
 class UpdatePackageBookingUserInfo(APIView):
@@ -52,17 +57,13 @@ class UpdatePackageBookingDetail(APIView):
     def get(self, request, *args, **kwargs):
         booking_id = self.kwargs.get("id")
         booking = validate_package_booking(booking_id, self.request.user)
-        total_booking = PackageBooking.objects.filter(
-            ~Q(id=booking_id),
-            ~Q(payment_status="Draft"),
-            package=booking.package,
-            is_deleted=False,
-            cancelled=False,
-        ).aggregate(total_booking=Coalesce(Sum("quantity"), 0))
         booking.valid_checkin_start_date = booking.package.checkin_valid_start_date
         booking.valid_checkin_end_date = booking.package.checkin_valid_end_date
-        booking.available_quantity = booking.package.quantity - total_booking.get(
-            "total_booking"
+        # quantity the booking already holds is available for its own update
+        booking.available_quantity = (
+            get_available_quantity(booking.package_id)
+            + get_booked_quantity(booking)
+            + get_reserved_quantity(booking)
         )
         serializer = UpdatePackageBookingSerializer(booking)
         return Response(serializer.data)
@@ -83,19 +84,18 @@ class UpdatePackageBookingDetail(APIView):
             "checkin_valid_start_date",
             "checkin_valid_end_date",
         ).get(id=booking.package.id)
-        booked_package_count = PackageBooking.objects.filter(
-            ~Q(id=booking_id),
-            ~Q(payment_status="Draft"),
-            package__id=package.get("id"),
-            cancelled=False,
-            is_deleted=False,
-        ).aggregate(number_of_booked=Coalesce(Sum("quantity"), 0))
+        number_of_booked = (
+            package.get("quantity")
+            - get_available_quantity(package.get("id"))
+            - get_booked_quantity(booking)
+            - get_reserved_quantity(booking)
+        )
         try:
             booking_factory = package_booking_factory(
                 package=package,
                 checkin_date=serializer.data.get("checkin_date"),
                 quantity=serializer.data.get("quantity"),
-                number_of_booked=booked_package_count.get("number_of_booked"),
+                number_of_booked=number_of_booked,
             )
         except Exception as e:
             raise ValidationError({"error": e})
@@ -106,7 +106,10 @@ class UpdatePackageBookingDetail(APIView):
         booking.quantity = booking_factory.quantity
         booking.total_amount = pricing_detail.get("total")
         booking.gst_amount = pricing_detail.get("gst_amount")
-        booking.save()
+        with transaction.atomic():
+            booking.save()
+            if not hold_package_booking(booking):
+                raise ValidationError({"error": "This Package is already full"})
         serializer = UpdatePackageBookingSerializer(booking)
         return Response(serializer.data)
 